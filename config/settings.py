@@ -1,5 +1,7 @@
 import os
 from pathlib import Path
+
+import dj_database_url
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -12,6 +14,53 @@ STRIPE_PUBLIC_KEY_USD = os.getenv("STRIPE_PUBLIC_KEY_USD")
 STRIPE_SECRET_KEY_USD = os.getenv("STRIPE_SECRET_KEY_USD")
 STRIPE_PUBLIC_KEY_EUR = os.getenv("STRIPE_PUBLIC_KEY_EUR")
 STRIPE_SECRET_KEY_EUR = os.getenv("STRIPE_SECRET_KEY_EUR")
+STRIPE_WEBHOOK_SECRET_USD = os.getenv("STRIPE_WEBHOOK_SECRET_USD")
+STRIPE_WEBHOOK_SECRET_EUR = os.getenv("STRIPE_WEBHOOK_SECRET_EUR")
+
+# Stripe HTTP client
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT") or 30)
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES") or 2)
+STRIPE_HTTP_POOL_SIZE = int(os.getenv("STRIPE_HTTP_POOL_SIZE") or 10)
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE") or None
+STRIPE_MAX_CONCURRENCY = int(os.getenv("STRIPE_MAX_CONCURRENCY") or 8)
+# Асинхронные views обращаются к Stripe через httpx в event loop, без потока
+# на каждый вызов. Включайте под ASGI сервером (uvicorn, daphne): клиент
+# создается на event loop, а под WSGI (runserver) у каждого запроса свой loop
+STRIPE_ASYNC_HTTPX = os.getenv("STRIPE_ASYNC_HTTPX", "False").lower() == "true"
+# Circuit breaker аккаунта Stripe: после STRIPE_CIRCUIT_FAILURE_THRESHOLD ошибок
+# подряд вызовы отклоняются на STRIPE_CIRCUIT_RECOVERY_TIMEOUT секунд
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.getenv("STRIPE_CIRCUIT_FAILURE_THRESHOLD") or 5
+)
+STRIPE_CIRCUIT_RECOVERY_TIMEOUT = float(
+    os.getenv("STRIPE_CIRCUIT_RECOVERY_TIMEOUT") or 30
+)
+STRIPE_CIRCUIT_HALF_OPEN_MAX_CALLS = int(
+    os.getenv("STRIPE_CIRCUIT_HALF_OPEN_MAX_CALLS") or 1
+)
+# Суммарное время на обращения к Stripe в одном HTTP запросе (секунды)
+STRIPE_REQUEST_DEADLINE = float(os.getenv("STRIPE_REQUEST_DEADLINE") or 10)
+# Время, в течение которого повторные запросы получают уже созданные
+# Payment Intent / Checkout Session (секунды, 0 - создавать новые на каждый запрос)
+STRIPE_OBJECT_CACHE_TTL = int(os.getenv("STRIPE_OBJECT_CACHE_TTL") or 3600)
+# Создавать Payment Intent при рендеринге страницы оплаты и встраивать
+# client_secret в HTML вместо отдельного запроса из браузера
+STRIPE_EMBED_CLIENT_SECRET = (
+    os.getenv("STRIPE_EMBED_CLIENT_SECRET", "False").lower() == "true"
+)
+
+# Время хранения курсов валют в памяти процесса (секунды)
+EXCHANGE_RATE_CACHE_TTL = int(os.getenv("EXCHANGE_RATE_CACHE_TTL") or 300)
+
+# Очередь фоновых задач Stripe (команда stripe_worker)
+STRIPE_TASK_MAX_ATTEMPTS = int(os.getenv("STRIPE_TASK_MAX_ATTEMPTS") or 8)
+STRIPE_TASK_RETRY_DELAY = int(os.getenv("STRIPE_TASK_RETRY_DELAY") or 5)
+STRIPE_TASK_MAX_RETRY_DELAY = int(os.getenv("STRIPE_TASK_MAX_RETRY_DELAY") or 3600)
+STRIPE_TASK_TIMEOUT = int(os.getenv("STRIPE_TASK_TIMEOUT") or 300)
+
+# Сверка платежей (команда reconcile_payments): сколько секунд после создания
+# Payment Intent / Checkout Session перепроверяются, пока не завершатся
+STRIPE_RECONCILE_LOOKBACK = int(os.getenv("STRIPE_RECONCILE_LOOKBACK") or 86400)
 
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
@@ -43,13 +92,14 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "stripe_app.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "stripe_app.profiling.ProfiledDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -64,14 +114,56 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
-# SQLite Database
+# База данных задается DATABASE_URL (например, postgres://user:password@db:5432/stripe_app),
+# по умолчанию используется SQLite
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE") or 600)
+SQLITE_TIMEOUT = float(os.getenv("SQLITE_TIMEOUT") or 20)
+
 DATABASES = {
+    "default": dj_database_url.parse(
+        os.getenv("DATABASE_URL") or f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=True,
+    )
+}
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # WAL позволяет читать во время записи, IMMEDIATE сразу берет блокировку
+    # на запись в транзакции, а timeout ждет ее освобождения вместо
+    # ошибки "database is locked"
+    DATABASES["default"]["OPTIONS"] = {
+        "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL",
+        "transaction_mode": "IMMEDIATE",
+        "timeout": SQLITE_TIMEOUT,
+    }
+
+# Кеш страниц товаров и заказов: file (по умолчанию), db или locmem. Версии
+# страниц (ETag) должны быть видны всем процессам - web, stripe_worker,
+# reconcile_payments, import_items, поэтому по умолчанию используется общий
+# для процессов файловый кеш; db нужен, если процессы работают на разных
+# серверах (создайте таблицу командой createcachetable). locmem подходит
+# только для одного процесса: изменения из других процессов будут видны
+# через PAGE_CACHE_TTL секунд
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "stripe_app"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        BASE_DIR / "cache",
+    ),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "stripe_app_cache"),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[
+    os.getenv("CACHE_BACKEND") or "file"
+]
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION") or CACHE_DEFAULT_LOCATION,
     }
 }
 
+# Время хранения отрендеренных страниц товаров и заказов и их версий (секунды)
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL") or 600)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -101,3 +193,38 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Профилирование запросов к stripe_app (ProfilingMiddleware): запрос
+# профилируется с заголовком X-Profile: <PROFILING_TOKEN> или с вероятностью
+# PROFILING_SAMPLE_RATE (0..1); отчеты cProfile сохраняются в PROFILING_DIR
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN") or None
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE") or 0)
+PROFILING_DIR = os.getenv("PROFILING_DIR") or BASE_DIR / "profiles"
+
+# Логи приложения: json (по строке JSON на запись) или text
+LOG_LEVEL = os.getenv("LOG_LEVEL") or "INFO"
+LOG_FORMAT = os.getenv("LOG_FORMAT") or "json"
+
+# Доступ к /metrics: с заголовком Authorization: Bearer <METRICS_TOKEN>, с адресов
+# METRICS_ALLOWED_IPS (через запятую) или для сотрудников (is_staff)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+METRICS_ALLOWED_IPS = [
+    ip.strip()
+    for ip in (os.getenv("METRICS_ALLOWED_IPS") or "").split(",")
+    if ip.strip()
+]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "stripe_app.log_formatters.JsonFormatter"},
+        "text": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": LOG_FORMAT},
+    },
+    "loggers": {
+        "stripe_app": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
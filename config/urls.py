@@ -1,8 +1,10 @@
-
 from django.contrib import admin
 from django.urls import path, include
 
+from stripe_app.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("stripe_app/", include("stripe_app.urls", namespace="stripe_app")),
+    path("metrics", metrics, name="metrics"),
 ]
@@ -1,18 +1,71 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
-from stripe_app.models import Item, Order, Discount, Tax
+from stripe_app.catalog import export_lines
+from stripe_app.models import (
+    Item,
+    Order,
+    OrderLine,
+    Discount,
+    Tax,
+    StripeTask,
+    StripeEvent,
+    ExchangeRate,
+    ReconciliationCursor,
+)
 
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = ["name", "price", "currency"]
     search_fields = ["name"]
+    readonly_fields = ["stripe_product_id", "stripe_price_id", "stripe_price_key"]
+
+    actions = ["export_csv", "export_jsonl"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 / pg_trgm вместо icontains по всей таблице
+        return queryset.search(search_term), False
+
+    def _export(self, queryset, file_format, content_type):
+        """Отдает выбранные товары файлом, не загружая их в память целиком."""
+        response = StreamingHttpResponse(
+            export_lines(queryset, file_format), content_type=content_type
+        )
+        filename = f"items-{timezone.now():%Y%m%d-%H%M%S}.{file_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.action(description="Выгрузить выбранные товары в CSV")
+    def export_csv(self, request, queryset):
+        return self._export(queryset, "csv", "text/csv; charset=utf-8")
+
+    @admin.action(description="Выгрузить выбранные товары в JSONL")
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, "jsonl", "application/x-ndjson; charset=utf-8")
+
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    fields = ["item", "quantity", "unit_amount"]
+    autocomplete_fields = ["item"]
+    extra = 1
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ["id", "total_price"]
-    filter_horizontal = ["items"]
+    list_display = ["id", "total_price", "payment_status"]
+    list_filter = ["payment_status"]
+    readonly_fields = [
+        "subtotal_amount",
+        "discount_amount",
+        "tax_amount",
+        "total_amount",
+        "pricing_currency",
+        "priced_at",
+    ]
+    inlines = [OrderLineInline]
 
 
 @admin.register(Discount)
@@ -23,3 +76,28 @@ class DiscountAdmin(admin.ModelAdmin):
 @admin.register(Tax)
 class TaxAdmin(admin.ModelAdmin):
     list_display = ["name", "percent", "stripe_tax_id"]
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ["currency", "rate", "updated_at"]
+    list_editable = ["rate"]
+
+
+@admin.register(StripeTask)
+class StripeTaskAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "status", "attempts", "run_at", "updated_at"]
+    list_filter = ["status", "name"]
+    readonly_fields = ["created_at", "updated_at"]
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ["event_id", "type", "account", "received_at", "processed_at"]
+    list_filter = ["type", "account"]
+    search_fields = ["event_id"]
+
+
+@admin.register(ReconciliationCursor)
+class ReconciliationCursorAdmin(admin.ModelAdmin):
+    list_display = ["account", "resource", "created", "updated_at"]
@@ -6,4 +6,5 @@ class StripeAppConfig(AppConfig):
     name = "stripe_app"
 
     def ready(self):
+        import stripe_app.profiling
         import stripe_app.signals
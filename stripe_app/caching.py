@@ -0,0 +1,121 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.views.decorators.http import condition
+
+
+def _version_key(kind, pk):
+    return f"stripe_app:version:{kind}:{pk}"
+
+
+def get_version(kind, pk):
+    """
+    Возвращает версию объекта для ключей кеша и ETag.
+
+    Версия - время последнего изменения объекта в микросекундах; если версия
+    еще не записана в кеш или истекла, объект считается измененным сейчас.
+    Версии хранятся PAGE_CACHE_TTL секунд: если изменение сделано в процессе,
+    не разделяющем кеш с web процессом (например, при CACHE_BACKEND=locmem),
+    устаревшие страница и ETag отдаются не дольше этого времени.
+
+    Args:
+        kind (str): Тип объекта ("item" или "order")
+        pk (int): ID объекта
+
+    Returns:
+        int: Версия объекта
+    """
+    key = _version_key(kind, pk)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns() // 1000
+        # При PAGE_CACHE_TTL=0 версия не сохраняется и каждый запрос получает новую
+        if not cache.add(key, version, settings.PAGE_CACHE_TTL):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_versions(kind, pks):
+    """
+    Меняет версии объектов, делая недействительными их кешированные страницы.
+
+    Args:
+        kind (str): Тип объектов ("item" или "order")
+        pks (Iterable[int]): ID объектов
+    """
+    version = time.time_ns() // 1000
+    cache.set_many(
+        {_version_key(kind, pk): version for pk in pks}, settings.PAGE_CACHE_TTL
+    )
+
+
+def cached_page(kind, pk_kwarg, skip_if=None):
+    """
+    Декоратор для кеширования HTML страницы объекта с условными ответами.
+
+    Отрендеренная страница хранится в кеше под ключом с версией объекта, поэтому
+    после изменения объекта (см. bump_versions в signals.py) она рендерится заново.
+    По версии также строятся ETag и Last-Modified: на повторный запрос с
+    If-None-Match / If-Modified-Since отдается 304 без обращения к БД.
+
+    Args:
+        kind (str): Тип объекта ("item" или "order")
+        pk_kwarg (str): Имя аргумента представления с ID объекта
+        skip_if (Callable): Принимает запрос и возвращает True, если страницу
+            нельзя кешировать (например, она содержит client_secret); такая
+            страница рендерится при каждом запросе с Cache-Control: no-store
+    """
+
+    def request_version(request, **kwargs):
+        versions = request.__dict__.setdefault("_stripe_app_versions", {})
+        pk = kwargs[pk_kwarg]
+        if pk not in versions:
+            versions[pk] = get_version(kind, pk)
+        return versions[pk]
+
+    def etag_func(request, **kwargs):
+        return f"{kind}-{kwargs[pk_kwarg]}-{request_version(request, **kwargs)}"
+
+    def last_modified_func(request, **kwargs):
+        version = request_version(request, **kwargs)
+        return datetime.fromtimestamp(version / 1_000_000, tz=timezone.utc)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            key = (
+                f"stripe_app:page:{view.__name__}:{kwargs[pk_kwarg]}:"
+                f"{request_version(request, **kwargs)}"
+            )
+            content = cache.get(key)
+            if content is not None:
+                response = HttpResponse(content)
+            else:
+                response = view(request, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response.content, settings.PAGE_CACHE_TTL)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        conditional = condition(
+            etag_func=etag_func, last_modified_func=last_modified_func
+        )(wrapper)
+        if skip_if is None:
+            return conditional
+
+        @wraps(view)
+        def dispatch(request, **kwargs):
+            if not skip_if(request):
+                return conditional(request, **kwargs)
+            response = view(request, **kwargs)
+            add_never_cache_headers(response)
+            return response
+
+        return dispatch
+
+    return decorator
@@ -0,0 +1,273 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from stripe_app.caching import bump_versions
+from stripe_app.models import Item, Order, OrderLine
+from stripe_app.money import to_minor_units
+from stripe_app.recalculation import mark_unpaid_order_totals_dirty
+
+FORMATS = ("csv", "jsonl")
+
+# Поля файла каталога (порядок колонок CSV)
+EXPORT_FIELDS = ["id", "name", "description", "price", "currency"]
+
+# Поля с ID продукта и цены Stripe
+STRIPE_FIELDS = ["stripe_product_id", "stripe_price_id", "stripe_price_key"]
+
+
+def detect_format(path, default="csv"):
+    """
+    Определяет формат файла каталога по расширению.
+
+    Args:
+        path (str): Путь к файлу
+        default (str): Формат, если расширение не распознано
+
+    Returns:
+        str: "csv" или "jsonl"
+    """
+    extension = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    return default
+
+
+def read_rows(stream, file_format):
+    """
+    Построчно читает записи каталога из файла.
+
+    Args:
+        stream: Текстовый файловый объект
+        file_format (str): "csv" или "jsonl"
+
+    Yields:
+        tuple[int, object]: Номер строки файла и запись (dict) или текст ошибки
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, f"Некорректный JSON: {e}"
+            continue
+        yield line_num, row if isinstance(row, dict) else "Ожидается JSON объект"
+
+
+def validate_rows(rows, errors):
+    """
+    Превращает записи каталога в несохраненные объекты Item.
+
+    Некорректные записи пропускаются, а номер строки и ошибки добавляются
+    в список errors.
+
+    Args:
+        rows (Iterable[tuple[int, object]]): Результат read_rows
+        errors (list): Список для ошибок вида (номер строки, текст)
+
+    Yields:
+        Item: Проверенный товар (id задан, если он указан в записи)
+    """
+    for line_num, row in rows:
+        if not isinstance(row, dict):
+            errors.append((line_num, row))
+            continue
+        pk = row.get("id")
+        item = Item(
+            pk=pk if pk not in (None, "") else None,
+            name=(row.get("name") or "").strip(),
+            description=row.get("description") or None,
+            price=row.get("price"),
+            currency=str(row.get("currency") or "usd").strip().lower(),
+        )
+        try:
+            item.full_clean(
+                exclude=STRIPE_FIELDS, validate_unique=False, validate_constraints=False
+            )
+        except ValidationError as e:
+            errors.append(
+                (
+                    line_num,
+                    "; ".join(
+                        f"{field}: {' '.join(messages)}"
+                        for field, messages in e.message_dict.items()
+                    ),
+                )
+            )
+            continue
+        yield item
+
+
+def batched(iterable, size):
+    """
+    Разбивает поток на списки не длиннее size.
+
+    Args:
+        iterable (Iterable): Поток элементов
+        size (int): Размер пакета
+
+    Yields:
+        list: Очередной пакет
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def upsert_items(items):
+    """
+    Создает и обновляет пакет товаров одним запросом INSERT ... ON CONFLICT.
+
+    Товары с id обновляются, если такой товар уже есть; для товаров, у которых
+    изменились название, цена или валюта, ID продукта и цены Stripe
+    сбрасываются, у остальных сохраняются. Сохранение идет в обход Item.save
+    и сигналов, поэтому unit_amount рассчитывается, кешированные страницы
+    сбрасываются, а неоплаченные заказы с товарами, сменившими валюту,
+    отмечаются для пересчета стоимости здесь же.
+
+    Args:
+        items (list[Item]): Проверенные товары (результат validate_rows)
+
+    Returns:
+        tuple[int, int]: Количество созданных и обновленных товаров
+    """
+    # При повторе id в пакете побеждает последняя запись
+    with_pk = {item.pk: item for item in items if item.pk is not None}
+    without_pk = [item for item in items if item.pk is None]
+
+    existing = {
+        row["id"]: row
+        for row in Item.objects.filter(pk__in=with_pk).values(
+            "id", "name", "price", "currency", *STRIPE_FIELDS
+        )
+    }
+    for pk, item in with_pk.items():
+        old = existing.get(pk)
+        if old and (old["name"], old["price"], old["currency"]) == (
+            item.name,
+            item.price,
+            item.currency,
+        ):
+            for field in STRIPE_FIELDS:
+                setattr(item, field, old[field])
+
+    batch = [*with_pk.values(), *without_pk]
+    for item in batch:
+        item.unit_amount = to_minor_units(item.price, item.currency)
+
+    currency_changed = [
+        pk for pk, old in existing.items() if old["currency"] != with_pk[pk].currency
+    ]
+
+    with transaction.atomic():
+        Item.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[
+                "name",
+                "description",
+                "price",
+                "currency",
+                "unit_amount",
+                *STRIPE_FIELDS,
+            ],
+        )
+        if currency_changed:
+            mark_unpaid_order_totals_dirty(
+                Order.objects.filter(lines__item_id__in=currency_changed)
+            )
+    if existing:
+        bump_versions("item", existing)
+        bump_versions(
+            "order",
+            OrderLine.objects.filter(item_id__in=existing)
+            .values_list("order_id", flat=True)
+            .distinct(),
+        )
+    return len(batch) - len(existing), len(existing)
+
+
+def reset_item_sequence(using="default"):
+    """
+    Сдвигает последовательность id товаров после импорта с явными id.
+
+    Нужно в PostgreSQL: иначе следующий товар без id получит уже занятый id.
+
+    Args:
+        using (str): Алиас базы данных
+    """
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), [Item])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def iter_items(queryset, batch_size=2000):
+    """
+    Перебирает товары пакетами по первичному ключу (keyset pagination).
+
+    Args:
+        queryset (QuerySet): Товары для выгрузки
+        batch_size (int): Количество товаров, читаемых за один запрос
+
+    Yields:
+        dict: Поля EXPORT_FIELDS товара
+    """
+    queryset = queryset.order_by().values(*EXPORT_FIELDS)
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by("id")[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1]["id"]
+        yield from batch
+
+
+def export_lines(queryset, file_format, batch_size=2000):
+    """
+    Выгружает товары в CSV или JSONL построчно.
+
+    Память не зависит от размера каталога, поэтому генератор подходит и для
+    записи в файл, и для StreamingHttpResponse.
+
+    Args:
+        queryset (QuerySet): Товары для выгрузки
+        file_format (str): "csv" или "jsonl"
+        batch_size (int): Количество товаров, читаемых за один запрос
+
+    Yields:
+        str: Очередная строка файла (с переводом строки)
+    """
+    rows = iter_items(queryset, batch_size)
+    if file_format == "jsonl":
+        for row in rows:
+            row["price"] = str(row["price"])
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+    yield buffer.getvalue()
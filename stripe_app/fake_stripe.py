@@ -0,0 +1,243 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Префиксы ID объектов Stripe по последнему сегменту пути запроса
+OBJECT_PREFIXES = {
+    "products": ("product", "prod"),
+    "prices": ("price", "price"),
+    "payment_intents": ("payment_intent", "pi"),
+    "sessions": ("checkout.session", "cs_test"),
+    "coupons": ("coupon", "coupon"),
+    "tax_rates": ("tax_rate", "txr"),
+}
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов локального заменителя Stripe API.
+
+    На POST возвращает созданный объект с новым ID, на GET - список созданных
+    объектов ресурса (от новых к старым, с фильтром created[gte] и пагинацией
+    limit/starting_after). Повторный POST с тем же Idempotency-Key возвращает
+    тот же объект, как и Stripe.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело отправляются одним пакетом, иначе keep-alive соединение
+    # ждет delayed ACK (~40 мс) на каждом ответе
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        params = parse_qs(self.rfile.read(length).decode())
+        idempotency_key = self.headers.get("Idempotency-Key")
+        with self.server.lock:
+            self.server.received.append(
+                {
+                    "path": urlsplit(self.path).path,
+                    "params": {key: values[0] for key, values in params.items()},
+                    "idempotency_key": idempotency_key,
+                }
+            )
+        if self._delay_or_fail(params):
+            return
+
+        with self.server.lock:
+            obj = self.server.idempotent_responses.get(idempotency_key)
+            if obj is None:
+                obj = self._build_object(params)
+                self.server.objects.setdefault(self._resource(), []).append(obj)
+                if idempotency_key:
+                    self.server.idempotent_responses[idempotency_key] = obj
+        self._send(200, obj)
+
+    def do_GET(self):
+        if self._delay_or_fail():
+            return
+        query = parse_qs(urlsplit(self.path).query)
+        limit = int(query.get("limit", ["10"])[0])
+        created_gte = int(query.get("created[gte]", ["0"])[0])
+        starting_after = query.get("starting_after", [None])[0]
+        with self.server.lock:
+            objects = [
+                obj
+                for obj in reversed(self.server.objects.get(self._resource(), []))
+                if obj["created"] >= created_gte
+            ]
+        if starting_after:
+            ids = [obj["id"] for obj in objects]
+            objects = objects[ids.index(starting_after) + 1 :]
+        self._send(
+            200,
+            {
+                "object": "list",
+                "url": urlsplit(self.path).path,
+                "data": objects[:limit],
+                "has_more": len(objects) > limit,
+            },
+        )
+
+    def _resource(self):
+        return urlsplit(self.path).path.strip("/").split("/")[-1]
+
+    def _build_object(self, params):
+        resource = self._resource()
+        object_name, prefix = OBJECT_PREFIXES.get(resource, (resource, "obj"))
+        object_id = f"{prefix}_{next(self.server.ids)}"
+        obj = {
+            "id": object_id,
+            "object": object_name,
+            "created": int(time.time()),
+            "livemode": False,
+            "metadata": {
+                key[len("metadata[") : -1]: values[0]
+                for key, values in params.items()
+                if key.startswith("metadata[")
+            },
+        }
+        if object_name == "payment_intent":
+            obj["client_secret"] = f"{object_id}_secret_fake"
+            obj["status"] = "requires_payment_method"
+        elif object_name == "checkout.session":
+            obj["url"] = f"https://checkout.stripe.com/c/pay/{object_id}"
+            obj["status"] = "open"
+            obj["payment_status"] = "unpaid"
+        for key in ("amount", "currency", "unit_amount"):
+            if key in params:
+                obj[key] = params[key][0]
+        return obj
+
+    def _delay_or_fail(self, params=None):
+        server = self.server
+        with server.lock:
+            server.requests_count += 1
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+        failing = bool(server.fail_params) and all(
+            (params or {}).get(key) == [value]
+            for key, value in server.fail_params.items()
+        )
+        if not failing and (
+            not server.error_rate or random.random() >= server.error_rate
+        ):
+            return False
+        self._send(
+            500,
+            {
+                "error": {
+                    "type": "api_error",
+                    "message": "Injected error from fake Stripe server",
+                }
+            },
+        )
+        return True
+
+    def _send(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Request-Id", f"req_{next(self.server.ids)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """
+    Локальный HTTP сервер, имитирующий Stripe API для нагрузочных тестов.
+
+    Для использования укажите STRIPE_API_BASE = server.url.
+
+    Attributes:
+        latency (float): Задержка каждого ответа в секундах
+        jitter (float): Максимальная случайная добавка к задержке в секундах
+        error_rate (float): Доля запросов, на которые возвращается ошибка 500
+        fail_params (dict): Параметры формы POST запросов, на которые всегда
+            возвращается ошибка 500, например {"name": "Товар"}
+        objects (dict): Созданные объекты по ресурсам, например payment_intents
+        received (list[dict]): Полученные POST запросы: путь, параметры формы
+            и Idempotency-Key
+        requests_count (int): Количество полученных запросов
+        connections_count (int): Количество принятых TCP соединений
+    """
+
+    daemon_threads = True
+    # Очередь на accept для сотен одновременных соединений (по умолчанию 5)
+    request_queue_size = 1024
+
+    def __init__(
+        self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0
+    ):
+        super().__init__((host, port), FakeStripeHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fail_params = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.idempotent_responses = {}
+        self.objects = {}
+        self.received = []
+        self.requests_count = 0
+        self.connections_count = 0
+        self._thread = None
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections_count += 1
+        super().process_request(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Запускает сервер в фоновом потоке."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер."""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный заменитель Stripe API")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeStripeServer(
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+    )
+    print(f"Fake Stripe API: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,31 @@
+import json
+import logging
+from datetime import datetime, timezone
+
+# Атрибуты LogRecord, которые не относятся к полям из extra
+RESERVED_ATTRS = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))
+) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует записи лога в одну строку JSON.
+
+    Поля, переданные через extra (например, stripe_operation и duration_ms),
+    попадают в JSON отдельными ключами.
+    """
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -0,0 +1,168 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+
+from stripe_app.management.commands.benchmark import (
+    BENCHMARK_CACHES,
+    benchmark_database,
+    percentile,
+)
+from stripe_app.models import Item, Order, OrderLine
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает страницу заказа из нескольких потоков параллельно с пересчетом "
+        "стоимости заказов и выводит пропускную способность для текущей БД. "
+        "Заказы создаются в тестовой БД, рабочая БД не изменяется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--orders",
+            type=int,
+            default=100,
+            help="Количество заказов в тестовой БД",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Количество параллельных потоков",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Количество запросов в каждом потоке",
+        )
+        parser.add_argument(
+            "--write-ratio",
+            type=float,
+            default=0.2,
+            help="Доля запросов, пересчитывающих стоимость заказа (0..1)",
+        )
+        parser.add_argument(
+            "--page-cache",
+            action="store_true",
+            help="Не отключать кеш страниц (по умолчанию страница рендерится заново)",
+        )
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            overrides = {
+                "ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"],
+                "CACHES": BENCHMARK_CACHES,
+            }
+            if not options["page_cache"]:
+                overrides["PAGE_CACHE_TTL"] = 0
+            with override_settings(**overrides):
+                order_ids = self._create_orders(options["orders"])
+                latencies, errors, elapsed = self._run(order_ids, options)
+            database = self._describe_database()
+
+        total = len(latencies)
+        self.stdout.write(f"БД: {database}")
+        self.stdout.write(
+            f"Запросов: {total}, ошибок: {errors}, "
+            f"время: {elapsed:.2f} с, {total / elapsed:.1f} запросов/с"
+        )
+        self.stdout.write(
+            f"Задержка: p50 {statistics.median(latencies) * 1000:.1f} мс, "
+            f"p99 {percentile(latencies, 99) * 1000:.1f} мс"
+        )
+
+    def _create_orders(self, count):
+        """
+        Создает товары и заказы из нескольких позиций для нагрузки.
+
+        Args:
+            count (int): Количество заказов
+
+        Returns:
+            list[int]: ID созданных заказов
+        """
+        items = [
+            Item.objects.create(name=f"Товар {i}", price=Decimal("19.99") + i)
+            for i in range(10)
+        ]
+        orders = [Order.objects.create() for _ in range(max(count, 1))]
+        OrderLine.objects.bulk_create(
+            [
+                OrderLine(
+                    order=order,
+                    item=item,
+                    quantity=i + 1,
+                    unit_amount=item.unit_amount,
+                )
+                for order in orders
+                for i, item in enumerate(random.sample(items, 3))
+            ]
+        )
+        for order in orders:
+            order.calc_total_price()
+        return [order.id for order in orders]
+
+    def _run(self, order_ids, options):
+        """
+        Нагружает страницы заказов из нескольких потоков.
+
+        Args:
+            order_ids (list[int]): ID заказов
+            options (dict): Параметры команды
+
+        Returns:
+            tuple: Отсортированные задержки запросов, количество ошибок и
+            общее время в секундах
+        """
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            client = Client()
+            local_latencies = []
+            local_errors = 0
+            try:
+                for _ in range(options["requests"]):
+                    order_id = rng.choice(order_ids)
+                    start = time.perf_counter()
+                    try:
+                        if rng.random() < options["write_ratio"]:
+                            Order.objects.get(id=order_id).calc_total_price()
+                        else:
+                            response = client.get(f"/stripe_app/order/{order_id}/")
+                            if response.status_code != 200:
+                                local_errors += 1
+                    except OperationalError:
+                        local_errors += 1
+                    local_latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            list(executor.map(worker, range(options["threads"])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return latencies, sum(errors), elapsed
+
+    def _describe_database(self):
+        if connection.vendor != "sqlite":
+            return connection.vendor
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            return f"sqlite (journal_mode={cursor.fetchone()[0]})"
@@ -0,0 +1,476 @@
+import hashlib
+import hmac
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from stripe_app.fake_stripe import FakeStripeServer
+from stripe_app.models import Discount, Item, Order, OrderLine, Tax
+from stripe_app.urls import app_name, urlpatterns
+
+WEBHOOK_SECRET = "whsec_benchmark"
+
+# URL, каждый запрос к которым должен обращаться к Stripe, если объекты Stripe
+# не переиспользуются (без --stripe-object-cache)
+STRIPE_URL_NAMES = {
+    "create_checkout_session",
+    "create_order_checkout_session",
+    "create_payment_intent",
+    "create_order_payment_intent",
+}
+
+# Кеш замеров: отдельный от кеша приложения, чтобы страницы объектов тестовой
+# БД не попали в общий файловый кеш под ID реальных объектов
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "stripe_app_benchmark",
+    }
+}
+
+
+def percentile(values, percent):
+    """
+    Возвращает перцентиль отсортированного списка значений.
+
+    Args:
+        values (list): Отсортированные значения
+        percent (float): Перцентиль от 0 до 100
+
+    Returns:
+        float: Значение перцентиля
+    """
+    index = max(0, math.ceil(percent / 100 * len(values)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Создает тестовую БД для замеров и удаляет ее после выхода из блока.
+
+    Рабочая БД не изменяется. Для SQLite вместо общей in-memory БД создается
+    временный файл с теми же настройками соединения (WAL, busy timeout),
+    чтобы потоки ждали блокировку, как в реальном приложении.
+
+    Yields:
+        str: Тип БД (connection.vendor)
+    """
+    old_name = connection.settings_dict["NAME"]
+    tmp_dir = None
+    if connection.vendor == "sqlite":
+        tmp_dir = tempfile.mkdtemp()
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            tmp_dir, "benchmark.sqlite3"
+        )
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection.vendor
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_git_commit():
+    """Возвращает хеш текущего коммита или None, если git недоступен."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет задержку (p50/p99), количество SQL запросов и пропускную "
+        "способность для всех URL stripe_app на тестовой БД с локальным "
+        "заменителем Stripe API и выводит результаты в JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=100,
+            help="Количество измеряемых запросов на каждый URL",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=5,
+            help="Количество неизмеряемых запросов перед замером",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Количество потоков при замере пропускной способности",
+        )
+        parser.add_argument(
+            "--only",
+            action="append",
+            help="Измерять только URL с указанным именем (можно повторять)",
+        )
+        parser.add_argument(
+            "--stripe-latency",
+            type=float,
+            default=0.05,
+            help="Задержка ответов заменителя Stripe в секундах",
+        )
+        parser.add_argument(
+            "--stripe-jitter",
+            type=float,
+            default=0.0,
+            help="Максимальная случайная добавка к задержке Stripe в секундах",
+        )
+        parser.add_argument(
+            "--stripe-error-rate",
+            type=float,
+            default=0.0,
+            help="Доля запросов к Stripe, завершающихся ошибкой 500 (0..1)",
+        )
+        parser.add_argument(
+            "--stripe-object-cache",
+            action="store_true",
+            help=(
+                "Переиспользовать созданные Payment Intent и Checkout Session "
+                "(по умолчанию каждый запрос создает новый объект в Stripe)"
+            ),
+        )
+        parser.add_argument(
+            "--no-page-cache",
+            action="store_true",
+            help="Отключить кеш страниц товаров и заказов",
+        )
+        parser.add_argument(
+            "--output",
+            help="Файл для результатов в JSON (по умолчанию stdout)",
+        )
+        parser.add_argument(
+            "--compare",
+            help="JSON файл с предыдущими результатами для сравнения",
+        )
+
+    def handle(self, *args, **options):
+        patterns = [
+            pattern
+            for pattern in urlpatterns
+            if not options["only"] or pattern.name in options["only"]
+        ]
+        if not patterns:
+            raise CommandError("Не найдено ни одного URL для замера")
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        with benchmark_database() as database:
+            with FakeStripeServer(
+                latency=options["stripe_latency"],
+                jitter=options["stripe_jitter"],
+                error_rate=options["stripe_error_rate"],
+            ) as server:
+                overrides = {
+                    "ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"],
+                    "CACHES": BENCHMARK_CACHES,
+                    "STRIPE_API_BASE": server.url,
+                    "STRIPE_SECRET_KEY_USD": "sk_test_benchmark_usd",
+                    "STRIPE_SECRET_KEY_EUR": "sk_test_benchmark_eur",
+                    "STRIPE_PUBLIC_KEY_USD": "pk_test_benchmark_usd",
+                    "STRIPE_PUBLIC_KEY_EUR": "pk_test_benchmark_eur",
+                    "STRIPE_WEBHOOK_SECRET_USD": WEBHOOK_SECRET,
+                }
+                if not options["stripe_object_cache"]:
+                    overrides["STRIPE_OBJECT_CACHE_TTL"] = 0
+                if options["no_page_cache"]:
+                    overrides["PAGE_CACHE_TTL"] = 0
+                with override_settings(**overrides):
+                    objects = self._create_objects()
+                    results = {
+                        pattern.name: self._run_pattern(
+                            pattern.name, objects, server, options
+                        )
+                        for pattern in patterns
+                    }
+
+        self._check_stripe_calls(results, options)
+
+        report = {
+            "meta": {
+                "timestamp": timezone.now().isoformat(),
+                "git_commit": get_git_commit(),
+                "database": database,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "stripe_latency": options["stripe_latency"],
+                "stripe_jitter": options["stripe_jitter"],
+                "stripe_error_rate": options["stripe_error_rate"],
+                "stripe_object_cache": options["stripe_object_cache"],
+                "page_cache": not options["no_page_cache"],
+            },
+            "results": results,
+        }
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        self._write_summary(results, baseline)
+
+    def _create_objects(self):
+        """
+        Создает товары, скидку, налог и заказ для замеров.
+
+        Stripe ID скидки и налога заполнены заранее, чтобы не ставить задачи
+        в очередь stripe_worker.
+
+        Returns:
+            dict: ID товара и заказа для подстановки в URL и тело запроса корзины
+        """
+        items = [
+            Item.objects.create(name=f"Товар {i}", price=Decimal("19.99") + i)
+            for i in range(3)
+        ]
+        discount = Discount.objects.create(
+            name="Скидка", percent=Decimal("10"), stripe_coupon_id="coupon_benchmark"
+        )
+        tax = Tax.objects.create(
+            name="Налог", percent=Decimal("20"), stripe_tax_id="txr_benchmark"
+        )
+        order = Order.objects.create(discount=discount, tax=tax)
+        OrderLine.objects.bulk_create(
+            [
+                OrderLine(
+                    order=order,
+                    item=item,
+                    quantity=i + 1,
+                    unit_amount=item.unit_amount,
+                )
+                for i, item in enumerate(items)
+            ]
+        )
+        order.calc_total_price()
+        return {
+            "item_id": items[0].id,
+            "order_id": order.id,
+            "cart": {
+                "items": [
+                    {"id": item.id, "quantity": i + 1} for i, item in enumerate(items)
+                ],
+                "discount": discount.id,
+                "tax": tax.id,
+            },
+        }
+
+    def _build_request(self, name, objects):
+        """
+        Возвращает метод, путь и параметры запроса для URL.
+
+        Args:
+            name (str): Имя URL из stripe_app/urls.py
+            objects (dict): ID объектов для подстановки в URL
+
+        Returns:
+            tuple: Метод, путь и параметры для django.test.Client
+        """
+        pattern = next(p for p in urlpatterns if p.name == name)
+        kwargs = {
+            key: value
+            for key, value in objects.items()
+            if key in pattern.pattern.converters
+        }
+        path = reverse(f"{app_name}:{name}", kwargs=kwargs)
+        if name == "create_cart_order":
+            return (
+                "post",
+                path,
+                {
+                    "data": json.dumps(objects["cart"]),
+                    "content_type": "application/json",
+                },
+            )
+        if name != "stripe_webhook":
+            return "get", path, {}
+
+        event = {
+            "id": f"evt_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": "payment_intent.succeeded",
+            "data": {
+                "object": {
+                    "id": "pi_benchmark",
+                    "object": "payment_intent",
+                    "metadata": {"order_id": str(objects["order_id"])},
+                }
+            },
+        }
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            WEBHOOK_SECRET.encode(),
+            f"{timestamp}.{payload}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        return (
+            "post",
+            path,
+            {
+                "data": payload,
+                "content_type": "application/json",
+                "HTTP_STRIPE_SIGNATURE": f"t={timestamp},v1={signature}",
+            },
+        )
+
+    def _request(self, client, name, objects):
+        method, path, params = self._build_request(name, objects)
+        response = getattr(client, method)(path, **params)
+        return path, response.status_code < 400
+
+    def _run_pattern(self, name, objects, server, options):
+        """
+        Измеряет задержку, SQL запросы и пропускную способность одного URL.
+
+        Args:
+            name (str): Имя URL из stripe_app/urls.py
+            objects (dict): ID объектов для подстановки в URL
+            server (FakeStripeServer): Заменитель Stripe API
+            options (dict): Параметры команды
+
+        Returns:
+            dict: Результаты замера
+        """
+        # Каждый запрос выполняется новым клиентом (новая сессия и покупатель),
+        # чтобы Payment Intent и Checkout Session не переиспользовались
+        for _ in range(options["warmup"]):
+            self._request(Client(), name, objects)
+
+        latencies = []
+        queries = 0
+        errors = 0
+        stripe_calls = server.requests_count
+        for _ in range(options["requests"]):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                path, ok = self._request(Client(), name, objects)
+                latencies.append(time.perf_counter() - start)
+            queries += len(captured)
+            errors += not ok
+        stripe_calls = server.requests_count - stripe_calls
+
+        lock = threading.Lock()
+        throughput_errors = []
+
+        def worker(count):
+            worker_errors = 0
+            try:
+                for _ in range(count):
+                    worker_errors += not self._request(Client(), name, objects)[1]
+            finally:
+                connection.close()
+            with lock:
+                throughput_errors.append(worker_errors)
+
+        concurrency = options["concurrency"]
+        counts = [
+            options["requests"] // concurrency + (i < options["requests"] % concurrency)
+            for i in range(concurrency)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, counts))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        requests = options["requests"]
+        return {
+            "path": path,
+            "requests": requests,
+            "errors": errors + sum(throughput_errors),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+            "queries_per_request": round(queries / requests, 2),
+            "stripe_calls_per_request": round(stripe_calls / requests, 2),
+            "throughput_rps": round(requests / elapsed, 1),
+        }
+
+    def _check_stripe_calls(self, results, options):
+        """
+        Проверяет, что URL оплаты действительно обращались к Stripe.
+
+        Без --stripe-object-cache каждый запрос к ним создает объект Stripe;
+        ноль вызовов означает, что замер показывает только кеш.
+
+        Args:
+            results (dict): Результаты замеров по именам URL
+            options (dict): Параметры команды
+
+        Raises:
+            CommandError: Если URL оплаты не обращался к Stripe
+        """
+        if options["stripe_object_cache"] or options["stripe_error_rate"]:
+            return
+        missing = sorted(
+            name
+            for name, result in results.items()
+            if name in STRIPE_URL_NAMES and result["stripe_calls_per_request"] < 1
+        )
+        if missing:
+            raise CommandError(
+                f"URL не обращались к Stripe при каждом запросе: {', '.join(missing)}"
+            )
+
+    def _write_summary(self, results, baseline):
+        """
+        Выводит в stderr таблицу результатов и изменения относительно baseline.
+
+        Args:
+            results (dict): Результаты замеров по именам URL
+            baseline (dict): Предыдущий отчет команды или None
+        """
+        previous = (baseline or {}).get("results", {})
+        columns = ("p50_ms", "p99_ms", "queries_per_request", "throughput_rps")
+        header = f"{'url':<32}" + "".join(f"{column:>26}" for column in columns)
+        self.stderr.write(header)
+        for name, result in results.items():
+            line = f"{name:<32}"
+            for column in columns:
+                value = result[column]
+                cell = f"{value}"
+                old = previous.get(name, {}).get(column)
+                if old:
+                    cell += f" ({(value - old) / old * 100:+.1f}%)"
+                line += f"{cell:>26}"
+            self.stderr.write(line)
@@ -0,0 +1,61 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from stripe_app.catalog import FORMATS, detect_format, export_lines
+from stripe_app.models import Item
+
+
+class Command(BaseCommand):
+    help = "Выгружает товары в CSV или JSONL файл, читая БД пакетами."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Путь к файлу (по умолчанию stdout)",
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Формат файла (по умолчанию определяется по расширению, иначе CSV)",
+        )
+        parser.add_argument(
+            "--currency",
+            help="Выгрузить только товары в указанной валюте",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Количество товаров, читаемых из БД за один запрос",
+        )
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        file_format = options["format"] or detect_format(path)
+        items = Item.objects.all()
+        if options["currency"]:
+            items = items.filter(currency=options["currency"].lower())
+
+        started = time.monotonic()
+        rows = 0
+        stream = (
+            sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+        )
+        try:
+            for line in export_lines(items, file_format, options["batch_size"]):
+                stream.write(line)
+                rows += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        if file_format == "csv":
+            rows -= 1  # заголовок
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f"Выгружено {rows} товаров за {elapsed:.1f} с "
+            f"({rows / elapsed if elapsed else 0:.0f} строк/с)"
+        )
@@ -0,0 +1,111 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stripe_app.catalog import (
+    FORMATS,
+    batched,
+    detect_format,
+    read_rows,
+    reset_item_sequence,
+    upsert_items,
+    validate_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает товары из CSV или JSONL файла пакетами: записи с id "
+        "обновляют существующие товары, без id - создают новые."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу или - для stdin")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Формат файла (по умолчанию определяется по расширению)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество товаров в одном INSERT ... ON CONFLICT",
+        )
+        parser.add_argument(
+            "--max-errors",
+            type=int,
+            default=100,
+            help="Прервать загрузку, если ошибочных строк больше указанного",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только проверить файл, не записывая товары",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+        self.max_errors = options["max_errors"]
+        self.error_count = 0
+        created = updated = rows = 0
+        errors = []
+
+        started = time.monotonic()
+        stream = (
+            sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+        )
+        try:
+            items = validate_rows(read_rows(stream, file_format), errors)
+            for batch in batched(items, options["batch_size"]):
+                self.write_errors(errors)
+                rows += len(batch)
+                if not options["dry_run"]:
+                    batch_created, batch_updated = upsert_items(batch)
+                    created += batch_created
+                    updated += batch_updated
+                if options["verbosity"] >= 2:
+                    self.stdout.write(
+                        f"Обработано {rows} строк "
+                        f"({self.rate(rows, started):.0f} строк/с)"
+                    )
+            self.write_errors(errors)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if created:
+                reset_item_sequence()
+
+        rows += self.error_count
+        if options["dry_run"]:
+            summary = f"Проверено {rows} строк"
+        else:
+            summary = f"Создано {created}, обновлено {updated}"
+        self.stdout.write(
+            f"{summary}, ошибок {self.error_count} за "
+            f"{time.monotonic() - started:.1f} с "
+            f"({self.rate(rows, started):.0f} строк/с)"
+        )
+
+    def rate(self, rows, started):
+        """Возвращает скорость обработки в строках в секунду."""
+        elapsed = time.monotonic() - started
+        return rows / elapsed if elapsed else 0
+
+    def write_errors(self, errors):
+        """
+        Выводит накопленные ошибки проверки строк.
+
+        Raises:
+            CommandError: Если ошибочных строк больше max_errors
+        """
+        for line_num, message in errors:
+            self.stderr.write(f"Строка {line_num}: {message}")
+        self.error_count += len(errors)
+        errors.clear()
+        if self.error_count > self.max_errors:
+            raise CommandError(
+                f"Ошибочных строк больше {self.max_errors}, загрузка прервана"
+            )
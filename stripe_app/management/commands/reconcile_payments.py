@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stripe_app.models import CURRENCY_CHOICES
+from stripe_app.reconciliation import reconcile_payments
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет статусы оплаты заказов со списками Checkout Session и Payment "
+        "Intent в Stripe, начиная с сохраненной позиции прошлой сверки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--account",
+            action="append",
+            choices=[currency for currency, _ in CURRENCY_CHOICES],
+            help="Сверить только аккаунт указанной валюты (можно повторять)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество заказов, обновляемых за одну запись в БД",
+        )
+        parser.add_argument(
+            "--lookback",
+            type=int,
+            default=settings.STRIPE_RECONCILE_LOOKBACK,
+            help="Сколько секунд перепроверять незавершенные платежи",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Повторять сверку с указанной паузой в секундах (0 - один раз)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.monotonic()
+                results = reconcile_payments(
+                    options["batch_size"], options["lookback"], options["account"]
+                )
+                for (account, resource), stats in results.items():
+                    self.stdout.write(
+                        f"{account} {resource}: просмотрено {stats['seen']}, "
+                        f"заказов {stats['matched']}, обновлено {stats['updated']}"
+                    )
+                self.stdout.write(f"Готово за {time.monotonic() - started:.1f} с")
+                if not options["interval"]:
+                    return
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Сверка остановлена")
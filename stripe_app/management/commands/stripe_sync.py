@@ -0,0 +1,322 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stripe_app.models import Discount, Item, Tax
+from stripe_app.services import (
+    create_stripe_coupon_for_discount,
+    create_stripe_objects_for_item,
+    create_stripe_tax_rate_for_tax,
+    get_cached_stripe_price,
+    get_stripe_api_key,
+    get_stripe_client,
+    remember_stripe_price,
+)
+
+
+class RateLimiter:
+    """
+    Ограничивает количество запросов к Stripe в секунду для всех потоков.
+
+    Attributes:
+        interval (float): Минимальный интервал между запросами в секундах
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_at = time.monotonic()
+
+    def wait(self, calls=1):
+        """
+        Ожидает, пока можно будет выполнить указанное количество запросов.
+
+        Args:
+            calls (int): Количество запросов, которое будет выполнено
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at)
+            self._next_at = start + self.interval * calls
+        if start > now:
+            time.sleep(start - now)
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает в Stripe недостающие продукты/цены товаров, купоны скидок "
+        "и налоговые ставки пакетами и параллельно."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only",
+            action="append",
+            choices=["items", "discounts", "taxes"],
+            help="Синхронизировать только указанные модели (можно повторять)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество записей, читаемых из БД за один запрос",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.STRIPE_MAX_CONCURRENCY,
+            help="Количество параллельных запросов к Stripe",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=20,
+            help="Максимум запросов к Stripe в секунду (0 - без ограничения)",
+        )
+        parser.add_argument(
+            "--max-retries",
+            type=int,
+            default=5,
+            help="Количество повторов при превышении лимита запросов Stripe",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Сверить сохраненные ID со списками объектов в Stripe",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, сколько объектов нужно создать",
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.max_retries = options["max_retries"]
+        self.dry_run = options["dry_run"]
+        self.limiter = RateLimiter(options["rate"])
+        models = options["only"] or ["items", "discounts", "taxes"]
+
+        started = time.monotonic()
+        if options["verify"]:
+            self.verify(models)
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            self.executor = executor
+            if "items" in models:
+                self.report("Товары", *self.sync_items())
+            if "discounts" in models:
+                self.report(
+                    "Скидки",
+                    *self.sync_stripe_ids(
+                        Discount, "stripe_coupon_id", create_stripe_coupon_for_discount
+                    ),
+                )
+            if "taxes" in models:
+                self.report(
+                    "Налоги",
+                    *self.sync_stripe_ids(
+                        Tax, "stripe_tax_id", create_stripe_tax_rate_for_tax
+                    ),
+                )
+
+        self.stdout.write(f"Готово за {time.monotonic() - started:.1f} с")
+
+    def report(self, title, created, failed):
+        """Выводит итог синхронизации одной модели."""
+        action = "нужно создать" if self.dry_run else "создано"
+        self.stdout.write(f"{title}: {action} {created}, ошибок {failed}")
+
+    def call_stripe(self, func, obj, calls=1):
+        """
+        Вызывает функцию создания объекта Stripe с учетом лимита запросов.
+
+        При ответе 429 запрос повторяется с экспоненциальной задержкой.
+
+        Returns:
+            Результат func(obj) или исключение, если создать объект не удалось
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait(calls)
+            try:
+                return func(obj)
+            except stripe.RateLimitError as e:
+                if attempt == self.max_retries:
+                    return e
+                time.sleep(min(0.5 * 2**attempt, 30))
+            except Exception as e:
+                return e
+
+    def batches(self, queryset):
+        """Перебирает queryset пакетами по первичному ключу (keyset pagination)."""
+        last_id = 0
+        while True:
+            batch = list(
+                queryset.filter(id__gt=last_id).order_by("id")[: self.batch_size]
+            )
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    def sync_items(self):
+        """
+        Создает продукты и цены Stripe для товаров без актуальной цены.
+
+        Returns:
+            tuple[int, int]: Количество созданных цен и ошибок
+        """
+        created = failed = 0
+        for batch in self.batches(Item.objects.all()):
+            missing = [item for item in batch if get_cached_stripe_price(item) is None]
+            if self.dry_run:
+                created += len(missing)
+                continue
+
+            results = self.executor.map(
+                lambda item: self.call_stripe(
+                    create_stripe_objects_for_item,
+                    item,
+                    calls=1 if item.stripe_product_id else 2,
+                ),
+                missing,
+            )
+            updated = []
+            for item, result in zip(missing, results):
+                if isinstance(result, Exception):
+                    failed += 1
+                    self.stderr.write(f"Товар #{item.id} ({item.name}): {result}")
+                    continue
+                remember_stripe_price(item, *result)
+                updated.append(item)
+            Item.objects.bulk_update(
+                updated, ["stripe_product_id", "stripe_price_id", "stripe_price_key"]
+            )
+            created += len(updated)
+        return created, failed
+
+    def sync_stripe_ids(self, model, field, create):
+        """
+        Создает объекты Stripe для записей модели с пустым полем field.
+
+        Args:
+            model: Модель Discount или Tax
+            field (str): Поле с ID объекта Stripe
+            create (Callable): Функция создания объекта Stripe
+
+        Returns:
+            tuple[int, int]: Количество созданных объектов и ошибок
+        """
+        created = failed = 0
+        for batch in self.batches(model.objects.filter(**{field: ""})):
+            if self.dry_run:
+                created += len(batch)
+                continue
+
+            results = self.executor.map(
+                lambda obj: self.call_stripe(create, obj), batch
+            )
+            updated = []
+            for obj, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    failed += 1
+                    self.stderr.write(f"{obj}: {result}")
+                    continue
+                setattr(obj, field, result)
+                updated.append(obj)
+            model.objects.bulk_update(updated, [field])
+            created += len(updated)
+        return created, failed
+
+    def list_stripe_ids(self, currency, resource):
+        """
+        Возвращает ID всех объектов Stripe из списка resource (с пагинацией).
+
+        Args:
+            currency (str): Код валюты, определяющий аккаунт Stripe
+            resource (str): Имя сервиса клиента, например "prices"
+
+        Returns:
+            set[str]: ID объектов
+        """
+        service = getattr(get_stripe_client(currency).v1, resource)
+        return {
+            obj.id for obj in service.list(params={"limit": 100}).auto_paging_iter()
+        }
+
+    def reset_missing(self, queryset, field, known_ids, reset):
+        """
+        Очищает поля reset у записей, чей ID в поле field отсутствует в Stripe.
+
+        Args:
+            queryset (QuerySet): Проверяемые записи
+            field (str): Поле с ID объекта Stripe
+            known_ids (set[str]): ID объектов, существующих в Stripe
+            reset (dict): Значения полей для сброса
+
+        Returns:
+            int: Количество записей с отсутствующими в Stripe объектами
+        """
+        stale_count = 0
+        for batch in self.batches(queryset.exclude(**{field: ""})):
+            stale = [obj.id for obj in batch if getattr(obj, field) not in known_ids]
+            stale_count += len(stale)
+            if stale and not self.dry_run:
+                queryset.model.objects.filter(id__in=stale).update(**reset)
+        return stale_count
+
+    def verify(self, models):
+        """
+        Сбрасывает сохраненные ID, которых нет в Stripe, чтобы создать их заново.
+
+        Args:
+            models (list[str]): Синхронизируемые модели
+        """
+        if "items" in models:
+            accounts = {}
+            for currency in ("usd", "eur"):
+                accounts.setdefault(get_stripe_api_key(currency), []).append(currency)
+            for currencies in accounts.values():
+                items = Item.objects.filter(currency__in=currencies)
+                stale_products = self.reset_missing(
+                    items,
+                    "stripe_product_id",
+                    self.list_stripe_ids(currencies[0], "products"),
+                    {
+                        "stripe_product_id": "",
+                        "stripe_price_id": "",
+                        "stripe_price_key": "",
+                    },
+                )
+                stale_prices = self.reset_missing(
+                    items,
+                    "stripe_price_id",
+                    self.list_stripe_ids(currencies[0], "prices"),
+                    {"stripe_price_id": "", "stripe_price_key": ""},
+                )
+                self.stdout.write(
+                    f"Товары ({', '.join(currencies)}): нет в Stripe "
+                    f"продуктов {stale_products}, цен {stale_prices}"
+                )
+
+        for name, model, field, resource in (
+            ("discounts", Discount, "stripe_coupon_id", "coupons"),
+            ("taxes", Tax, "stripe_tax_id", "tax_rates"),
+        ):
+            if name not in models:
+                continue
+            stale = self.reset_missing(
+                model.objects.all(),
+                field,
+                self.list_stripe_ids("usd", resource),
+                {field: ""},
+            )
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: нет в Stripe {stale}"
+            )
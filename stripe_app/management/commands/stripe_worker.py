@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from stripe_app.tasks import run_pending_tasks
+from stripe_app.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет фоновые задачи Stripe из очереди в БД и обрабатывает "
+        "полученные вебхуки Stripe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Максимальное количество задач и событий, забираемых за один раз",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, если в очереди нет готовых задач",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                succeeded, failed = run_pending_tasks(options["batch_size"])
+                if succeeded or failed:
+                    self.stdout.write(f"Выполнено задач: {succeeded}, ошибок: {failed}")
+                events = process_pending_events(options["batch_size"])
+                if events:
+                    self.stdout.write(f"Обработано событий Stripe: {events}")
+                if succeeded or failed or events:
+                    continue
+                if options["once"]:
+                    return
+                else:
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Воркер остановлен")
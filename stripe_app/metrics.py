@@ -0,0 +1,182 @@
+import threading
+from bisect import bisect_left
+
+# Границы бакетов гистограмм длительности (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Базовый класс метрики, хранимой в памяти процесса.
+
+    Attributes:
+        name (str): Имя метрики в формате Prometheus
+        documentation (str): Описание метрики (HELP)
+        labelnames (tuple): Имена меток
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        """Сбрасывает накопленные значения."""
+        with self._lock:
+            self._values.clear()
+
+    def collect(self):
+        """
+        Возвращает строки метрики в текстовом формате Prometheus.
+
+        Returns:
+            list: Строки HELP, TYPE и значений
+        """
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self._lock:
+            values = sorted(
+                (key, self._snapshot(value)) for key, value in self._values.items()
+            )
+        for key, value in values:
+            labels = list(zip(self.labelnames, key))
+            lines.extend(self._collect_value(labels, value))
+        return lines
+
+    def _snapshot(self, value):
+        return value
+
+    def _collect_value(self, labels, value):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Монотонно возрастающий счетчик."""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        Увеличивает счетчик.
+
+        Args:
+            amount (float): Величина увеличения
+            **labels: Значения меток
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Возвращает текущее значение счетчика."""
+        return self._values.get(self._key(labels), 0)
+
+    def _collect_value(self, labels, value):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+
+class Histogram(Metric):
+    """Гистограмма наблюдаемых значений с фиксированными бакетами."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """
+        Добавляет наблюдение.
+
+        Args:
+            value (float): Наблюдаемое значение
+            **labels: Значения меток
+        """
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _snapshot(self, value):
+        counts, total, count = value
+        return list(counts), total, count
+
+    def _collect_value(self, labels, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bucket, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            bucket_labels = labels + [("le", _format_value(float(bucket)))]
+            lines.append(
+                f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+            )
+        inf_labels = labels + [("le", "+Inf")]
+        lines.append(f"{self.name}_bucket{_format_labels(inf_labels)} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def render_metrics():
+    """
+    Возвращает все метрики процесса в текстовом формате Prometheus.
+
+    Returns:
+        str: Текст для ответа эндпоинта /metrics
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+STRIPE_REQUESTS = Counter(
+    "stripe_requests_total",
+    "Количество запросов к Stripe API",
+    ["operation", "account", "status"],
+)
+STRIPE_REQUEST_RETRIES = Counter(
+    "stripe_request_retries_total",
+    "Количество повторных попыток запросов к Stripe API",
+    ["operation", "account"],
+)
+STRIPE_REQUEST_DURATION = Histogram(
+    "stripe_request_duration_seconds",
+    "Длительность запросов к Stripe API с учетом повторных попыток",
+    ["operation", "account"],
+)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stripe_app", "0003_alter_item_options_alter_item_currency_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="stripe_price_id",
+            field=models.CharField(
+                blank=True, max_length=100, verbose_name="ID цены для stripe"
+            ),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="stripe_price_key",
+            field=models.CharField(
+                blank=True, max_length=50, verbose_name="Ключ цены для stripe"
+            ),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="stripe_product_id",
+            field=models.CharField(
+                blank=True, max_length=100, verbose_name="ID продукта для stripe"
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stripe_app", "0005_stripetask"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="paid_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Дата оплаты"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="payment_status",
+            field=models.CharField(
+                choices=[
+                    ("unpaid", "Не оплачен"),
+                    ("processing", "Оплата обрабатывается"),
+                    ("paid", "Оплачен"),
+                    ("failed", "Ошибка оплаты"),
+                ],
+                default="unpaid",
+                max_length=10,
+                verbose_name="Статус оплаты",
+            ),
+        ),
+        migrations.CreateModel(
+            name="StripeEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event_id",
+                    models.CharField(
+                        max_length=255, unique=True, verbose_name="ID события в stripe"
+                    ),
+                ),
+                ("type", models.CharField(max_length=100, verbose_name="Тип события")),
+                ("account", models.CharField(max_length=3, verbose_name="Аккаунт")),
+                ("payload", models.JSONField(verbose_name="Содержимое события")),
+                (
+                    "received_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Получено"),
+                ),
+                (
+                    "processed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Обработано"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Событие Stripe",
+                "verbose_name_plural": "События Stripe",
+                "indexes": [
+                    models.Index(
+                        fields=["processed_at", "id"],
+                        name="stripe_app__process_2f72a9_idx",
+                    )
+                ],
+            },
+        ),
+    ]
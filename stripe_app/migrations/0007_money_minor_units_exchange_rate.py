@@ -0,0 +1,94 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:24
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+def fill_unit_amounts(apps, schema_editor):
+    Item = apps.get_model("stripe_app", "Item")
+    items = list(Item.objects.only("id", "price"))
+    for item in items:
+        item.unit_amount = int(
+            (item.price * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        )
+    Item.objects.bulk_update(items, ["unit_amount"], batch_size=500)
+
+
+def create_exchange_rates(apps, schema_editor):
+    ExchangeRate = apps.get_model("stripe_app", "ExchangeRate")
+    ExchangeRate.objects.bulk_create(
+        [
+            ExchangeRate(currency="usd", rate=Decimal("1")),
+            ExchangeRate(currency="eur", rate=Decimal("1.08")),
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stripe_app", "0006_order_payment_status_stripeevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExchangeRate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "currency",
+                    models.CharField(
+                        choices=[("usd", "USD"), ("eur", "EUR")],
+                        max_length=3,
+                        unique=True,
+                        verbose_name="Валюта",
+                    ),
+                ),
+                (
+                    "rate",
+                    models.DecimalField(
+                        decimal_places=6, max_digits=12, verbose_name="Курс к USD"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Обновлен"),
+                ),
+            ],
+            options={
+                "verbose_name": "Курс валюты",
+                "verbose_name_plural": "Курсы валют",
+            },
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="unit_amount",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="Цена в минимальных единицах валюты",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total_amount",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Общая стоимость в минимальных единицах валюты",
+            ),
+        ),
+        migrations.RunPython(fill_unit_amounts, migrations.RunPython.noop),
+        migrations.RunPython(create_exchange_rates, migrations.RunPython.noop),
+    ]
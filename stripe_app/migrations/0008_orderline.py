@@ -0,0 +1,111 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_order_items_to_lines(apps, schema_editor):
+    Order = apps.get_model("stripe_app", "Order")
+    OrderLine = apps.get_model("stripe_app", "OrderLine")
+    OrderItems = Order.items.through
+    lines = [
+        OrderLine(
+            order_id=order_id,
+            item_id=item_id,
+            quantity=1,
+            unit_amount=unit_amount,
+        )
+        for order_id, item_id, unit_amount in OrderItems.objects.values_list(
+            "order_id", "item_id", "item__unit_amount"
+        ).iterator()
+    ]
+    OrderLine.objects.bulk_create(lines, batch_size=500)
+
+
+def copy_lines_to_order_items(apps, schema_editor):
+    Order = apps.get_model("stripe_app", "Order")
+    OrderLine = apps.get_model("stripe_app", "OrderLine")
+    OrderItems = Order.items.through
+    OrderItems.objects.bulk_create(
+        [
+            OrderItems(order_id=order_id, item_id=item_id)
+            for order_id, item_id in OrderLine.objects.values_list(
+                "order_id", "item_id"
+            ).iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stripe_app", "0007_money_minor_units_exchange_rate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=1, verbose_name="Количество"),
+                ),
+                (
+                    "unit_amount",
+                    models.PositiveBigIntegerField(
+                        blank=True,
+                        null=True,
+                        verbose_name="Цена за единицу в минимальных единицах валюты",
+                    ),
+                ),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="stripe_app.item",
+                        verbose_name="Товар",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="stripe_app.order",
+                        verbose_name="Заказ",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Позиция заказа",
+                "verbose_name_plural": "Позиции заказа",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("order", "item"), name="unique_order_line_item"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(copy_order_items_to_lines, copy_lines_to_order_items),
+        migrations.RemoveField(
+            model_name="order",
+            name="items",
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="items",
+            field=models.ManyToManyField(
+                through="stripe_app.OrderLine",
+                to="stripe_app.item",
+                verbose_name="Товары в заказе",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:44
+
+from django.db import migrations, models
+
+from stripe_app.search import install_search_index, uninstall_search_index
+
+
+def create_search_index(apps, schema_editor):
+    install_search_index(schema_editor.connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stripe_app", "0008_orderline"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["currency", "id"], name="item_currency_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["unit_amount", "id"], name="item_amount_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["currency", "unit_amount", "id"],
+                name="item_currency_amount_id_idx",
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
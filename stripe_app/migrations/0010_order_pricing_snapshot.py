@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stripe_app", "0009_item_catalog_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="discount_amount",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Сумма скидки в минимальных единицах валюты",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="priced_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Время расчета стоимости",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="pricing_currency",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=3,
+                verbose_name="Валюта расчета стоимости",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="pricing_version",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                verbose_name="Версия входных данных расчета",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="subtotal_amount",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Стоимость позиций в минимальных единицах валюты",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="tax_amount",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Сумма налога в минимальных единицах валюты",
+            ),
+        ),
+    ]
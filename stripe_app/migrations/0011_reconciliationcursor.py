@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stripe_app", "0010_order_pricing_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReconciliationCursor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("account", models.CharField(max_length=3, verbose_name="Аккаунт")),
+                (
+                    "resource",
+                    models.CharField(max_length=50, verbose_name="Список объектов"),
+                ),
+                (
+                    "created",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Создано не раньше (Unix time)"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Последняя сверка"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Позиция сверки платежей",
+                "verbose_name_plural": "Позиции сверки платежей",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("account", "resource"),
+                        name="unique_reconciliation_cursor",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,6 +1,52 @@
+import hashlib
+import json
 from decimal import Decimal
+from typing import NamedTuple
 
-from django.db import models
+from django.db import connections, models
+from django.db.models import F, Prefetch, Sum
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from stripe_app.money import (
+    Money,
+    apply_percent,
+    convert_amount,
+    from_minor_units,
+    get_exchange_rates,
+    to_minor_units,
+)
+from stripe_app.search import FTS_TABLE, MIN_QUERY_LENGTH, fts_phrase
+
+CURRENCY_CHOICES = [("usd", "USD"), ("eur", "EUR")]
+
+
+class ItemQuerySet(models.QuerySet):
+    def search(self, query):
+        """
+        Ищет товары по подстроке в названии с использованием индекса.
+
+        В SQLite используется таблица FTS5 с токенизатором trigram, в PostgreSQL -
+        GIN индекс pg_trgm, ускоряющий icontains (см. stripe_app.search). Запросы
+        короче трех символов индекс не ускоряет, для них выполняется icontains.
+
+        Args:
+            query (str): Строка поиска
+
+        Returns:
+            ItemQuerySet: Товары, название которых содержит строку поиска
+        """
+        query = query.strip()
+        if not query:
+            return self
+        if len(query) >= MIN_QUERY_LENGTH and connections[self.db].vendor == "sqlite":
+            return self.filter(
+                pk__in=RawSQL(
+                    f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                    [fts_phrase(query)],
+                )
+            )
+        return self.filter(name__icontains=query)
 
 
 class Item(models.Model):
@@ -12,6 +58,10 @@ class Item(models.Model):
         description (str): Описание товара (опционально)
         price (Decimal): Цена товара
         currency (str): Валюта товара (USD или EUR)
+        unit_amount (int): Цена товара в минимальных единицах валюты (центах)
+        stripe_product_id (str): ID продукта в Stripe (создается при первой оплате)
+        stripe_price_id (str): ID цены в Stripe (создается при первой оплате)
+        stripe_price_key (str): Ключ (валюта:сумма), для которого создана stripe_price_id
     """
 
     name = models.CharField(
@@ -30,10 +80,58 @@ class Item(models.Model):
     )
     currency = models.CharField(
         max_length=3,
-        choices=[("usd", "USD"), ("eur", "EUR")],
+        choices=CURRENCY_CHOICES,
         default="usd",
         verbose_name="Валюта",
     )
+    unit_amount = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Цена в минимальных единицах валюты",
+    )
+    stripe_product_id = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="ID продукта для stripe",
+    )
+    stripe_price_id = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="ID цены для stripe",
+    )
+    stripe_price_key = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name="Ключ цены для stripe",
+    )
+
+    objects = ItemQuerySet.as_manager()
+
+    def reset_stripe_cache(self):
+        """
+        Сбрасывает закешированные ID продукта и цены Stripe.
+
+        Вызывается при изменении названия, цены или валюты товара, чтобы при
+        следующей оплате были созданы актуальные объекты Stripe.
+        """
+        self.stripe_product_id = ""
+        self.stripe_price_id = ""
+        self.stripe_price_key = ""
+
+    @property
+    def money(self):
+        """
+        Цена товара в минимальных единицах валюты.
+
+        Returns:
+            Money: Цена товара
+        """
+        return Money(self.unit_amount, self.currency)
+
+    def save(self, *args, **kwargs):
+        """Переопределяем save для пересчета unit_amount из price."""
+        self.unit_amount = to_minor_units(self.price, self.currency)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -41,6 +139,14 @@ class Item(models.Model):
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
+        indexes = [
+            models.Index(fields=["currency", "id"], name="item_currency_id_idx"),
+            models.Index(fields=["unit_amount", "id"], name="item_amount_id_idx"),
+            models.Index(
+                fields=["currency", "unit_amount", "id"],
+                name="item_currency_amount_id_idx",
+            ),
+        ]
 
 
 class Discount(models.Model):
@@ -109,18 +215,77 @@ class Tax(models.Model):
         verbose_name_plural = "Налоги"
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_pricing(self):
+        """
+        Загружает заказы вместе со скидкой, налогом и позициями с товарами.
+
+        Скидка и налог подтягиваются через select_related, позиции вместе с
+        товарами - одним дополнительным запросом через prefetch_related, поэтому
+        валюта, проверка валюты и стоимость заказа рассчитываются без новых
+        запросов к БД.
+        """
+        return self.select_related("discount", "tax").prefetch_related(
+            Prefetch("lines", queryset=OrderLine.objects.select_related("item"))
+        )
+
+
+class Pricing(NamedTuple):
+    """
+    Расчет стоимости заказа в минимальных единицах валюты.
+
+    Attributes:
+        subtotal (int): Стоимость позиций в валюте заказа
+        discount (int): Сумма скидки
+        tax (int): Сумма налога
+        total (int): Итоговая стоимость
+        currency (str): Валюта заказа
+        version (str): Хеш входных данных расчета (позиции, скидка, налог, курсы)
+    """
+
+    subtotal: int
+    discount: int
+    tax: int
+    total: int
+    currency: str
+    version: str
+
+
 class Order(models.Model):
     """
     Модель заказа, объединяющая несколько товаров с возможностью применения скидок и налогов.
 
+    Стоимость хранится в заказе снимком (поля subtotal_amount ... pricing_version),
+    который обновляется при изменении позиций, скидки, налога, валюты товаров
+    и курсов (см. stripe_app.recalculation), поэтому страницы заказа не
+    пересчитывают его стоимость.
+
     Attributes:
-        items (ManyToManyField): Товары в заказе
+        items (ManyToManyField): Товары в заказе (через позиции OrderLine)
         total_price (Decimal): Общая стоимость заказа после применения скидок и налогов
+        total_amount (int): Общая стоимость заказа в минимальных единицах валюты
+        subtotal_amount (int): Стоимость позиций без скидки и налога
+        discount_amount (int): Сумма скидки
+        tax_amount (int): Сумма налога
+        pricing_currency (str): Валюта, в которой рассчитана стоимость
+        priced_at (datetime): Время расчета стоимости
+        pricing_version (str): Хеш входных данных расчета (см. Pricing.version)
         discount (ForeignKey): Примененная скидка (опционально)
         tax (ForeignKey): Примененный налог (опционально)
+        payment_status (str): Статус оплаты по данным вебхуков Stripe
+        paid_at (datetime): Время успешной оплаты
     """
 
-    items = models.ManyToManyField(Item, verbose_name="Товары в заказе")
+    UNPAID = "unpaid"
+    PROCESSING = "processing"
+    PAID = "paid"
+    FAILED = "failed"
+
+    items = models.ManyToManyField(
+        Item,
+        through="OrderLine",
+        verbose_name="Товары в заказе",
+    )
     total_price = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -128,6 +293,48 @@ class Order(models.Model):
         null=True,
         verbose_name="Общая стоимость заказа",
     )
+    total_amount = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Общая стоимость в минимальных единицах валюты",
+    )
+    subtotal_amount = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Стоимость позиций в минимальных единицах валюты",
+    )
+    discount_amount = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Сумма скидки в минимальных единицах валюты",
+    )
+    tax_amount = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Сумма налога в минимальных единицах валюты",
+    )
+    pricing_currency = models.CharField(
+        max_length=3,
+        blank=True,
+        editable=False,
+        verbose_name="Валюта расчета стоимости",
+    )
+    priced_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Время расчета стоимости",
+    )
+    pricing_version = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name="Версия входных данных расчета",
+    )
     discount = models.ForeignKey(
         "Discount",
         on_delete=models.SET_NULL,
@@ -142,6 +349,36 @@ class Order(models.Model):
         blank=True,
         verbose_name="Налог",
     )
+    payment_status = models.CharField(
+        max_length=10,
+        choices=[
+            (UNPAID, "Не оплачен"),
+            (PROCESSING, "Оплата обрабатывается"),
+            (PAID, "Оплачен"),
+            (FAILED, "Ошибка оплаты"),
+        ],
+        default=UNPAID,
+        verbose_name="Статус оплаты",
+    )
+    paid_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Дата оплаты",
+    )
+
+    # Поля снимка стоимости, записываемые _set_pricing
+    PRICING_FIELDS = [
+        "total_amount",
+        "total_price",
+        "subtotal_amount",
+        "discount_amount",
+        "tax_amount",
+        "pricing_currency",
+        "priced_at",
+        "pricing_version",
+    ]
+
+    objects = OrderQuerySet.as_manager()
 
     @property
     def currency(self):
@@ -151,49 +388,217 @@ class Order(models.Model):
         Returns:
             str: Код валюты заказа
         """
-        if self.items.exists():
-            return self.items.first().currency
-        return "usd"
+        if self._lines_prefetched():
+            lines = self.lines.all()
+            return lines[0].item.currency if lines else "usd"
+        return self.items.values_list("currency", flat=True).first() or "usd"
+
+    def _lines_prefetched(self):
+        """Проверяет, загружены ли позиции заказа через prefetch_related."""
+        return "lines" in getattr(self, "_prefetched_objects_cache", {})
 
     def clean(self):
         """
         Валидация заказа - проверяет что все товары в одной валюте.
         """
-        if self.pk and self.items.exists():
-            currencies = set(item.currency for item in self.items.all())
-            if len(currencies) > 1:
-                from django.core.exceptions import ValidationError
-
-                raise ValidationError(
-                    f"Все товары в заказе должны быть в одной валюте. "
-                    f"Обнаружены валюты: {', '.join(currencies)}"
-                )
+        if not self.pk:
+            return
+        if self._lines_prefetched():
+            currencies = set(line.item.currency for line in self.lines.all())
+        else:
+            currencies = set(self.items.values_list("currency", flat=True).distinct())
+        if len(currencies) > 1:
+            from django.core.exceptions import ValidationError
+
+            raise ValidationError(
+                f"Все товары в заказе должны быть в одной валюте. "
+                f"Обнаружены валюты: {', '.join(currencies)}"
+            )
 
     def save(self, *args, **kwargs):
-        """Переопределяем save для вызова валидации."""
+        """
+        Переопределяем save для вызова валидации.
+
+        Для уже созданного заказа также отмечает снимок стоимости для пересчета
+        (mark_order_totals_dirty), чтобы изменение скидки или налога отразилось
+        в сохраненной стоимости. Пересчет выполняется после фиксации транзакции
+        один раз, даже если в ней изменялись и позиции заказа. Сохранение только
+        полей снимка (PRICING_FIELDS) пересчет не запускает.
+        """
+        from stripe_app.recalculation import mark_order_totals_dirty
+
         self.clean()
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if adding or (update_fields and set(update_fields) <= set(self.PRICING_FIELDS)):
+            return
+        mark_order_totals_dirty([self.pk])
+
+    def _set_pricing(self, pricing):
+        """Записывает рассчитанную стоимость в поля снимка (PRICING_FIELDS)."""
+        self.subtotal_amount = pricing.subtotal
+        self.discount_amount = pricing.discount
+        self.tax_amount = pricing.tax
+        self.total_amount = pricing.total
+        self.total_price = from_minor_units(pricing.total, pricing.currency)
+        self.pricing_currency = pricing.currency
+        self.pricing_version = pricing.version
+        self.priced_at = timezone.now()
+
+    def _get_subtotals(self):
+        """
+        Суммирует стоимость позиций заказа (количество * цена) по валютам.
+
+        Если позиции загружены через prefetch_related, суммы считаются по ним,
+        иначе - одним агрегирующим запросом Sum(quantity * unit_amount)
+        с группировкой по валюте.
+
+        Returns:
+            dict: Суммы в минимальных единицах по кодам валют
+        """
+        if self._lines_prefetched():
+            subtotals = {}
+            for line in self.lines.all():
+                currency = line.item.currency
+                subtotals[currency] = subtotals.get(currency, 0) + line.amount
+            return subtotals
+        return dict(
+            self.lines.values("item__currency")
+            .annotate(total=Sum(F("quantity") * F("unit_amount")))
+            .values_list("item__currency", "total")
+        )
+
+    def _pricing_version(self, subtotals, currency):
+        """
+        Возвращает хеш входных данных расчета стоимости.
+
+        Стоимость зависит только от сумм позиций по валютам, процентов скидки
+        и налога и курсов пересчитываемых валют, поэтому одинаковый хеш
+        означает одинаковый результат расчета.
+        """
+
+        def percent(obj):
+            if obj is None:
+                return None
+            return str(Decimal(obj.percent).quantize(Decimal("0.01")))
+
+        converted = sorted(c for c in subtotals if c != currency)
+        rates = []
+        if converted:
+            exchange_rates = get_exchange_rates()
+            rates = [(c, str(exchange_rates.get(c))) for c in [*converted, currency]]
+        payload = {
+            "currency": currency,
+            "subtotals": sorted(subtotals.items()),
+            "discount": percent(self.discount),
+            "tax": percent(self.tax),
+            "rates": rates,
+        }
+        data = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    def compute_pricing(self):
+        """
+        Рассчитывает стоимость заказа с учетом скидок и налогов без записи в БД.
+
+        Расчет ведется в целых минимальных единицах валюты заказа; суммы в других
+        валютах пересчитываются по таблице курсов ExchangeRate. Налог начисляется
+        на сумму после скидки.
+
+        Returns:
+            Pricing: Стоимость позиций, скидка, налог, итог и версия расчета
+        """
+        subtotals = self._get_subtotals()
+        currency = next(iter(subtotals)) if len(subtotals) == 1 else self.currency
+        subtotal = sum(
+            convert_amount(amount, item_currency, currency)
+            for item_currency, amount in subtotals.items()
+        )
+        discount = (
+            apply_percent(subtotal, self.discount.percent) if self.discount else 0
+        )
+        tax = apply_percent(subtotal - discount, self.tax.percent) if self.tax else 0
+        return Pricing(
+            subtotal=subtotal,
+            discount=discount,
+            tax=tax,
+            total=subtotal - discount + tax,
+            currency=currency,
+            version=self._pricing_version(subtotals, currency),
+        )
+
+    def get_pricing(self):
+        """
+        Возвращает сохраненный снимок стоимости без пересчета.
+
+        Если снимок еще не сохранен (заказ создан до его появления), стоимость
+        рассчитывается и записывается в поля объекта без сохранения в БД.
+
+        Returns:
+            Pricing: Стоимость заказа
+        """
+        if not self.pricing_version or self.total_amount is None:
+            self._set_pricing(self.compute_pricing())
+        return Pricing(
+            subtotal=self.subtotal_amount,
+            discount=self.discount_amount,
+            tax=self.tax_amount,
+            total=self.total_amount,
+            currency=self.pricing_currency,
+            version=self.pricing_version,
+        )
+
+    def is_pricing_stale(self):
+        """
+        Проверяет, устарел ли сохраненный снимок стоимости.
+
+        Returns:
+            bool: True, если входные данные расчета изменились после его сохранения
+        """
+        return self.pricing_version != self.compute_pricing().version
+
+    def compute_total(self):
+        """
+        Рассчитывает общую стоимость заказа с учетом скидок и налогов без записи в БД.
+
+        Returns:
+            Money: Общая стоимость заказа после всех расчетов
+        """
+        pricing = self.compute_pricing()
+        return Money(pricing.total, pricing.currency)
+
+    def compute_total_price(self):
+        """
+        Рассчитывает общую стоимость заказа с учетом скидок и налогов без записи в БД.
+
+        Returns:
+            Decimal: Общая стоимость заказа после всех расчетов
+        """
+        return self.compute_total().to_decimal()
 
     def calc_total_price(self):
         """
-        Рассчитывает общую стоимость заказа с учетом скидок и налогов.
+        Пересчитывает общую стоимость заказа и сохраняет ее в total_price.
 
         Returns:
             Decimal: Общая стоимость заказа после всех расчетов
         """
-        total = 0
-        for item in self.items.all():
-            if item.currency == "usd":
-                total += item.price
-            elif item.currency == "eur":
-                total += item.price * Decimal("1.08")
-        if self.discount:
-            total -= total * self.discount.percent / 100
-        if self.tax:
-            total += total * self.tax.percent / 100
-        self.total_price = total
-        self.save()
-        return total
+        self._set_pricing(self.compute_pricing())
+        self.save(update_fields=self.PRICING_FIELDS)
+        return self.total_price
+
+    def get_total_price(self):
+        """
+        Возвращает сохраненную стоимость заказа, не выполняя запись в БД.
+
+        Если стоимость еще не была сохранена, она рассчитывается в памяти.
+
+        Returns:
+            Decimal: Общая стоимость заказа
+        """
+        self.get_pricing()
+        return self.total_price
 
     def __str__(self):
         return f"Order #{self.id}"
@@ -201,3 +606,276 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+
+
+class OrderLine(models.Model):
+    """
+    Позиция заказа: товар, количество и цена на момент добавления в заказ.
+
+    Attributes:
+        order (ForeignKey): Заказ
+        item (ForeignKey): Товар
+        quantity (int): Количество единиц товара
+        unit_amount (int): Цена единицы товара в минимальных единицах валюты
+    """
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="lines",
+        verbose_name="Заказ",
+    )
+    item = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        verbose_name="Товар",
+    )
+    quantity = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Количество",
+    )
+    unit_amount = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        verbose_name="Цена за единицу в минимальных единицах валюты",
+    )
+
+    @property
+    def amount(self):
+        """
+        Стоимость позиции в минимальных единицах валюты.
+
+        Returns:
+            int: Количество, умноженное на цену единицы товара
+        """
+        return self.quantity * self.unit_amount
+
+    @property
+    def unit_price(self):
+        """
+        Цена единицы товара в основных единицах валюты.
+
+        Returns:
+            Decimal: Цена единицы товара
+        """
+        return from_minor_units(self.unit_amount, self.item.currency)
+
+    def save(self, *args, **kwargs):
+        """Переопределяем save, чтобы запомнить текущую цену товара."""
+        if self.unit_amount is None:
+            self.unit_amount = self.item.unit_amount
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.item} x {self.quantity}"
+
+    class Meta:
+        verbose_name = "Позиция заказа"
+        verbose_name_plural = "Позиции заказа"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "item"], name="unique_order_line_item"
+            )
+        ]
+
+
+class StripeTask(models.Model):
+    """
+    Фоновая задача для выполнения запросов к Stripe вне HTTP запроса.
+
+    Задачи хранятся в БД и выполняются командой stripe_worker; при ошибке
+    задача повторяется с экспоненциально растущей задержкой.
+
+    Attributes:
+        name (str): Имя задачи из реестра stripe_app.tasks
+        payload (dict): Аргументы задачи
+        status (str): Статус выполнения
+        attempts (int): Количество выполненных попыток
+        run_at (datetime): Время, не раньше которого задача будет выполнена
+        last_error (str): Текст последней ошибки
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    name = models.CharField(
+        max_length=100,
+        verbose_name="Задача",
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Аргументы",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (PENDING, "Ожидает"),
+            (RUNNING, "Выполняется"),
+            (DONE, "Выполнена"),
+            (FAILED, "Ошибка"),
+        ],
+        default=PENDING,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Попыток",
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Выполнить не раньше",
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name="Последняя ошибка",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создана",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Обновлена",
+    )
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Задача Stripe"
+        verbose_name_plural = "Задачи Stripe"
+        indexes = [models.Index(fields=["status", "run_at"])]
+
+
+class StripeEvent(models.Model):
+    """
+    Событие Stripe, полученное через вебхук.
+
+    Таблица только пополняется: событие сохраняется при получении и помечается
+    обработанным после применения к заказам. Уникальный event_id защищает от
+    повторной обработки событий, которые Stripe отправил несколько раз.
+
+    Attributes:
+        event_id (str): ID события в Stripe
+        type (str): Тип события, например payment_intent.succeeded
+        account (str): Валюта аккаунта Stripe, приславшего событие
+        payload (dict): Исходное содержимое события
+        received_at (datetime): Время получения
+        processed_at (datetime): Время обработки (пусто, если не обработано)
+    """
+
+    event_id = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name="ID события в stripe",
+    )
+    type = models.CharField(
+        max_length=100,
+        verbose_name="Тип события",
+    )
+    account = models.CharField(
+        max_length=3,
+        verbose_name="Аккаунт",
+    )
+    payload = models.JSONField(
+        verbose_name="Содержимое события",
+    )
+    received_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Получено",
+    )
+    processed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Обработано",
+    )
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
+
+    class Meta:
+        verbose_name = "Событие Stripe"
+        verbose_name_plural = "События Stripe"
+        indexes = [models.Index(fields=["processed_at", "id"])]
+
+
+class ReconciliationCursor(models.Model):
+    """
+    Позиция сверки списка объектов Stripe со статусами оплаты заказов.
+
+    Следующий запуск сверки запрашивает у Stripe только объекты, созданные
+    не раньше сохраненного времени, поэтому обрабатываются лишь новые
+    и еще не завершенные платежи.
+
+    Attributes:
+        account (str): Валюта аккаунта Stripe
+        resource (str): Сверяемый список, например payment_intents
+        created (int): Время создания (Unix time), с которого начнется следующая сверка
+        updated_at (datetime): Время последней сверки
+    """
+
+    account = models.CharField(
+        max_length=3,
+        verbose_name="Аккаунт",
+    )
+    resource = models.CharField(
+        max_length=50,
+        verbose_name="Список объектов",
+    )
+    created = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Создано не раньше (Unix time)",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Последняя сверка",
+    )
+
+    def __str__(self):
+        return f"{self.account}: {self.resource}"
+
+    class Meta:
+        verbose_name = "Позиция сверки платежей"
+        verbose_name_plural = "Позиции сверки платежей"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "resource"], name="unique_reconciliation_cursor"
+            )
+        ]
+
+
+class ExchangeRate(models.Model):
+    """
+    Курс валюты к доллару США, используемый при пересчете сумм между валютами.
+
+    Attributes:
+        currency (str): Код валюты
+        rate (Decimal): Стоимость одной единицы валюты в USD
+        updated_at (datetime): Время последнего изменения курса
+    """
+
+    currency = models.CharField(
+        max_length=3,
+        choices=CURRENCY_CHOICES,
+        unique=True,
+        verbose_name="Валюта",
+    )
+    rate = models.DecimalField(
+        max_digits=12,
+        decimal_places=6,
+        verbose_name="Курс к USD",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Обновлен",
+    )
+
+    def __str__(self):
+        return f"1 {self.currency.upper()} = {self.rate} USD"
+
+    class Meta:
+        verbose_name = "Курс валюты"
+        verbose_name_plural = "Курсы валют"
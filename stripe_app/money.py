@@ -0,0 +1,175 @@
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+
+# Количество знаков после запятой для валют (1 USD = 100 центов)
+CURRENCY_EXPONENTS = {
+    "usd": 2,
+    "eur": 2,
+}
+
+_rates = {}
+_rates_loaded_at = None
+_rates_lock = threading.Lock()
+
+
+def get_currency_exponent(currency):
+    """
+    Возвращает количество знаков после запятой для валюты.
+
+    Args:
+        currency (str): Код валюты
+
+    Returns:
+        int: Количество знаков после запятой
+    """
+    return CURRENCY_EXPONENTS.get(currency.lower(), 2)
+
+
+def round_half_up(value):
+    """
+    Округляет Decimal до целого по правилам математического округления.
+
+    Args:
+        value (Decimal): Значение
+
+    Returns:
+        int: Округленное значение
+    """
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_minor_units(amount, currency="usd"):
+    """
+    Переводит сумму в минимальные единицы валюты (центы).
+
+    Args:
+        amount (Decimal): Сумма в основных единицах
+        currency (str): Код валюты
+
+    Returns:
+        int: Сумма в минимальных единицах с математическим округлением
+    """
+    return round_half_up(Decimal(amount).scaleb(get_currency_exponent(currency)))
+
+
+def from_minor_units(amount, currency="usd"):
+    """
+    Переводит сумму из минимальных единиц валюты в основные.
+
+    Args:
+        amount (int): Сумма в минимальных единицах
+        currency (str): Код валюты
+
+    Returns:
+        Decimal: Сумма в основных единицах
+    """
+    return Decimal(amount).scaleb(-get_currency_exponent(currency))
+
+
+def apply_percent(amount, percent):
+    """
+    Возвращает указанный процент от суммы в минимальных единицах.
+
+    Args:
+        amount (int): Сумма в минимальных единицах
+        percent (Decimal): Процент
+
+    Returns:
+        int: Процент от суммы, округленный до минимальной единицы
+    """
+    return round_half_up(amount * Decimal(percent) / 100)
+
+
+class Money(NamedTuple):
+    """
+    Денежная сумма в минимальных единицах валюты.
+
+    Attributes:
+        amount (int): Сумма в минимальных единицах (центах)
+        currency (str): Код валюты
+    """
+
+    amount: int
+    currency: str
+
+    @classmethod
+    def from_decimal(cls, value, currency):
+        """Создает Money из суммы в основных единицах валюты."""
+        return cls(to_minor_units(value, currency), currency)
+
+    def to_decimal(self):
+        """Возвращает сумму в основных единицах валюты."""
+        return from_minor_units(self.amount, self.currency)
+
+    def convert(self, currency):
+        """Возвращает сумму, пересчитанную в другую валюту."""
+        return Money(convert_amount(self.amount, self.currency, currency), currency)
+
+    def __str__(self):
+        return f"{self.to_decimal()} {self.currency.upper()}"
+
+
+def get_exchange_rates():
+    """
+    Возвращает курсы валют к USD из таблицы ExchangeRate.
+
+    Курсы хранятся в памяти процесса и перечитываются из БД не чаще одного раза
+    в EXCHANGE_RATE_CACHE_TTL секунд или после сброса clear_exchange_rates_cache.
+
+    Returns:
+        dict: Курсы по кодам валют
+    """
+    global _rates, _rates_loaded_at
+
+    now = time.monotonic()
+    if (
+        _rates_loaded_at is not None
+        and now - _rates_loaded_at < settings.EXCHANGE_RATE_CACHE_TTL
+    ):
+        return _rates
+
+    from stripe_app.models import ExchangeRate
+
+    with _rates_lock:
+        rates = dict(ExchangeRate.objects.values_list("currency", "rate"))
+        rates.setdefault("usd", Decimal("1"))
+        _rates = rates
+        _rates_loaded_at = now
+    return rates
+
+
+def clear_exchange_rates_cache():
+    """Сбрасывает закешированные курсы валют."""
+    global _rates_loaded_at
+
+    _rates_loaded_at = None
+
+
+def convert_amount(amount, from_currency, to_currency):
+    """
+    Пересчитывает сумму в минимальных единицах из одной валюты в другую.
+
+    Args:
+        amount (int): Сумма в минимальных единицах from_currency
+        from_currency (str): Исходная валюта
+        to_currency (str): Целевая валюта
+
+    Returns:
+        int: Сумма в минимальных единицах to_currency
+
+    Raises:
+        ValueError: Если для валюты не задан курс
+    """
+    if from_currency == to_currency:
+        return amount
+
+    rates = get_exchange_rates()
+    for currency in (from_currency, to_currency):
+        if currency not in rates:
+            raise ValueError(f"Не задан курс для валюты {currency.upper()}")
+    value = from_minor_units(amount, from_currency) * rates[from_currency]
+    return to_minor_units(value / rates[to_currency], to_currency)
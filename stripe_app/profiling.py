@@ -0,0 +1,266 @@
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+from stripe_app.apps import StripeAppConfig
+
+logger = logging.getLogger(__name__)
+
+
+_current_profile = contextvars.ContextVar("stripe_app_profile", default=None)
+_profiler_lock = threading.Lock()
+
+
+class RequestProfile:
+    """
+    Время, затраченное запросом на БД, шаблоны и Stripe.
+
+    Attributes:
+        db_count (int): Количество SQL запросов
+        db_time (float): Время SQL запросов в секундах
+        template_time (float): Время рендеринга шаблонов в секундах
+        stripe_count (int): Количество вызовов Stripe API
+        stripe_time (float): Время вызовов Stripe API в секундах
+        sql (collections.Counter): Количество выполнений каждого SQL запроса
+    """
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.stripe_count = 0
+        self.stripe_time = 0.0
+        self.sql = Counter()
+
+    @property
+    def duplicate_queries(self):
+        """Количество SQL запросов, повторяющих уже выполненные (признак N+1)."""
+        return sum(count - 1 for count in self.sql.values())
+
+
+def record_stripe_call(duration):
+    """
+    Добавляет вызов Stripe API к профилю текущего запроса.
+
+    Args:
+        duration (float): Длительность вызова в секундах
+    """
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.stripe_count += 1
+        profile.stripe_time += duration
+
+
+def _profile_execute(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_time += time.perf_counter() - start
+        profile.db_count += 1
+        profile.sql[sql] += 1
+
+
+@receiver(connection_created)
+def install_profile_execute_wrapper(sender, connection, **kwargs):
+    """
+    Подключает учет SQL запросов к каждому новому соединению с БД.
+
+    Вне профилируемого запроса обертка только проверяет contextvar.
+    """
+    if _profile_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_execute)
+
+
+class ProfiledTemplate(Template):
+    """Шаблон Django, учитывающий время рендеринга в профиле запроса."""
+
+    def render(self, context=None, request=None):
+        profile = _current_profile.get()
+        if profile is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, возвращающий ProfiledTemplate."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запросы к представлениям из stripe_app/urls.py.
+
+    Запрос профилируется, если заголовок X-Profile совпадает с PROFILING_TOKEN
+    или попал в выборку с долей PROFILING_SAMPLE_RATE. Для такого запроса
+    в ответ добавляется заголовок Server-Timing с временем БД, шаблонов и Stripe,
+    разбивка пишется в лог, а отчет cProfile сохраняется в PROFILING_DIR.
+
+    Если профилирование выключено в настройках, middleware не подключается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_TOKEN and not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        state = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(state)
+        return self._finish(request, response, *state)
+
+    async def __acall__(self, request):
+        if not self._should_profile(request):
+            return await self.get_response(request)
+
+        state = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(state)
+        return self._finish(request, response, *state)
+
+    def _should_profile(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        if match.app_name != StripeAppConfig.name:
+            return False
+        header = request.headers.get("X-Profile")
+        if settings.PROFILING_TOKEN and header == settings.PROFILING_TOKEN:
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def _start(self):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        # В процессе одновременно работает только один cProfile; остальные
+        # профилируемые запросы получают только разбивку по времени
+        profiler = None
+        if _profiler_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profile, profiler, token, time.perf_counter()
+
+    def _stop(self, state):
+        profile, profiler, token, start = state
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+        _current_profile.reset(token)
+
+    def _finish(self, request, response, profile, profiler, token, start):
+        total = time.perf_counter() - start
+        timings = [
+            ("db", profile.db_time, f"{profile.db_count} queries"),
+            ("tpl", profile.template_time, "templates"),
+            ("stripe", profile.stripe_time, f"{profile.stripe_count} calls"),
+            ("total", total, "total"),
+        ]
+        response["Server-Timing"] = ", ".join(
+            f'{name};dur={duration * 1000:.2f};desc="{desc}"'
+            for name, duration, desc in timings
+        )
+
+        report_path = self._write_report(request, profile, profiler, total)
+        logger.info(
+            "Профиль запроса %s",
+            request.path,
+            extra={
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(total * 1000, 2),
+                "db_count": profile.db_count,
+                "db_duplicates": profile.duplicate_queries,
+                "db_ms": round(profile.db_time * 1000, 2),
+                "template_ms": round(profile.template_time * 1000, 2),
+                "stripe_count": profile.stripe_count,
+                "stripe_ms": round(profile.stripe_time * 1000, 2),
+                "report": str(report_path),
+            },
+        )
+        return response
+
+    def _write_report(self, request, profile, profiler, total):
+        """
+        Сохраняет отчет cProfile (.prof) и текстовую сводку (.txt).
+
+        Returns:
+            Path: Путь к текстовой сводке
+        """
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = request.resolver_match.url_name if request.resolver_match else "view"
+        stem = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{name}-{total * 1000:.0f}ms"
+        if profiler is not None:
+            profiler.dump_stats(directory / f"{stem}.prof")
+
+        stream = io.StringIO()
+        stream.write(f"{request.method} {request.get_full_path()}\n")
+        stream.write(f"total: {total * 1000:.2f} ms\n")
+        stream.write(
+            f"db: {profile.db_count} queries, {profile.db_time * 1000:.2f} ms, "
+            f"{profile.duplicate_queries} duplicates\n"
+        )
+        stream.write(f"templates: {profile.template_time * 1000:.2f} ms\n")
+        stream.write(
+            f"stripe: {profile.stripe_count} calls, "
+            f"{profile.stripe_time * 1000:.2f} ms\n\n"
+        )
+        repeated = [
+            (sql, count) for sql, count in profile.sql.most_common() if count > 1
+        ]
+        if repeated:
+            stream.write("repeated queries:\n")
+            for sql, count in repeated:
+                stream.write(f"  {count}x {sql}\n")
+            stream.write("\n")
+        if profiler is not None:
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(40)
+
+        path = directory / f"{stem}.txt"
+        path.write_text(stream.getvalue(), encoding="utf-8")
+        return path
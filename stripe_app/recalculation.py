@@ -0,0 +1,150 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from stripe_app.caching import bump_versions
+from stripe_app.models import Order
+
+# Количество заказов, пересчитываемых одним SELECT и одним UPDATE
+RECALCULATION_BATCH_SIZE = 500
+
+_state = threading.local()
+
+
+def _get_state():
+    if not hasattr(_state, "order_ids"):
+        _state.order_ids = set()
+        _state.depth = 0
+        _state.scheduled = None
+    return _state
+
+
+def recalculate_order_totals(order_ids):
+    """
+    Пересчитывает и сохраняет снимок стоимости заказов пачками.
+
+    Заказы загружаются через with_pricing и сохраняются через bulk_update,
+    поэтому на пачку из RECALCULATION_BATCH_SIZE заказов приходится несколько
+    запросов вместо сохранения каждого заказа отдельно. Сигнал post_save при
+    этом не отправляется, поэтому кешированные страницы заказов сбрасываются
+    здесь же.
+
+    Args:
+        order_ids (Iterable[int]): ID заказов
+
+    Returns:
+        int: Количество пересчитанных заказов
+    """
+    order_ids = sorted(set(order_ids))
+    count = 0
+    for start in range(0, len(order_ids), RECALCULATION_BATCH_SIZE):
+        batch = order_ids[start : start + RECALCULATION_BATCH_SIZE]
+        orders = list(Order.objects.with_pricing().filter(pk__in=batch))
+        for order in orders:
+            order._set_pricing(order.compute_pricing())
+        Order.objects.bulk_update(orders, Order.PRICING_FIELDS)
+        bump_versions("order", [order.pk for order in orders])
+        count += len(orders)
+    return count
+
+
+def recalculate_dirty_order_totals():
+    """
+    Пересчитывает стоимость заказов, отмеченных mark_order_totals_dirty.
+
+    Внутри deferred_order_totals ничего не делает: пересчет выполнится
+    при выходе из самого внешнего блока.
+
+    Returns:
+        int: Количество пересчитанных заказов
+    """
+    state = _get_state()
+    state.scheduled = None
+    if state.depth or not state.order_ids:
+        return 0
+    order_ids, state.order_ids = state.order_ids, set()
+    return recalculate_order_totals(order_ids)
+
+
+def _is_scheduled(state):
+    """
+    Проверяет, ожидает ли пересчет фиксации текущей транзакции.
+
+    В state.scheduled хранится зарегистрированный колбэк, он сбрасывается
+    при выполнении пересчета. При откате транзакции или точки сохранения
+    Django удаляет on_commit колбэки без выполнения, поэтому регистрация
+    подтверждается наличием колбэка среди ожидающих колбэков соединения.
+    """
+    return state.scheduled is not None and any(
+        func is state.scheduled
+        for _, func, _ in transaction.get_connection().run_on_commit
+    )
+
+
+def _schedule_recalculation(state):
+    """Регистрирует пересчет при фиксации транзакции не более одного раза."""
+    if not _is_scheduled(state):
+        state.scheduled = functools.partial(recalculate_dirty_order_totals)
+        transaction.on_commit(state.scheduled)
+
+
+def mark_order_totals_dirty(order_ids):
+    """
+    Отмечает заказы, стоимость которых нужно пересчитать.
+
+    Пересчет откладывается до фиксации текущей транзакции (transaction.on_commit),
+    поэтому каждый заказ пересчитывается один раз, сколько бы изменений его
+    состава ни было в транзакции, а колбэк регистрируется один раз на
+    транзакцию. Вне транзакции и вне deferred_order_totals пересчет
+    выполняется сразу.
+
+    Args:
+        order_ids (Iterable[int]): ID заказов
+    """
+    state = _get_state()
+    if not state.depth and not _is_scheduled(state):
+        # Пересчет не ожидает фиксации: отмеченные ранее заказы остались
+        # от откаченной транзакции
+        state.order_ids.clear()
+    state.order_ids.update(order_ids)
+    if not state.depth:
+        _schedule_recalculation(state)
+
+
+def mark_unpaid_order_totals_dirty(orders):
+    """
+    Отмечает для пересчета неоплаченные заказы из queryset.
+
+    Используется при изменении скидки, налога, валюты товара или курса:
+    стоимость оплаченных и оплачиваемых заказов при этом не меняется.
+
+    Args:
+        orders (QuerySet): Заказы, зависящие от измененного объекта
+    """
+    mark_order_totals_dirty(
+        orders.filter(payment_status__in=[Order.UNPAID, Order.FAILED])
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+@contextmanager
+def deferred_order_totals():
+    """
+    Откладывает пересчет стоимости заказов до выхода из блока.
+
+    Полезно для массового изменения заказов вне одной транзакции (например,
+    в management командах): все отмеченные заказы пересчитываются один раз
+    при выходе из самого внешнего блока, а если он находится внутри
+    транзакции - после ее фиксации.
+    """
+    state = _get_state()
+    state.depth += 1
+    try:
+        yield
+    finally:
+        state.depth -= 1
+        if not state.depth and state.order_ids:
+            _schedule_recalculation(state)
@@ -0,0 +1,192 @@
+import time
+
+from django.conf import settings
+
+from stripe_app.models import CURRENCY_CHOICES, Order, ReconciliationCursor
+from stripe_app.services import get_stripe_api_key, get_stripe_client
+from stripe_app.webhooks import apply_order_payment_statuses
+
+# Сверяемые списки Stripe в порядке обработки: Payment Intent точнее отражает
+# состояние оплаты, поэтому его статус записывается последним
+RECONCILED_RESOURCES = ("checkout_sessions", "payment_intents")
+
+# Количество объектов Stripe на страницу списка (максимум API)
+STRIPE_LIST_LIMIT = 100
+
+
+def get_reconciled_accounts():
+    """
+    Возвращает аккаунты Stripe для сверки.
+
+    Если у нескольких валют один и тот же секретный ключ, аккаунт сверяется
+    один раз под первой из них.
+
+    Returns:
+        list[str]: Валюты аккаунтов с заданным секретным ключом
+    """
+    accounts = {}
+    for currency, _ in CURRENCY_CHOICES:
+        api_key = get_stripe_api_key(currency)
+        if api_key:
+            accounts.setdefault(api_key, currency)
+    return list(accounts.values())
+
+
+def list_stripe_objects(account, resource, created):
+    """
+    Перебирает объекты Stripe, созданные не раньше указанного времени.
+
+    Страницы запрашиваются по мере перебора (auto-pagination), от новых
+    объектов к старым.
+
+    Args:
+        account (str): Валюта аккаунта Stripe
+        resource (str): "payment_intents" или "checkout_sessions"
+        created (int): Время создания (Unix time)
+
+    Returns:
+        Iterator[stripe.StripeObject]: Объекты Stripe
+    """
+    v1 = get_stripe_client(account).v1
+    if resource == "checkout_sessions":
+        service = v1.checkout.sessions
+    else:
+        service = v1.payment_intents
+    return service.list(
+        params={"limit": STRIPE_LIST_LIMIT, "created": {"gte": created}}
+    ).auto_paging_iter()
+
+
+def get_object_payment_status(resource, stripe_object):
+    """
+    Определяет статус оплаты заказа по Payment Intent или Checkout Session.
+
+    Args:
+        resource (str): "payment_intents" или "checkout_sessions"
+        stripe_object (dict): Объект Stripe
+
+    Returns:
+        tuple[str, bool]: Статус оплаты (None, если объект не меняет статус
+        заказа) и признак того, что платеж еще может измениться
+    """
+    status = stripe_object.get("status")
+    if resource == "checkout_sessions":
+        if status == "open":
+            return None, True
+        if status != "complete":
+            return None, False
+        if stripe_object.get("payment_status") == "unpaid":
+            return Order.PROCESSING, True
+        return Order.PAID, False
+
+    if status == "succeeded":
+        return Order.PAID, False
+    if status == "canceled":
+        return Order.FAILED, False
+    if status == "processing":
+        return Order.PROCESSING, True
+    if status == "requires_payment_method" and stripe_object.get("last_payment_error"):
+        return Order.FAILED, True
+    return None, True
+
+
+def get_object_order_id(stripe_object):
+    """
+    Возвращает ID заказа из metadata объекта Stripe.
+
+    Args:
+        stripe_object (dict): Объект Stripe
+
+    Returns:
+        int: ID заказа или None, если объект не относится к заказу
+    """
+    order_id = (stripe_object.get("metadata") or {}).get("order_id")
+    if not order_id or not str(order_id).isdigit():
+        return None
+    return int(order_id)
+
+
+def reconcile_resource(account, resource, batch_size=500, lookback=None):
+    """
+    Сверяет статусы оплаты заказов с одним списком объектов Stripe.
+
+    Запрашиваются объекты, созданные не раньше сохраненной позиции сверки.
+    Статусы накапливаются и записываются групповыми UPDATE запросами пачками
+    по batch_size заказов. Список идет от новых объектов к старым, поэтому
+    у заказа остается статус самого нового объекта, а успешная оплата
+    имеет приоритет. Новая позиция - время создания самого старого
+    незавершенного платежа (но не старше lookback секунд), иначе самого
+    нового объекта, поэтому следующий запуск не запрашивает завершенные
+    платежи повторно. Позиция сохраняется только после полного прохода.
+
+    Args:
+        account (str): Валюта аккаунта Stripe
+        resource (str): "payment_intents" или "checkout_sessions"
+        batch_size (int): Количество заказов, обновляемых за одну запись в БД
+        lookback (int): Сколько секунд перепроверять незавершенные платежи
+            (по умолчанию STRIPE_RECONCILE_LOOKBACK)
+
+    Returns:
+        dict: Количество просмотренных объектов (seen), объектов заказов
+        (matched) и измененных заказов (updated)
+    """
+    if lookback is None:
+        lookback = settings.STRIPE_RECONCILE_LOOKBACK
+    started = int(time.time())
+    cursor, _ = ReconciliationCursor.objects.get_or_create(
+        account=account,
+        resource=resource,
+        defaults={"created": max(started - lookback, 0)},
+    )
+
+    stats = {"seen": 0, "matched": 0, "updated": 0}
+    statuses = {}
+    reconciled = set()
+    newest = pending_since = None
+    for stripe_object in list_stripe_objects(account, resource, cursor.created):
+        stats["seen"] += 1
+        created = stripe_object.get("created") or started
+        newest = max(newest or created, created)
+        status, pending = get_object_payment_status(resource, stripe_object)
+        if pending:
+            pending_since = min(pending_since or created, created)
+
+        order_id = get_object_order_id(stripe_object)
+        if order_id is not None and status is not None:
+            stats["matched"] += 1
+            if order_id not in reconciled or status == Order.PAID:
+                reconciled.add(order_id)
+                statuses[order_id] = status
+
+        if len(statuses) >= batch_size:
+            stats["updated"] += apply_order_payment_statuses(statuses)
+            statuses.clear()
+    if statuses:
+        stats["updated"] += apply_order_payment_statuses(statuses)
+
+    next_created = pending_since or newest or cursor.created
+    cursor.created = min(max(next_created, started - lookback, cursor.created), started)
+    cursor.save(update_fields=["created", "updated_at"])
+    return stats
+
+
+def reconcile_payments(batch_size=500, lookback=None, accounts=None):
+    """
+    Сверяет статусы оплаты заказов с Checkout Session и Payment Intent
+    всех аккаунтов Stripe.
+
+    Args:
+        batch_size (int): Количество заказов, обновляемых за одну запись в БД
+        lookback (int): Сколько секунд перепроверять незавершенные платежи
+        accounts (list[str]): Валюты аккаунтов (по умолчанию все настроенные)
+
+    Returns:
+        dict: Статистика reconcile_resource по парам (аккаунт, список)
+    """
+    results = {}
+    for account in accounts or get_reconciled_accounts():
+        for resource in RECONCILED_RESOURCES:
+            results[account, resource] = reconcile_resource(
+                account, resource, batch_size, lookback
+            )
+    return results
@@ -0,0 +1,219 @@
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from stripe_app.metrics import Counter
+
+STRIPE_CIRCUIT_REJECTIONS = Counter(
+    "stripe_circuit_rejections_total",
+    "Количество вызовов Stripe API, отклоненных открытым circuit breaker",
+    ["account"],
+)
+STRIPE_CIRCUIT_OPENED = Counter(
+    "stripe_circuit_opened_total",
+    "Количество переходов circuit breaker аккаунта Stripe в состояние open",
+    ["account"],
+)
+
+_deadline = contextvars.ContextVar("stripe_deadline", default=None)
+
+
+class StripeUnavailableError(Exception):
+    """
+    Stripe недоступен: вызов не выполнялся или был прерван.
+
+    Attributes:
+        retry_after (int): Через сколько секунд имеет смысл повторить запрос
+    """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(StripeUnavailableError):
+    """Circuit breaker аккаунта Stripe открыт, вызов отклонен без запроса."""
+
+
+class StripeDeadlineExceeded(StripeUnavailableError):
+    """Время, отведенное запросу на обращения к Stripe, истекло."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для вызовов Stripe API одного аккаунта.
+
+    В состоянии closed вызовы выполняются, а подряд идущие ошибки считаются.
+    После failure_threshold ошибок breaker переходит в open и отклоняет вызовы
+    recovery_timeout секунд, затем в half-open пропускает не более
+    half_open_max_calls пробных вызовов: успех закрывает breaker, ошибка снова
+    открывает его.
+
+    Attributes:
+        account (str): Валюта аккаунта Stripe
+        failure_threshold (int): Количество ошибок подряд до открытия
+        recovery_timeout (float): Время в состоянии open в секундах
+        half_open_max_calls (int): Количество одновременных пробных вызовов
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, account, failure_threshold, recovery_timeout, half_open_max_calls=1
+    ):
+        self.account = account
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Текущее состояние с учетом истекшего recovery_timeout."""
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self):
+        """
+        Проверяет, можно ли выполнить вызов.
+
+        Raises:
+            CircuitOpenError: Если breaker открыт или пробные вызовы уже идут
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == self.CLOSED:
+                return
+            if (
+                state == self.HALF_OPEN
+                and self._half_open_calls < self.half_open_max_calls
+            ):
+                self._half_open_calls += 1
+                return
+            retry_after = max(self._opened_at + self.recovery_timeout - now, 1)
+
+        STRIPE_CIRCUIT_REJECTIONS.inc(account=self.account)
+        raise CircuitOpenError(
+            f"Stripe ({self.account.upper()}) временно недоступен",
+            retry_after=math.ceil(retry_after),
+        )
+
+    def record_success(self):
+        """Отмечает успешный вызов и закрывает breaker."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        """Отмечает неуспешный вызов и при необходимости открывает breaker."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._failures >= self.failure_threshold
+            ):
+                if self._state != self.OPEN:
+                    STRIPE_CIRCUIT_OPENED.inc(account=self.account)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(account):
+    """
+    Возвращает circuit breaker аккаунта Stripe, общий для процесса.
+
+    Args:
+        account (str): Валюта аккаунта Stripe
+
+    Returns:
+        CircuitBreaker: Circuit breaker аккаунта
+    """
+    breaker = _breakers.get(account)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(
+                account,
+                CircuitBreaker(
+                    account,
+                    failure_threshold=settings.STRIPE_CIRCUIT_FAILURE_THRESHOLD,
+                    recovery_timeout=settings.STRIPE_CIRCUIT_RECOVERY_TIMEOUT,
+                    half_open_max_calls=settings.STRIPE_CIRCUIT_HALF_OPEN_MAX_CALLS,
+                ),
+            )
+    return breaker
+
+
+def reset_circuit_breakers():
+    """Удаляет все circuit breaker (например, после изменения настроек)."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+@contextmanager
+def stripe_deadline(seconds=None):
+    """
+    Ограничивает суммарное время обращений к Stripe внутри блока.
+
+    Таймаут каждого вызова сокращается до оставшегося времени, повторные
+    попытки после истечения срока не выполняются. Вложенный блок не может
+    продлить срок внешнего.
+
+    Args:
+        seconds (float): Длительность в секундах, по умолчанию STRIPE_REQUEST_DEADLINE
+    """
+    if seconds is None:
+        seconds = settings.STRIPE_REQUEST_DEADLINE
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_remaining_time():
+    """
+    Возвращает время до истечения срока stripe_deadline.
+
+    Returns:
+        float: Оставшееся время в секундах или None, если срок не задан
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline():
+    """
+    Проверяет, что срок stripe_deadline не истек.
+
+    Raises:
+        StripeDeadlineExceeded: Если срок истек
+    """
+    remaining = get_remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise StripeDeadlineExceeded("Истекло время ожидания ответа Stripe")
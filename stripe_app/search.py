@@ -0,0 +1,132 @@
+from django.db import connections
+
+ITEM_TABLE = "stripe_app_item"
+FTS_TABLE = "stripe_app_item_fts"
+TRIGRAM_INDEX = "stripe_app_item_name_trgm"
+
+# Токенизатор trigram и pg_trgm индексируют подстроки из трех символов
+MIN_QUERY_LENGTH = 3
+
+SQLITE_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {ITEM_TABLE}
+        BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {ITEM_TABLE}
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name
+        ON {ITEM_TABLE}
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+}
+
+
+def fts_phrase(query):
+    """
+    Экранирует строку поиска как фразу FTS5.
+
+    Args:
+        query (str): Строка поиска
+
+    Returns:
+        str: Выражение MATCH, совпадающее с подстрокой query
+    """
+    return '"{}"'.format(query.replace('"', '""'))
+
+
+def _install_sqlite(cursor, repair=False):
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+    )
+    if repair and cursor.fetchone() is None:
+        return
+    cursor.execute(
+        f"SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN "
+        f"({', '.join('%s' for _ in SQLITE_TRIGGERS)})",
+        list(SQLITE_TRIGGERS),
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    if existing == set(SQLITE_TRIGGERS):
+        return
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"name, content='{ITEM_TABLE}', content_rowid='id', tokenize='trigram')"
+    )
+    for sql in SQLITE_TRIGGERS.values():
+        cursor.execute(sql)
+    # Пока триггеров не было, индекс мог отстать от таблицы товаров
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _install_postgresql(cursor):
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Выражение совпадает с тем, что Django строит для name__icontains
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {ITEM_TABLE} "
+        f"USING gin ((UPPER(name::text)) gin_trgm_ops)"
+    )
+
+
+def install_search_index(using="default"):
+    """
+    Создает индекс поиска товаров по названию, если его еще нет.
+
+    SQLite: таблица FTS5 (токенизатор trigram) с триггерами синхронизации.
+    PostgreSQL: GIN индекс pg_trgm по UPPER(name). Для других СУБД ничего
+    не делает - поиск выполняется через icontains.
+
+    Args:
+        using (str): Алиас базы данных
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            _install_sqlite(cursor)
+        elif connection.vendor == "postgresql":
+            _install_postgresql(cursor)
+
+
+def repair_search_index(using="default"):
+    """
+    Восстанавливает триггеры FTS5 и перестраивает индекс в SQLite.
+
+    SQLite пересоздает таблицу товаров при изменении ее схемы в миграциях,
+    и триггеры синхронизации при этом удаляются. Вызывается после migrate;
+    если индекс поиска не создан (миграция не применена), ничего не делает.
+
+    Args:
+        using (str): Алиас базы данных
+    """
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            _install_sqlite(cursor, repair=True)
+
+
+def uninstall_search_index(using="default"):
+    """
+    Удаляет индекс поиска товаров по названию.
+
+    Args:
+        using (str): Алиас базы данных
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif connection.vendor == "postgresql":
+            cursor.execute(f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}")
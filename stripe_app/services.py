@@ -1,18 +1,36 @@
+import asyncio
+import atexit
+import base64
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+import weakref
+
+import requests
 import stripe
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
 
+from stripe_app.models import CURRENCY_CHOICES, Discount, Item, Order, OrderLine, Tax
+from stripe_app.money import to_minor_units
+from stripe_app.resilience import StripeUnavailableError, reset_circuit_breakers
+from stripe_app.stripe_http import InstrumentedHTTPXClient, InstrumentedRequestsClient
 
-def get_stripe_keys(currency):
-    """
-    Возвращает Stripe ключи для указанной валюты.
+logger = logging.getLogger(__name__)
 
-    Args:
-        currency (str): Код валюты ('usd' или 'eur')
 
-    Returns:
-        dict: Словарь с public и secret ключами
-    """
-    keys = {
+@functools.lru_cache(maxsize=None)
+def _load_stripe_keys():
+    return {
         "usd": {
             "public": settings.STRIPE_PUBLIC_KEY_USD,
             "secret": settings.STRIPE_SECRET_KEY_USD,
@@ -23,6 +41,21 @@ def get_stripe_keys(currency):
         },
     }
 
+
+def get_stripe_keys(currency):
+    """
+    Возвращает Stripe ключи для указанной валюты.
+
+    Ключи читаются из настроек один раз на процесс. В общий кеш они не попадают,
+    чтобы секретные ключи не хранились в файлах или БД.
+
+    Args:
+        currency (str): Код валюты ('usd' или 'eur')
+
+    Returns:
+        dict: Словарь с public и secret ключами
+    """
+    keys = _load_stripe_keys()
     return keys.get(currency.lower(), keys["usd"])
 
 
@@ -53,30 +86,784 @@ def get_stripe_public_key(currency):
     return get_stripe_keys(currency)["public"]
 
 
+def get_stripe_price_key(item):
+    """
+    Возвращает ключ, по которому кешируется цена Stripe для товара.
+
+    Args:
+        item (Item): Объект товара Django
+
+    Returns:
+        str: Ключ вида "валюта:сумма_в_центах"
+    """
+    return f"{item.currency}:{item.unit_amount}"
+
+
+_stripe_clients = {}
+_stripe_http_clients = []
+_stripe_clients_lock = threading.Lock()
+_async_stripe_clients = weakref.WeakKeyDictionary()
+
+
+@atexit.register
+def close_stripe_clients():
+    """Закрывает соединения клиентов Stripe и удаляет клиенты."""
+    with _stripe_clients_lock:
+        http_clients = list(_stripe_http_clients)
+        _stripe_http_clients.clear()
+        _stripe_clients.clear()
+    for http_client in http_clients:
+        http_client.close()
+
+
+@receiver(setting_changed)
+def _clear_stripe_settings_cache(setting, **kwargs):
+    if setting.startswith("STRIPE_"):
+        _load_stripe_keys.cache_clear()
+        close_stripe_clients()
+        _async_stripe_clients.clear()
+        reset_circuit_breakers()
+
+
+def _build_stripe_client(api_key, http_client):
+    """
+    Создает клиент Stripe с указанным HTTP клиентом и общими настройками.
+
+    Args:
+        api_key (str): Секретный ключ Stripe
+        http_client (stripe.HTTPClient): HTTP клиент для запросов к Stripe
+
+    Returns:
+        stripe.StripeClient: Клиент Stripe
+    """
+    base_addresses = {}
+    if settings.STRIPE_API_BASE:
+        base_addresses["api"] = settings.STRIPE_API_BASE
+    return stripe.StripeClient(
+        api_key,
+        http_client=http_client,
+        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+        base_addresses=base_addresses,
+    )
+
+
+def _build_requests_http_client(account):
+    """
+    Создает синхронный HTTP клиент с пулом keep-alive соединений.
+
+    Args:
+        account (str): Валюта аккаунта Stripe для меток метрик
+
+    Returns:
+        InstrumentedRequestsClient: HTTP клиент для синхронных запросов
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=settings.STRIPE_HTTP_POOL_SIZE,
+        pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return InstrumentedRequestsClient(
+        timeout=settings.STRIPE_TIMEOUT,
+        session=session,
+        account=account,
+    )
+
+
+def get_stripe_client(currency):
+    """
+    Возвращает долгоживущий клиент Stripe для аккаунта указанной валюты.
+
+    Клиенты создаются один раз на процесс и переиспользуются между запросами,
+    поэтому TCP/TLS соединения с Stripe не устанавливаются заново, а запросы
+    в разных валютах не изменяют глобальный stripe.api_key.
+
+    Args:
+        currency (str): Код валюты
+
+    Returns:
+        stripe.StripeClient: Клиент Stripe
+    """
+    api_key = get_stripe_api_key(currency)
+    client = _stripe_clients.get(api_key)
+    if client is None:
+        with _stripe_clients_lock:
+            client = _stripe_clients.get(api_key)
+            if client is None:
+                http_client = _build_requests_http_client(currency.lower())
+                client = _build_stripe_client(api_key, http_client)
+                _stripe_http_clients.append(http_client)
+                _stripe_clients[api_key] = client
+    return client
+
+
+def get_async_stripe_client(currency):
+    """
+    Возвращает клиент Stripe для асинхронных запросов (методы *_async).
+
+    При STRIPE_ASYNC_HTTPX (ASGI) клиент с httpx создается один раз на event
+    loop и аккаунт: под ASGI сервером loop один на процесс, и все вызовы
+    Stripe выполняются в нем без потоков. Иначе возвращается долгоживущий
+    клиент get_stripe_client, выполняющий асинхронные запросы в пуле потоков:
+    под WSGI у каждого запроса свой event loop, и клиент на loop не
+    переиспользовал бы соединения.
+
+    Args:
+        currency (str): Код валюты
+
+    Returns:
+        stripe.StripeClient: Клиент Stripe
+    """
+    if not settings.STRIPE_ASYNC_HTTPX:
+        return get_stripe_client(currency)
+    api_key = get_stripe_api_key(currency)
+    clients = _async_stripe_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(api_key)
+    if client is None:
+        client = _build_stripe_client(
+            api_key,
+            InstrumentedHTTPXClient(
+                timeout=settings.STRIPE_TIMEOUT, account=currency.lower()
+            ),
+        )
+        clients[api_key] = client
+    return client
+
+
+def get_cached_stripe_price(item):
+    """
+    Возвращает сохраненный ID цены Stripe, если он актуален для товара.
+
+    Args:
+        item (Item): Объект товара Django
+
+    Returns:
+        str: ID цены в Stripe или None, если цену нужно создать
+    """
+    if item.stripe_price_id and item.stripe_price_key == get_stripe_price_key(item):
+        return item.stripe_price_id
+    return None
+
+
+def remember_stripe_price(item, product_id, price_id):
+    """
+    Запоминает продукт и цену Stripe в объекте товара.
+
+    Args:
+        item (Item): Объект товара Django
+        product_id (str): ID продукта в Stripe
+        price_id (str): ID цены в Stripe
+
+    Returns:
+        dict: Измененные поля товара для update()
+    """
+    item.stripe_product_id = product_id
+    item.stripe_price_id = price_id
+    item.stripe_price_key = get_stripe_price_key(item)
+    return {
+        "stripe_product_id": product_id,
+        "stripe_price_id": price_id,
+        "stripe_price_key": item.stripe_price_key,
+    }
+
+
+def create_stripe_objects_for_item(item):
+    """
+    Создает в Stripe продукт (если его еще нет) и цену для товара без записи в БД.
+
+    Args:
+        item (Item): Объект товара Django
+
+    Returns:
+        tuple[str, str]: ID продукта и ID цены в Stripe
+
+    Raises:
+        stripe.StripeError: Если Stripe вернул ошибку
+    """
+    client = get_stripe_client(item.currency)
+    product_id = item.stripe_product_id
+    if not product_id:
+        product_id = client.v1.products.create(params={"name": item.name}).id
+
+    price = client.v1.prices.create(
+        params={
+            "currency": item.currency,
+            "unit_amount": item.unit_amount,
+            "product": product_id,
+        }
+    )
+    return product_id, price.id
+
+
 def create_stripe_price_for_item(item):
     """
-    Создает продукт и цену в Stripe для указанного товара.
+    Возвращает ID цены в Stripe для указанного товара.
+
+    Продукт и цена создаются в Stripe только один раз и сохраняются в товаре;
+    при последующих оплатах используется сохраненная цена, если цена и валюта
+    товара не изменились.
 
     Args:
         item (Item): Объект товара Django
 
     Returns:
-        str: ID созданной цены в Stripe или None в случае ошибки
+        str: ID цены в Stripe или None в случае ошибки
+
+    Raises:
+        StripeUnavailableError: Если Stripe недоступен (открыт circuit breaker
+            или истек срок stripe_deadline)
     """
+    price_id = get_cached_stripe_price(item)
+    if price_id:
+        return price_id
+
     try:
-        product = stripe.Product.create(name=item.name)
+        product_id, price_id = create_stripe_objects_for_item(item)
+    except StripeUnavailableError:
+        raise
+    except Exception:
+        logger.exception(
+            "Ошибка при создании цены в stripe для %s",
+            item.name,
+            extra={"item_id": item.id},
+        )
+        return None
+
+    Item.objects.filter(id=item.id).update(
+        **remember_stripe_price(item, product_id, price_id)
+    )
+    return price_id
+
+
+async def _create_stripe_price_for_item_async(item):
+    """
+    Возвращает ID цены в Stripe для товара, создавая продукт и цену при необходимости.
+
+    Args:
+        item (Item): Объект товара Django
+
+    Returns:
+        str: ID цены в Stripe
+
+    Raises:
+        stripe.StripeError: Если Stripe вернул ошибку
+    """
+    price_id = get_cached_stripe_price(item)
+    if price_id:
+        return price_id
+
+    client = get_async_stripe_client(item.currency)
+    product_id = item.stripe_product_id
+    if not product_id:
+        product = await client.v1.products.create_async(params={"name": item.name})
+        product_id = product.id
+
+    price = await client.v1.prices.create_async(
+        params={
+            "currency": item.currency,
+            "unit_amount": item.unit_amount,
+            "product": product_id,
+        }
+    )
+    await Item.objects.filter(id=item.id).aupdate(
+        **remember_stripe_price(item, product_id, price.id)
+    )
+    return price.id
 
-        price = stripe.Price.create(
-            currency=item.currency,
-            unit_amount=int(item.price * 100),
-            product=product.id,
+
+async def create_stripe_price_for_item_async(item):
+    """
+    Асинхронная версия create_stripe_price_for_item.
+
+    Args:
+        item (Item): Объект товара Django
+
+    Returns:
+        str: ID цены в Stripe или None в случае ошибки
+
+    Raises:
+        StripeUnavailableError: Если Stripe недоступен (открыт circuit breaker
+            или истек срок stripe_deadline)
+    """
+    try:
+        return await _create_stripe_price_for_item_async(item)
+    except StripeUnavailableError:
+        raise
+    except Exception:
+        logger.exception(
+            "Ошибка при создании цены в stripe для %s",
+            item.name,
+            extra={"item_id": item.id},
         )
-        return price.id
-    except Exception as e:
-        print(f"Ошибка при создании цены в stripe для {item.name}: {e}")
         return None
 
 
+async def resolve_stripe_prices_async(items):
+    """
+    Параллельно получает ID цен Stripe для нескольких товаров.
+
+    Недостающие цены создаются одновременно (не более STRIPE_MAX_CONCURRENCY
+    запросов за раз), поэтому время оформления заказа не растет линейно
+    с количеством товаров.
+
+    Args:
+        items (list[Item]): Товары заказа
+
+    Returns:
+        tuple[dict, dict]: ID цен по ID товаров и тексты ошибок по ID товаров
+
+    Raises:
+        StripeUnavailableError: Если Stripe недоступен (открыт circuit breaker
+            или истек срок stripe_deadline)
+    """
+    semaphore = asyncio.Semaphore(settings.STRIPE_MAX_CONCURRENCY)
+
+    async def resolve(item):
+        async with semaphore:
+            return await _create_stripe_price_for_item_async(item)
+
+    results = await asyncio.gather(
+        *(resolve(item) for item in items), return_exceptions=True
+    )
+    prices = {}
+    errors = {}
+    for item, result in zip(items, results):
+        if isinstance(result, StripeUnavailableError):
+            raise result
+        if isinstance(result, Exception):
+            logger.error(
+                "Ошибка при создании цены в stripe для %s",
+                item.name,
+                exc_info=result,
+                extra={"item_id": item.id},
+            )
+            errors[item.id] = str(result)
+        else:
+            prices[item.id] = result
+    return prices, errors
+
+
+def build_idempotency_key(kind, params, buyer=""):
+    """
+    Строит детерминированный ключ идемпотентности для создания объекта Stripe.
+
+    Ключ зависит от типа объекта, параметров запроса (сумма, валюта, товары,
+    metadata), покупателя и текущего окна STRIPE_OBJECT_CACHE_TTL, поэтому
+    повторные запросы одного покупателя с тем же состоянием товара/заказа
+    в пределах окна получают тот же объект, а разные покупатели - разные.
+    При STRIPE_OBJECT_CACHE_TTL=0 ключ случайный: каждый вызов создает новый
+    объект, а повторные попытки внутри вызова по-прежнему идемпотентны.
+
+    Args:
+        kind (str): Тип объекта Stripe, например "payment_intent"
+        params (dict): Параметры создания объекта
+        buyer (str): Идентификатор покупателя, например ключ сессии
+
+    Returns:
+        str: Ключ идемпотентности
+    """
+    if not settings.STRIPE_OBJECT_CACHE_TTL:
+        return f"{kind}-{uuid.uuid4().hex}"
+    window = int(time.time() // settings.STRIPE_OBJECT_CACHE_TTL)
+    payload = json.dumps([kind, params, buyer, window], sort_keys=True, default=str)
+    return f"{kind}-{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+async def _create_cached_stripe_object_async(
+    kind, currency, get_create, params, field, buyer=""
+):
+    """
+    Создает объект Stripe или возвращает значение поля уже созданного объекта.
+
+    При попадании в кеш запрос к Stripe не выполняется.
+
+    Args:
+        kind (str): Тип объекта Stripe
+        currency (str): Код валюты, определяющий аккаунт Stripe
+        get_create (Callable): Возвращает асинхронный метод создания объекта
+            по клиенту Stripe, например client.v1.payment_intents.create_async
+        params (dict): Параметры создания объекта
+        field (str): Поле объекта, которое нужно вернуть
+        buyer (str): Идентификатор покупателя (см. build_idempotency_key)
+
+    Returns:
+        str: Значение поля field созданного или закешированного объекта
+    """
+    idempotency_key = build_idempotency_key(kind, params, buyer)
+    cache_key = f"stripe:{idempotency_key}"
+    value = await cache.aget(cache_key)
+    if value is None:
+        create = get_create(get_async_stripe_client(currency))
+        stripe_object = await create(
+            params=params, options={"idempotency_key": idempotency_key}
+        )
+        value = getattr(stripe_object, field)
+        await cache.aset(cache_key, value, settings.STRIPE_OBJECT_CACHE_TTL)
+    return value
+
+
+def build_item_payment_intent_params(item):
+    """
+    Возвращает параметры Payment Intent для оплаты одного товара.
+
+    Args:
+        item (Item): Объект товара Django
+
+    Returns:
+        dict: Параметры создания Payment Intent
+    """
+    return {
+        "amount": item.unit_amount,
+        "currency": item.currency,
+        "metadata": {"item_id": item.id},
+        "automatic_payment_methods": {"enabled": True},
+    }
+
+
+def build_order_payment_intent_params(order):
+    """
+    Возвращает параметры Payment Intent для оплаты заказа.
+
+    Args:
+        order (Order): Объект заказа Django со снимком стоимости
+
+    Returns:
+        dict: Параметры создания Payment Intent
+    """
+    pricing = order.get_pricing()
+    return {
+        "amount": pricing.total,
+        "currency": pricing.currency,
+        "metadata": {"order_id": order.id, "type": "order"},
+        "automatic_payment_methods": {"enabled": True},
+    }
+
+
+def create_payment_intent(currency, params, buyer=""):
+    """
+    Создает Payment Intent или возвращает client_secret уже созданного.
+
+    Синхронная версия create_payment_intent_async с тем же ключом
+    идемпотентности и кешем, поэтому страница оплаты и API получают один
+    и тот же Payment Intent.
+
+    Args:
+        currency (str): Код валюты, определяющий аккаунт Stripe
+        params (dict): Параметры создания Payment Intent
+        buyer (str): Идентификатор покупателя (см. build_idempotency_key)
+
+    Returns:
+        str: client_secret Payment Intent
+    """
+    idempotency_key = build_idempotency_key("payment_intent", params, buyer)
+    cache_key = f"stripe:{idempotency_key}"
+    client_secret = cache.get(cache_key)
+    if client_secret is None:
+        payment_intent = get_stripe_client(currency).v1.payment_intents.create(
+            params=params, options={"idempotency_key": idempotency_key}
+        )
+        client_secret = payment_intent.client_secret
+        cache.set(cache_key, client_secret, settings.STRIPE_OBJECT_CACHE_TTL)
+    return client_secret
+
+
+async def create_payment_intent_async(currency, params, buyer=""):
+    """
+    Создает Payment Intent или возвращает client_secret уже созданного.
+
+    Args:
+        currency (str): Код валюты, определяющий аккаунт Stripe
+        params (dict): Параметры создания Payment Intent
+        buyer (str): Идентификатор покупателя (см. build_idempotency_key)
+
+    Returns:
+        str: client_secret Payment Intent
+    """
+    return await _create_cached_stripe_object_async(
+        "payment_intent",
+        currency,
+        lambda client: client.v1.payment_intents.create_async,
+        params,
+        "client_secret",
+        buyer,
+    )
+
+
+async def create_checkout_session_async(currency, params, buyer=""):
+    """
+    Создает Checkout Session или возвращает ID уже созданной.
+
+    Args:
+        currency (str): Код валюты, определяющий аккаунт Stripe
+        params (dict): Параметры создания Checkout Session
+        buyer (str): Идентификатор покупателя (см. build_idempotency_key)
+
+    Returns:
+        str: ID Checkout Session
+    """
+    return await _create_cached_stripe_object_async(
+        "checkout_session",
+        currency,
+        lambda client: client.v1.checkout.sessions.create_async,
+        params,
+        "id",
+        buyer,
+    )
+
+
+def _parse_cart_lines(lines):
+    """
+    Проверяет позиции корзины и объединяет повторяющиеся товары.
+
+    Args:
+        lines (list[dict]): Позиции вида {"id": ID товара, "quantity": количество}
+
+    Returns:
+        dict: Количество по ID товаров
+
+    Raises:
+        ValidationError: Если позиции переданы в неверном формате
+    """
+    if not isinstance(lines, list) or not lines:
+        raise ValidationError("Корзина должна содержать хотя бы один товар")
+    quantities = {}
+    for line in lines:
+        if not isinstance(line, dict):
+            raise ValidationError("Позиция корзины должна быть объектом")
+        item_id = line.get("id")
+        quantity = line.get("quantity", 1)
+        if not isinstance(item_id, int) or isinstance(item_id, bool):
+            raise ValidationError(f"Некорректный ID товара: {item_id!r}")
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise ValidationError(
+                f"Некорректное количество товара {item_id}: {quantity!r}"
+            )
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
+
+
+def _get_optional(model, pk, error):
+    if pk is None:
+        return None
+    obj = None
+    if isinstance(pk, int) and not isinstance(pk, bool):
+        obj = model.objects.filter(pk=pk).first()
+    if obj is None:
+        raise ValidationError(f"{error}: {pk!r}")
+    return obj
+
+
+def create_order_from_cart(lines, discount_id=None, tax_id=None):
+    """
+    Создает заказ с позициями из корзины и один раз рассчитывает его стоимость.
+
+    Товары и их валюты загружаются одним запросом, позиции создаются через
+    bulk_create с текущей ценой товаров, поэтому сигналы пересчета стоимости
+    на каждую позицию не срабатывают; стоимость сохраняется одним UPDATE.
+
+    Args:
+        lines (list[dict]): Позиции вида {"id": ID товара, "quantity": количество}
+        discount_id (int): ID скидки (опционально)
+        tax_id (int): ID налога (опционально)
+
+    Returns:
+        Order: Созданный заказ, загруженный через with_pricing
+
+    Raises:
+        ValidationError: Если корзина некорректна, товары не найдены
+            или указаны в разных валютах
+    """
+    quantities = _parse_cart_lines(lines)
+    items = Item.objects.only("id", "currency", "unit_amount").in_bulk(quantities)
+    missing = sorted(set(quantities) - set(items))
+    if missing:
+        raise ValidationError(
+            f"Товары не найдены: {', '.join(str(pk) for pk in missing)}"
+        )
+    currencies = {item.currency for item in items.values()}
+    if len(currencies) > 1:
+        raise ValidationError(
+            f"Все товары в заказе должны быть в одной валюте. "
+            f"Обнаружены валюты: {', '.join(sorted(currencies))}"
+        )
+    discount = _get_optional(Discount, discount_id, "Скидка не найдена")
+    tax = _get_optional(Tax, tax_id, "Налог не найден")
+
+    with transaction.atomic():
+        order = Order.objects.create(discount=discount, tax=tax)
+        OrderLine.objects.bulk_create(
+            OrderLine(
+                order=order,
+                item=items[item_id],
+                quantity=quantity,
+                unit_amount=items[item_id].unit_amount,
+            )
+            for item_id, quantity in quantities.items()
+        )
+        order = Order.objects.with_pricing().get(pk=order.pk)
+        order._set_pricing(order.compute_pricing())
+        order.save(update_fields=Order.PRICING_FIELDS)
+    return order
+
+
+# Поля сортировки каталога: ключ курсора состоит из их значений
+CATALOG_ORDERINGS = {
+    "id": ("id",),
+    "price": ("unit_amount", "id"),
+}
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 200
+
+
+def encode_catalog_cursor(ordering, item):
+    """
+    Кодирует позицию последнего товара страницы в курсор.
+
+    Args:
+        ordering (str): Сортировка из CATALOG_ORDERINGS
+        item (Item): Последний товар страницы
+
+    Returns:
+        str: Курсор для запроса следующей страницы
+    """
+    key = [getattr(item, field) for field in CATALOG_ORDERINGS[ordering]]
+    payload = json.dumps([ordering, key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_catalog_cursor(ordering, cursor):
+    """
+    Декодирует курсор, полученный от encode_catalog_cursor.
+
+    Args:
+        ordering (str): Сортировка текущего запроса
+        cursor (str): Курсор
+
+    Returns:
+        list[int]: Значения полей сортировки последнего товара предыдущей страницы
+
+    Raises:
+        ValidationError: Если курсор поврежден или выдан для другой сортировки
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_ordering, key = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValidationError("Некорректный курсор")
+    if (
+        cursor_ordering != ordering
+        or not isinstance(key, list)
+        or len(key) != len(CATALOG_ORDERINGS[ordering])
+        or not all(isinstance(value, int) for value in key)
+    ):
+        raise ValidationError("Некорректный курсор")
+    return key
+
+
+def _after_key(fields, key):
+    """Условие "строго после key" для сортировки по fields (keyset пагинация)."""
+    condition = Q(**{f"{fields[-1]}__gt": key[-1]})
+    for field, value in zip(reversed(fields[:-1]), reversed(key[:-1])):
+        condition = Q(**{f"{field}__gt": value}) | (Q(**{field: value}) & condition)
+    return condition
+
+
+def list_catalog_items(
+    currency=None,
+    min_price=None,
+    max_price=None,
+    query="",
+    ordering="id",
+    cursor=None,
+    limit=CATALOG_PAGE_SIZE,
+):
+    """
+    Возвращает страницу каталога товаров с keyset пагинацией.
+
+    Вместо OFFSET следующая страница начинается после ключа сортировки
+    последнего товара предыдущей, поэтому с составными индексами
+    (currency, unit_amount, id) запрос любой страницы читает только
+    limit + 1 строк индекса независимо от размера каталога.
+
+    Args:
+        currency (str): Фильтр по валюте
+        min_price (Decimal): Минимальная цена в основных единицах валюты
+        max_price (Decimal): Максимальная цена в основных единицах валюты
+        query (str): Поиск по названию (см. ItemQuerySet.search)
+        ordering (str): Сортировка: "id" или "price"
+        cursor (str): Курсор предыдущей страницы
+        limit (int): Размер страницы, не больше CATALOG_MAX_PAGE_SIZE
+
+    Returns:
+        tuple[list[Item], str]: Товары страницы и курсор следующей страницы
+            (None, если страница последняя)
+
+    Raises:
+        ValidationError: Если параметры некорректны
+    """
+    if ordering not in CATALOG_ORDERINGS:
+        raise ValidationError(f"Некорректная сортировка: {ordering}")
+    if currency is not None and currency not in dict(CURRENCY_CHOICES):
+        raise ValidationError(f"Некорректная валюта: {currency}")
+    if not 1 <= limit <= CATALOG_MAX_PAGE_SIZE:
+        raise ValidationError(
+            f"Размер страницы должен быть от 1 до {CATALOG_MAX_PAGE_SIZE}"
+        )
+
+    fields = CATALOG_ORDERINGS[ordering]
+    items = Item.objects.only("id", "name", "price", "currency", "unit_amount")
+    if currency:
+        items = items.filter(currency=currency)
+    if min_price is not None:
+        items = items.filter(
+            unit_amount__gte=to_minor_units(min_price, currency or "usd")
+        )
+    if max_price is not None:
+        items = items.filter(
+            unit_amount__lte=to_minor_units(max_price, currency or "usd")
+        )
+    if query:
+        items = items.search(query)
+    if cursor:
+        items = items.filter(
+            _after_key(fields, decode_catalog_cursor(ordering, cursor))
+        )
+
+    page = list(items.order_by(*fields)[: limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_catalog_cursor(ordering, page[-1])
+    return page, next_cursor
+
+
+def create_stripe_coupon_for_discount(discount_instance, idempotency_key=None):
+    """
+    Создает купон в Stripe на основе модели Discount.
+
+    Args:
+        discount_instance (Discount): Объект скидки Django
+        idempotency_key (str): Ключ идемпотентности: повторный запрос с тем же
+            ключом возвращает уже созданный купон
+
+    Returns:
+        str: ID созданного купона в Stripe
+
+    Raises:
+        stripe.StripeError: Если Stripe вернул ошибку
+    """
+    coupon = get_stripe_client("usd").v1.coupons.create(
+        params={
+            "duration": "forever",
+            "percent_off": float(discount_instance.percent),
+            "name": discount_instance.name,
+        },
+        options={"idempotency_key": idempotency_key} if idempotency_key else {},
+    )
+    return coupon.id
+
+
 def create_stripe_coupon(discount_instance):
     """
     Создает купон в Stripe на основе модели Discount.
@@ -88,18 +875,41 @@ def create_stripe_coupon(discount_instance):
         str: ID созданного купона в Stripe или None в случае ошибки
     """
     try:
-        stripe.api_key = settings.STRIPE_SECRET_KEY_USD
-        coupon = stripe.Coupon.create(
-            duration="forever",
-            percent_off=float(discount_instance.percent),
-            name=discount_instance.name,
+        return create_stripe_coupon_for_discount(discount_instance)
+    except Exception:
+        logger.exception(
+            "Ошибка при создании в stripe купона",
+            extra={"discount_id": discount_instance.id},
         )
-        return coupon.id
-    except Exception as e:
-        print(f"Ошибка при создании в stripe купона: {e}")
         return None
 
 
+def create_stripe_tax_rate_for_tax(tax_instance, idempotency_key=None):
+    """
+    Создает налоговую ставку в Stripe на основе модели Tax.
+
+    Args:
+        tax_instance (Tax): Объект налога Django
+        idempotency_key (str): Ключ идемпотентности: повторный запрос с тем же
+            ключом возвращает уже созданную налоговую ставку
+
+    Returns:
+        str: ID созданной налоговой ставки в Stripe
+
+    Raises:
+        stripe.StripeError: Если Stripe вернул ошибку
+    """
+    tax_rate = get_stripe_client("usd").v1.tax_rates.create(
+        params={
+            "display_name": tax_instance.name,
+            "percentage": float(tax_instance.percent),
+            "inclusive": True,
+        },
+        options={"idempotency_key": idempotency_key} if idempotency_key else {},
+    )
+    return tax_rate.id
+
+
 def create_stripe_tax(tax_instance):
     """
     Создает налоговую ставку в Stripe на основе модели Tax.
@@ -111,13 +921,9 @@ def create_stripe_tax(tax_instance):
         str: ID созданной налоговой ставки в Stripe или None в случае ошибки
     """
     try:
-        stripe.api_key = settings.STRIPE_SECRET_KEY_USD
-        tax_rate = stripe.TaxRate.create(
-            display_name=tax_instance.name,
-            percentage=float(tax_instance.percent),
-            inclusive=True,
+        return create_stripe_tax_rate_for_tax(tax_instance)
+    except Exception:
+        logger.exception(
+            "Ошибка при создании в stripe налога", extra={"tax_id": tax_instance.id}
         )
-        return tax_rate.id
-    except Exception as e:
-        print(f"Ошибка при создании в stripe налога: {e}")
         return None
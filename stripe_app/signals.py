@@ -1,7 +1,82 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
-from .models import Discount, Tax, Order
-from .services import create_stripe_coupon, create_stripe_tax
+from django.db import models
+from django.db.models import OuterRef, Subquery
+
+from .caching import bump_versions
+from .models import Discount, Tax, Order, OrderLine, Item, ExchangeRate
+from .money import clear_exchange_rates_cache
+from .recalculation import mark_order_totals_dirty, mark_unpaid_order_totals_dirty
+from .search import repair_search_index
+from .tasks import enqueue_task
+
+
+@receiver(pre_save, sender=Item)
+def reset_item_stripe_cache_signal(sender, instance, **kwargs):
+    """
+    Сигнал для сброса закешированных продукта и цены Stripe при изменении товара.
+
+    Срабатывает перед сохранением модели Item и очищает stripe_product_id,
+    stripe_price_id и stripe_price_key, если изменились название, цена или валюта.
+    """
+    if not instance.pk or not instance.stripe_price_id:
+        return
+    old = (
+        Item.objects.filter(pk=instance.pk).values("name", "price", "currency").first()
+    )
+    if old and (
+        old["name"] != instance.name
+        or old["price"] != instance.price
+        or old["currency"] != instance.currency
+    ):
+        instance.reset_stripe_cache()
+
+
+@receiver(pre_save, sender=Item)
+def remember_item_currency_change(sender, instance, **kwargs):
+    """
+    Сигнал для определения смены валюты товара перед сохранением.
+
+    Цены позиций зафиксированы в OrderLine, поэтому на стоимость заказов влияет
+    только валюта товара; результат используется refresh_item_order_pricing.
+    """
+    instance._currency_changed = bool(instance.pk) and (
+        Item.objects.filter(pk=instance.pk).exclude(currency=instance.currency).exists()
+    )
+
+
+@receiver(post_save, sender=Item)
+def refresh_item_order_pricing(sender, instance, created, **kwargs):
+    """
+    Сигнал для пересчета неоплаченных заказов с товаром после смены его валюты.
+    """
+    if not created and getattr(instance, "_currency_changed", False):
+        mark_unpaid_order_totals_dirty(Order.objects.filter(lines__item=instance))
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_save, sender=Tax)
+@receiver(pre_delete, sender=Discount)
+@receiver(pre_delete, sender=Tax)
+def refresh_discount_tax_order_pricing(sender, instance, **kwargs):
+    """
+    Сигнал для пересчета неоплаченных заказов при изменении или удалении
+    скидки или налога.
+
+    При удалении заказы отмечаются до того, как ссылка на скидку или налог
+    будет обнулена; пересчет выполнится после фиксации транзакции.
+    """
+    if kwargs.get("created"):
+        return
+    field = "discount" if sender is Discount else "tax"
+    mark_unpaid_order_totals_dirty(Order.objects.filter(**{field: instance}))
 
 
 @receiver(post_save, sender=Discount)
@@ -9,13 +84,11 @@ def create_stripe_coupon_signal(sender, instance, created, **kwargs):
     """
     Сигнал для автоматического создания купона в Stripe при создании Discount.
 
-    Срабатывает после сохранения модели Discount и создает соответствующий купон в Stripe,
-    сохраняя его ID в поле stripe_coupon_id.
+    Срабатывает после сохранения модели Discount и ставит в очередь задачу, которая
+    создаст соответствующий купон в Stripe и сохранит его ID в поле stripe_coupon_id.
     """
     if created and not instance.stripe_coupon_id:
-        coupon_id = create_stripe_coupon(instance)
-        if coupon_id:
-            Discount.objects.filter(id=instance.id).update(stripe_coupon_id=coupon_id)
+        enqueue_task("create_stripe_coupon", discount_id=instance.id)
 
 
 @receiver(post_save, sender=Tax)
@@ -23,22 +96,145 @@ def create_stripe_tax_signal(sender, instance, created, **kwargs):
     """
     Сигнал для автоматического создания налоговой ставки в Stripe при создании Tax.
 
-    Срабатывает после сохранения модели Tax и создает соответствующую налоговую ставку в Stripe,
-    сохраняя ее ID в поле stripe_tax_id.
+    Срабатывает после сохранения модели Tax и ставит в очередь задачу, которая создаст
+    соответствующую налоговую ставку в Stripe и сохранит ее ID в поле stripe_tax_id.
     """
     if created and not instance.stripe_tax_id:
-        tax_id = create_stripe_tax(instance)
-        if tax_id:
-            Tax.objects.filter(id=instance.id).update(stripe_tax_id=tax_id)
+        enqueue_task("create_stripe_tax", tax_id=instance.id)
 
 
 @receiver(m2m_changed, sender=Order.items.through)
-def update_order_total(sender, instance, action, **kwargs):
+def update_order_total(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Сигнал для пересчета общей стоимости заказа при изменении состава товаров.
+
+    Срабатывает при добавлении, удалении или очистке товаров в заказе и отмечает
+    заказ для пересчета стоимости с учетом скидок и налогов; пересчет выполняется
+    один раз после фиксации транзакции (см. stripe_app.recalculation), поэтому
+    очистка и повторное добавление товаров не пересчитывают заказ дважды.
+    Позициям, добавленным через order.items.add(), проставляется текущая цена товара.
+    """
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+
+    lines = OrderLine.objects.filter(item=instance) if reverse else instance.lines
+    if action == "post_add":
+        lines.filter(unit_amount__isnull=True).update(
+            unit_amount=Subquery(
+                Item.objects.filter(pk=OuterRef("item_id")).values("unit_amount")[:1]
+            )
+        )
+
+    if not reverse:
+        mark_order_totals_dirty([instance.pk])
+    elif pk_set:
+        mark_order_totals_dirty(pk_set)
+
+
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+def update_order_total_on_line_change(sender, instance, origin=None, **kwargs):
+    """
+    Сигнал для пересчета стоимости заказа при изменении его позиции.
+
+    Срабатывает при создании, изменении или удалении OrderLine напрямую (например,
+    в админке) и отмечает заказ для отложенного пересчета. При удалении самого
+    заказа пересчет не выполняется.
+    """
+    if isinstance(origin, Order) or (
+        isinstance(origin, models.QuerySet) and origin.model is Order
+    ):
+        return
+    mark_order_totals_dirty([instance.order_id])
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def clear_exchange_rates_cache_signal(sender, instance, **kwargs):
+    """
+    Сигнал для сброса кеша курсов валют после изменения ExchangeRate.
+
+    Другие процессы подхватят новый курс по истечении EXCHANGE_RATE_CACHE_TTL.
+    Неоплаченные заказы, в которых суммы в этой валюте пересчитываются в другую
+    валюту, отмечаются для пересчета стоимости.
+    """
+    clear_exchange_rates_cache()
+    mark_unpaid_order_totals_dirty(
+        Order.objects.filter(lines__item__currency=instance.currency).exclude(
+            pricing_currency=instance.currency
+        )
+    )
+
+
+@receiver([post_save, post_delete], sender=Item)
+def invalidate_item_pages(sender, instance, **kwargs):
+    """
+    Сигнал для сброса кешированных страниц товара и заказов, в которые он входит.
+    """
+    bump_versions("item", [instance.pk])
+    bump_versions(
+        "order",
+        OrderLine.objects.filter(item_id=instance.pk).values_list(
+            "order_id", flat=True
+        ),
+    )
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_order_pages(sender, instance, **kwargs):
+    """
+    Сигнал для сброса кешированных страниц заказа.
+
+    После изменения позиций страницы сбрасываются при отложенном пересчете
+    стоимости (stripe_app.recalculation.recalculate_order_totals).
+    """
+    bump_versions("order", [instance.pk])
+
+
+@receiver(m2m_changed, sender=Order.items.through)
+def invalidate_order_pages_on_items_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Сигнал для сброса кешированных страниц заказов при изменении состава товаров.
+    """
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if not reverse:
+        bump_versions("order", [instance.pk])
+    elif pk_set:
+        bump_versions("order", pk_set)
+
+
+@receiver(post_save, sender=Discount)
+@receiver(pre_delete, sender=Discount)
+def invalidate_discount_order_pages(sender, instance, **kwargs):
+    """
+    Сигнал для сброса кешированных страниц заказов со скидкой при ее изменении.
+    """
+    bump_versions(
+        "order",
+        Order.objects.filter(discount=instance).values_list("pk", flat=True),
+    )
+
+
+@receiver(post_save, sender=Tax)
+@receiver(pre_delete, sender=Tax)
+def invalidate_tax_order_pages(sender, instance, **kwargs):
+    """
+    Сигнал для сброса кешированных страниц заказов с налогом при его изменении.
+    """
+    bump_versions(
+        "order",
+        Order.objects.filter(tax=instance).values_list("pk", flat=True),
+    )
+
+
+@receiver(post_migrate)
+def repair_item_search_index(sender, using, **kwargs):
     """
-    Сигнал для автоматического пересчета общей стоимости заказа при изменении состава товаров.
+    Сигнал для восстановления индекса поиска товаров после миграций.
 
-    Срабатывает при добавлении, удалении или очистке товаров в заказе и вызывает
-    пересчет общей стоимости с учетом скидок и налогов.
+    В SQLite изменение схемы таблицы товаров удаляет триггеры FTS5.
     """
-    if action in ["post_add", "post_remove", "post_clear"]:
-        instance.calc_total_price()
+    if sender.name == "stripe_app":
+        repair_search_index(using)
@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import logging
+import re
+import time
+from urllib.parse import urlsplit
+
+import stripe
+
+from stripe_app.metrics import (
+    STRIPE_REQUEST_DURATION,
+    STRIPE_REQUEST_RETRIES,
+    STRIPE_REQUESTS,
+)
+from stripe_app.profiling import record_stripe_call
+from stripe_app.resilience import (
+    StripeDeadlineExceeded,
+    check_deadline,
+    get_circuit_breaker,
+    get_remaining_time,
+)
+
+logger = logging.getLogger(__name__)
+
+# Сегменты пути с ID объектов Stripe (prod_..., pi_..., cs_test_...)
+OBJECT_ID_RE = re.compile(r"^[a-z]+_(?:[a-z]+_)?[A-Za-z0-9]*[A-Z0-9][A-Za-z0-9]*$")
+
+_attempts = contextvars.ContextVar("stripe_attempts", default=None)
+
+
+def get_operation(method, url):
+    """
+    Возвращает имя операции Stripe для меток метрик.
+
+    ID объектов в пути заменяются на {id}, чтобы количество меток не росло.
+
+    Args:
+        method (str): HTTP метод
+        url (str): URL запроса к Stripe
+
+    Returns:
+        str: Имя операции, например "POST /v1/payment_intents"
+    """
+    segments = [
+        "{id}" if OBJECT_ID_RE.match(segment) else segment
+        for segment in urlsplit(url).path.split("/")
+    ]
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+class InstrumentedHTTPClientMixin:
+    """
+    Записывает длительность, количество повторов и результат каждого вызова
+    Stripe API в метрики (stripe_app.metrics) и в структурированный лог.
+
+    Вызовы проходят через circuit breaker аккаунта, а таймаут и повторные
+    попытки ограничиваются сроком stripe_deadline (stripe_app.resilience).
+
+    Attributes:
+        account (str): Валюта аккаунта Stripe для меток метрик
+    """
+
+    def __init__(self, *args, account="", **kwargs):
+        self.account = account
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _timeout(self):
+        remaining = get_remaining_time()
+        if remaining is None:
+            return self._base_timeout
+        return max(min(self._base_timeout, remaining), 0.001)
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self._base_timeout = value
+
+    def _should_retry(self, *args, **kwargs):
+        remaining = get_remaining_time()
+        if remaining is not None and remaining <= 0:
+            return False
+        return super()._should_retry(*args, **kwargs)
+
+    def _before_call(self):
+        check_deadline()
+        breaker = get_circuit_breaker(self.account)
+        breaker.before_call()
+        return breaker
+
+    def _raise_if_deadline_exceeded(self, error):
+        remaining = get_remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise StripeDeadlineExceeded(
+                "Истекло время ожидания ответа Stripe"
+            ) from error
+
+    def _after_call(self, breaker, response):
+        if response is None or response[1] >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _count_attempt(self):
+        attempts = _attempts.get()
+        if attempts is not None:
+            attempts[0] += 1
+
+    def _record(self, method, url, started, attempts, response):
+        duration = time.perf_counter() - started
+        operation = get_operation(method, url)
+        retries = max(attempts - 1, 0)
+        status = str(response[1]) if response is not None else "connection_error"
+
+        record_stripe_call(duration)
+        STRIPE_REQUESTS.inc(operation=operation, account=self.account, status=status)
+        STRIPE_REQUEST_DURATION.observe(
+            duration, operation=operation, account=self.account
+        )
+        if retries:
+            STRIPE_REQUEST_RETRIES.inc(
+                retries, operation=operation, account=self.account
+            )
+
+        ok = response is not None and response[1] < 400
+        logger.log(
+            logging.INFO if ok else logging.WARNING,
+            "Stripe API %s: %s",
+            operation,
+            status,
+            extra={
+                "stripe_operation": operation,
+                "stripe_account": self.account,
+                "stripe_status": status,
+                "stripe_request_id": (
+                    response[2].get("Request-Id") if response is not None else None
+                ),
+                "duration_ms": round(duration * 1000, 2),
+                "retries": retries,
+            },
+        )
+
+    def request_with_retries(self, method, url, headers, post_data=None, *args, **kw):
+        breaker = self._before_call()
+        token = _attempts.set([0])
+        started = time.perf_counter()
+        response = None
+        try:
+            response = super().request_with_retries(
+                method, url, headers, post_data, *args, **kw
+            )
+            return response
+        except stripe.APIConnectionError as e:
+            self._raise_if_deadline_exceeded(e)
+            raise
+        finally:
+            attempts = _attempts.get()[0]
+            _attempts.reset(token)
+            self._after_call(breaker, response)
+            self._record(method, url, started, attempts, response)
+
+    async def request_with_retries_async(
+        self, method, url, headers, post_data=None, *args, **kw
+    ):
+        breaker = self._before_call()
+        token = _attempts.set([0])
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await super().request_with_retries_async(
+                method, url, headers, post_data, *args, **kw
+            )
+            return response
+        except stripe.APIConnectionError as e:
+            self._raise_if_deadline_exceeded(e)
+            raise
+        finally:
+            attempts = _attempts.get()[0]
+            _attempts.reset(token)
+            self._after_call(breaker, response)
+            self._record(method, url, started, attempts, response)
+
+
+class InstrumentedRequestsClient(InstrumentedHTTPClientMixin, stripe.RequestsClient):
+    """
+    HTTP клиент Stripe (requests) с метриками.
+
+    Асинхронные методы клиента Stripe (*_async) выполняют тот же запрос
+    в пуле потоков. Поэтому один долгоживущий клиент с пулом keep-alive
+    соединений обслуживает и синхронный код, и асинхронные views под WSGI,
+    где у каждого запроса свой event loop. Под ASGI используется
+    InstrumentedHTTPXClient (STRIPE_ASYNC_HTTPX).
+    """
+
+    def request(self, *args, **kwargs):
+        self._count_attempt()
+        return super().request(*args, **kwargs)
+
+    async def request_async(self, method, url, headers, post_data=None):
+        return await asyncio.to_thread(self.request, method, url, headers, post_data)
+
+    async def sleep_async(self, secs):
+        await asyncio.sleep(secs)
+
+    def close(self):
+        # Общая для всех потоков сессия с пулом соединений (RequestsClient
+        # закрывает только сессию текущего потока)
+        if self._session is not None:
+            self._session.close()
+        super().close()
+
+    async def close_async(self):
+        await asyncio.to_thread(self.close)
+
+
+class InstrumentedHTTPXClient(InstrumentedHTTPClientMixin, stripe.HTTPXClient):
+    """
+    Асинхронный HTTP клиент Stripe (httpx) с метриками.
+
+    Запросы выполняются в event loop без потоков, поэтому количество
+    одновременных вызовов Stripe не ограничено пулом потоков. Соединения
+    httpx привязаны к event loop, в котором клиент был использован.
+    """
+
+    async def request_async(self, *args, **kwargs):
+        self._count_attempt()
+        return await super().request_async(*args, **kwargs)
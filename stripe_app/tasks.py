@@ -0,0 +1,206 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from stripe_app.models import Discount, StripeTask, Tax
+from stripe_app.services import (
+    create_stripe_coupon_for_discount,
+    create_stripe_tax_rate_for_tax,
+)
+
+logger = logging.getLogger(__name__)
+
+TASK_HANDLERS = {}
+
+
+def task(name):
+    """
+    Регистрирует функцию как обработчик фоновой задачи с указанным именем.
+
+    Args:
+        name (str): Имя задачи
+    """
+
+    def decorator(func):
+        TASK_HANDLERS[name] = func
+        return func
+
+    return decorator
+
+
+def enqueue_task(name, **payload):
+    """
+    Ставит задачу в очередь.
+
+    Задача создается в текущей транзакции, поэтому воркер увидит ее только после
+    фиксации изменений, вызвавших постановку задачи.
+
+    Args:
+        name (str): Имя зарегистрированной задачи
+        **payload: Аргументы задачи (должны сериализоваться в JSON)
+
+    Returns:
+        StripeTask: Созданная задача
+    """
+    if name not in TASK_HANDLERS:
+        raise ValueError(f"Неизвестная задача: {name}")
+    return StripeTask.objects.create(name=name, payload=payload)
+
+
+def get_task_idempotency_key(stripe_task):
+    """
+    Возвращает ключ идемпотентности запросов к Stripe для задачи.
+
+    Ключ одинаков для всех попыток задачи, поэтому повтор после таймаута или
+    после успешного запроса и ошибки записи в БД получает уже созданный
+    объект Stripe вместо дубликата.
+
+    Args:
+        stripe_task (StripeTask): Задача
+
+    Returns:
+        str: Ключ идемпотентности
+    """
+    return f"{stripe_task.name}-{stripe_task.id}"
+
+
+def get_retry_delay(attempts):
+    """
+    Возвращает задержку перед следующей попыткой (экспоненциальный backoff).
+
+    Args:
+        attempts (int): Количество уже выполненных попыток
+
+    Returns:
+        timedelta: Задержка перед повтором
+    """
+    seconds = settings.STRIPE_TASK_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.STRIPE_TASK_MAX_RETRY_DELAY))
+
+
+def claim_tasks(limit):
+    """
+    Забирает готовые к выполнению задачи, помечая их как выполняющиеся.
+
+    Задача захватывается условным UPDATE по статусу и времени обновления, поэтому
+    несколько воркеров не выполнят одну задачу дважды. Задачи, зависшие в статусе
+    "running" дольше STRIPE_TASK_TIMEOUT, считаются брошенными и захватываются
+    повторно.
+
+    Args:
+        limit (int): Максимальное количество задач
+
+    Returns:
+        list[StripeTask]: Захваченные задачи
+    """
+    now = timezone.now()
+    candidates = StripeTask.objects.filter(
+        Q(status=StripeTask.PENDING, run_at__lte=now)
+        | Q(
+            status=StripeTask.RUNNING,
+            updated_at__lt=now - timedelta(seconds=settings.STRIPE_TASK_TIMEOUT),
+        )
+    ).order_by("run_at")[:limit]
+
+    claimed = []
+    for candidate in candidates:
+        updated = StripeTask.objects.filter(
+            id=candidate.id,
+            status=candidate.status,
+            updated_at=candidate.updated_at,
+        ).update(
+            status=StripeTask.RUNNING,
+            attempts=candidate.attempts + 1,
+            updated_at=now,
+        )
+        if updated:
+            candidate.status = StripeTask.RUNNING
+            candidate.attempts += 1
+            candidate.updated_at = now
+            claimed.append(candidate)
+    return claimed
+
+
+def run_task(stripe_task):
+    """
+    Выполняет захваченную задачу и сохраняет результат.
+
+    Обработчик получает аргументы задачи и ключ идемпотентности
+    (get_task_idempotency_key). При ошибке задача возвращается в очередь
+    с задержкой get_retry_delay или помечается как failed после
+    STRIPE_TASK_MAX_ATTEMPTS попыток.
+
+    Args:
+        stripe_task (StripeTask): Захваченная задача
+
+    Returns:
+        bool: True, если задача выполнена успешно
+    """
+    try:
+        handler = TASK_HANDLERS[stripe_task.name]
+        handler(
+            **stripe_task.payload,
+            idempotency_key=get_task_idempotency_key(stripe_task),
+        )
+    except Exception as e:
+        logger.warning(
+            "Задача %s завершилась ошибкой",
+            stripe_task.name,
+            exc_info=True,
+            extra={"task_id": stripe_task.id, "attempts": stripe_task.attempts},
+        )
+        stripe_task.last_error = f"{type(e).__name__}: {e}"
+        if stripe_task.attempts >= settings.STRIPE_TASK_MAX_ATTEMPTS:
+            stripe_task.status = StripeTask.FAILED
+        else:
+            stripe_task.status = StripeTask.PENDING
+            stripe_task.run_at = timezone.now() + get_retry_delay(stripe_task.attempts)
+        stripe_task.save(update_fields=["status", "run_at", "last_error", "updated_at"])
+        return False
+
+    stripe_task.status = StripeTask.DONE
+    stripe_task.last_error = ""
+    stripe_task.save(update_fields=["status", "last_error", "updated_at"])
+    return True
+
+
+def run_pending_tasks(limit=100):
+    """
+    Выполняет готовые задачи из очереди.
+
+    Args:
+        limit (int): Максимальное количество задач за вызов
+
+    Returns:
+        tuple[int, int]: Количество успешно выполненных задач и ошибок
+    """
+    succeeded = failed = 0
+    for stripe_task in claim_tasks(limit):
+        if run_task(stripe_task):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+@task("create_stripe_coupon")
+def create_stripe_coupon_task(discount_id, idempotency_key=None):
+    """Создает купон в Stripe для скидки и сохраняет его ID."""
+    discount = Discount.objects.filter(id=discount_id).first()
+    if discount is None or discount.stripe_coupon_id:
+        return
+    coupon_id = create_stripe_coupon_for_discount(discount, idempotency_key)
+    Discount.objects.filter(id=discount_id).update(stripe_coupon_id=coupon_id)
+
+
+@task("create_stripe_tax")
+def create_stripe_tax_task(tax_id, idempotency_key=None):
+    """Создает налоговую ставку в Stripe для налога и сохраняет ее ID."""
+    tax = Tax.objects.filter(id=tax_id).first()
+    if tax is None or tax.stripe_tax_id:
+        return
+    tax_rate_id = create_stripe_tax_rate_for_tax(tax, idempotency_key)
+    Tax.objects.filter(id=tax_id).update(stripe_tax_id=tax_rate_id)
@@ -1,3 +1,1723 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from stripe_app.caching import bump_versions, get_version
+from stripe_app.catalog import export_lines, read_rows, upsert_items, validate_rows
+from stripe_app.fake_stripe import FakeStripeServer
+from stripe_app.management.commands.benchmark import Command as BenchmarkCommand
+from stripe_app.models import (
+    Discount,
+    ExchangeRate,
+    Item,
+    Order,
+    OrderLine,
+    ReconciliationCursor,
+    StripeEvent,
+    StripeTask,
+    Tax,
+)
+from stripe_app.money import (
+    CURRENCY_EXPONENTS,
+    Money,
+    apply_percent,
+    clear_exchange_rates_cache,
+    convert_amount,
+    from_minor_units,
+    to_minor_units,
+)
+from stripe_app.recalculation import deferred_order_totals
+from stripe_app.reconciliation import reconcile_payments
+from stripe_app.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    StripeDeadlineExceeded,
+    get_circuit_breaker,
+    get_remaining_time,
+    reset_circuit_breakers,
+    stripe_deadline,
+)
+from stripe_app.services import (
+    build_idempotency_key,
+    create_order_from_cart,
+    create_stripe_coupon_for_discount,
+    create_payment_intent_async,
+    get_async_stripe_client,
+    get_stripe_client,
+    resolve_stripe_prices_async,
+)
+from stripe_app.stripe_http import InstrumentedHTTPXClient, InstrumentedRequestsClient
+from stripe_app.tasks import claim_tasks, enqueue_task, run_pending_tasks
+from stripe_app.webhooks import process_pending_events, store_webhook_event
+
+
+class FakeStripeTestCase(TestCase):
+    """
+    TestCase, в котором запросы к Stripe уходят на локальный FakeStripeServer.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe_server = FakeStripeServer().start()
+        cls.addClassCleanup(cls.stripe_server.stop)
+        cls.enterClassContext(
+            override_settings(
+                STRIPE_API_BASE=cls.stripe_server.url,
+                STRIPE_SECRET_KEY_USD="sk_test_usd",
+                STRIPE_SECRET_KEY_EUR="sk_test_eur",
+                STRIPE_MAX_NETWORK_RETRIES=0,
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_circuit_breakers()
+        self.stripe_server.objects.clear()
+        self.stripe_server.received.clear()
+        self.stripe_server.idempotent_responses.clear()
+        self.stripe_server.latency = 0.0
+        self.stripe_server.error_rate = 0.0
+        self.stripe_server.fail_params = {}
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PAGE_CACHE_TTL=60,
+)
+class PageVersionTests(TestCase):
+    """
+    Версии страниц в кеше, по которым строятся ETag.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bumped_version_expires_after_page_cache_ttl(self):
+        bump_versions("item", [1])
+        version = get_version("item", 1)
+        self.assertEqual(get_version("item", 1), version)
+
+        now = time.time()
+        with mock.patch("time.time", return_value=now + 61):
+            self.assertNotEqual(get_version("item", 1), version)
+
+    @override_settings(PAGE_CACHE_TTL=0)
+    def test_page_without_cache_gets_fresh_version(self):
+        item = Item.objects.create(name="Товар", price="10.00", currency="usd")
+        url = f"/stripe_app/item/{item.id}/"
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_item_etag_changes_after_version_expires(self):
+        item = Item.objects.create(name="Товар", price="10.00", currency="usd")
+        url = f"/stripe_app/item/{item.id}/"
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        now = time.time()
+        with mock.patch("time.time", return_value=now + 61):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class QueryBudgetTests(FakeStripeTestCase):
+    """
+    Количество SQL запросов страниц и API не зависит от количества позиций
+    заказа и товаров каталога.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items = [
+                Item.objects.create(name=f"Товар {i}", price="10.00", currency="usd")
+                for i in range(10)
+            ]
+            discount = Discount.objects.create(
+                name="Скидка", percent=10, stripe_coupon_id="coupon_test"
+            )
+            tax = Tax.objects.create(name="НДС", percent=20, stripe_tax_id="txr_test")
+            self.small_order = Order.objects.create(discount=discount, tax=tax)
+            self.small_order.items.add(self.items[0])
+            self.large_order = Order.objects.create(discount=discount, tax=tax)
+            self.large_order.items.add(*self.items)
+
+    def assert_get_queries(self, num, url):
+        cache.clear()
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_item_page(self):
+        item = self.items[0]
+        self.assert_get_queries(1, f"/stripe_app/item/{item.id}/")
+        self.assert_get_queries(1, f"/stripe_app/payment-intent/{item.id}/")
+
+    def test_order_pages(self):
+        for order in (self.small_order, self.large_order):
+            with self.subTest(lines=order.lines.count()):
+                self.assert_get_queries(2, f"/stripe_app/order/{order.id}/")
+                self.assert_get_queries(
+                    2, f"/stripe_app/order-payment-intent/{order.id}/"
+                )
+
+    def test_item_list_api(self):
+        response = self.assert_get_queries(1, "/stripe_app/api/items/?limit=5")
+        self.assertEqual(len(response.json()["results"]), 5)
+        response = self.assert_get_queries(1, response.json()["next"])
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_order_payment_intent_api(self):
+        for order in (self.small_order, self.large_order):
+            with self.subTest(lines=order.lines.count()):
+                cache.clear()
+                with self.assertNumQueries(2):
+                    response = self.client.post(
+                        f"/stripe_app/create-order-payment-intent/{order.id}/"
+                    )
+                self.assertIn("clientSecret", response.json())
+
+    def test_checkout_session_api(self):
+        url = f"/stripe_app/buy/{self.items[0].id}/"
+        # Товар, запоминание продукта и цены Stripe в товаре, создание сессии
+        # покупателя (проверка ключа, INSERT и UPDATE в savepoint)
+        with self.assertNumQueries(9):
+            response = self.client.get(url)
+        self.assertIn("sessionId", response.json())
+        # Повторный запрос покупателя: только товар
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertIn("sessionId", response.json())
+
+    def test_order_checkout_session_api(self):
+        for order in (self.small_order, self.large_order):
+            self.client.get(f"/stripe_app/order_buy/{order.id}/")
+        for order in (self.small_order, self.large_order):
+            with self.subTest(lines=order.lines.count()):
+                cache.clear()
+                with self.assertNumQueries(2):
+                    response = self.client.get(f"/stripe_app/order_buy/{order.id}/")
+                self.assertIn("sessionId", response.json())
+
+    def test_payment_intent_api(self):
+        url = f"/stripe_app/create-payment-intent/{self.items[0].id}/"
+        # Новый покупатель: товар и создание сессии
+        with self.assertNumQueries(8):
+            response = self.client.post(url)
+        self.assertIn("clientSecret", response.json())
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.post(url)
+        self.assertIn("clientSecret", response.json())
+
+    @override_settings(STRIPE_WEBHOOK_SECRET_USD="whsec_test")
+    def test_webhook(self):
+        payload = json.dumps({"id": "evt_test", "type": "charge.succeeded"}).encode()
+        timestamp = int(time.time())
+        signature = hmac.new(
+            b"whsec_test", f"{timestamp}.".encode() + payload, hashlib.sha256
+        ).hexdigest()
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                "/stripe_app/webhook/",
+                payload,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_api(self):
+        for count in (1, 10):
+            with self.subTest(items=count):
+                body = {"items": [{"id": item.id} for item in self.items[:count]]}
+                with self.assertNumQueries(8):
+                    response = self.client.post(
+                        "/stripe_app/cart/", body, content_type="application/json"
+                    )
+                self.assertEqual(response.status_code, 201)
+
+
+class CartApiTests(FakeStripeTestCase):
+    """Создание заказа из корзины через POST /stripe_app/cart/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = Item.objects.create(name="Товар 1", price="10.00", currency="usd")
+        cls.second = Item.objects.create(name="Товар 2", price="2.50", currency="usd")
+        cls.euro = Item.objects.create(name="Товар 3", price="5.00", currency="eur")
+        cls.discount = Discount.objects.create(
+            name="Скидка", percent=10, stripe_coupon_id="coupon_test"
+        )
+        cls.tax = Tax.objects.create(name="НДС", percent=20, stripe_tax_id="txr_test")
+
+    def post_cart(self, body):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                "/stripe_app/cart/", body, content_type="application/json"
+            )
+
+    def test_order_totals_with_discount_and_tax(self):
+        response = self.post_cart(
+            {
+                "items": [
+                    {"id": self.first.id, "quantity": 2},
+                    {"id": self.second.id, "quantity": 3},
+                    {"id": self.first.id},
+                ],
+                "discount": self.discount.id,
+                "tax": self.tax.id,
+            }
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()["order"]
+        # 3 * 1000 + 3 * 250 = 3750, скидка 375, налог 20% от 3375 = 675
+        self.assertEqual(
+            {line["id"]: line["quantity"] for line in data["items"]},
+            {self.first.id: 3, self.second.id: 3},
+        )
+        self.assertEqual(data["subtotal_amount"], 3750)
+        self.assertEqual(data["discount_amount"], 375)
+        self.assertEqual(data["tax_amount"], 675)
+        self.assertEqual(data["total_amount"], 4050)
+        self.assertEqual(data["total_price"], "40.50")
+        self.assertEqual(data["currency"], "usd")
+
+        order = Order.objects.get(pk=data["id"])
+        self.assertEqual(order.discount, self.discount)
+        self.assertEqual(order.tax, self.tax)
+        self.assertEqual(
+            (order.subtotal_amount, order.discount_amount, order.tax_amount),
+            (3750, 375, 675),
+        )
+        self.assertEqual(order.total_amount, 4050)
+        self.assertEqual(order.total_price, Decimal("40.50"))
+        self.assertEqual(
+            dict(order.lines.values_list("item_id", "quantity")),
+            {self.first.id: 3, self.second.id: 3},
+        )
+
+    def test_checkout_session_uses_line_quantities(self):
+        response = self.post_cart(
+            {
+                "items": [{"id": self.first.id, "quantity": 2}],
+                "discount": self.discount.id,
+                "tax": self.tax.id,
+                "checkout": True,
+            }
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()["sessionId"].startswith("cs_test_"))
+        session = next(
+            request["params"]
+            for request in self.stripe_server.received
+            if request["path"] == "/v1/checkout/sessions"
+        )
+        self.assertEqual(session["line_items[0][quantity]"], "2")
+        self.assertEqual(session["line_items[0][tax_rates][0]"], "txr_test")
+        self.assertEqual(session["discounts[0][coupon]"], "coupon_test")
+
+    def test_invalid_cart_returns_400(self):
+        cases = {
+            "mixed currencies": {
+                "items": [{"id": self.first.id}, {"id": self.euro.id}]
+            },
+            "unknown item": {"items": [{"id": self.first.id}, {"id": 999999}]},
+            "zero quantity": {"items": [{"id": self.first.id, "quantity": 0}]},
+            "negative quantity": {"items": [{"id": self.first.id, "quantity": -1}]},
+            "string quantity": {"items": [{"id": self.first.id, "quantity": "2"}]},
+            "empty cart": {"items": []},
+            "unknown discount": {"items": [{"id": self.first.id}], "discount": 999999},
+        }
+        for name, body in cases.items():
+            with self.subTest(name):
+                response = self.post_cart(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_json_returns_400(self):
+        response = self.client.post(
+            "/stripe_app/cart/", "{", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncStripeClientTests(FakeStripeTestCase):
+    """Асинхронные views используют долгоживущий клиент Stripe."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Товар", price="10.00", currency="usd")
+
+    def test_async_requests_reuse_connection(self):
+        self.assertIs(get_async_stripe_client("usd"), get_stripe_client("usd"))
+        connections_count = self.stripe_server.connections_count
+        url = f"/stripe_app/create-payment-intent/{self.item.id}/"
+        # Каждый запрос к асинхронному view под тестовым клиентом (как и под
+        # WSGI) выполняется в новом event loop
+        for _ in range(3):
+            response = self.client_class().post(url)
+            self.assertIn("clientSecret", response.json())
+        self.assertEqual(len(self.stripe_server.objects["payment_intents"]), 3)
+        self.assertEqual(self.stripe_server.connections_count - connections_count, 1)
+
+    @override_settings(STRIPE_ASYNC_HTTPX=True)
+    def test_httpx_client_per_event_loop(self):
+        async def get_clients():
+            return get_async_stripe_client("usd"), get_async_stripe_client("usd")
+
+        first, second = asyncio.run(get_clients())
+        self.assertIs(first, second)
+        self.assertIsInstance(first._requestor._client, InstrumentedHTTPXClient)
+        self.assertIsNot(asyncio.run(get_clients())[0], first)
+
+    @override_settings(STRIPE_ASYNC_HTTPX=True)
+    def test_httpx_calls_run_in_event_loop_without_threads(self):
+        self.stripe_server.latency = 0.3
+
+        async def create_payment_intents(count):
+            return await asyncio.gather(
+                *(
+                    create_payment_intent_async(
+                        "usd", {"amount": 1000, "currency": "usd", "metadata": {"n": n}}
+                    )
+                    for n in range(count)
+                )
+            )
+
+        started = time.monotonic()
+        with mock.patch("asyncio.to_thread", side_effect=AssertionError):
+            secrets = asyncio.run(create_payment_intents(50))
+        elapsed = time.monotonic() - started
+        self.assertEqual(len(set(secrets)), 50)
+        self.assertEqual(len(self.stripe_server.objects["payment_intents"]), 50)
+        # Последовательно вызовы заняли бы 15 с
+        self.assertLess(elapsed, 3)
+
+
+class BuyerScopedStripeObjectsTests(FakeStripeTestCase):
+    """Payment Intent и Checkout Session товара не делятся между покупателями."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Товар", price="10.00", currency="usd")
+
+    def test_payment_intent_is_reused_for_same_buyer_only(self):
+        url = f"/stripe_app/create-payment-intent/{self.item.id}/"
+        first, second = self.client, self.client_class()
+
+        secret = first.post(url).json()["clientSecret"]
+        self.assertEqual(first.post(url).json()["clientSecret"], secret)
+        self.assertNotEqual(second.post(url).json()["clientSecret"], secret)
+        self.assertEqual(len(self.stripe_server.objects["payment_intents"]), 2)
+
+    def test_checkout_session_differs_between_buyers(self):
+        url = f"/stripe_app/buy/{self.item.id}/"
+        first = self.client.get(url).json()["sessionId"]
+        second = self.client_class().get(url).json()["sessionId"]
+        self.assertNotEqual(first, second)
+
+
+class DeferredRecalculationTests(TestCase):
+    """Стоимость заказа пересчитывается один раз на транзакцию."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items = [
+                Item.objects.create(name=f"Товар {i}", price="10.00", currency="usd")
+                for i in range(3)
+            ]
+            self.orders = [Order.objects.create() for _ in range(3)]
+            for order in self.orders:
+                order.items.add(*self.items[:2])
+
+    def count_recomputes(self):
+        """Подменяет Order.compute_pricing, сохраняя его поведение."""
+        return mock.patch.object(
+            Order, "compute_pricing", autospec=True, side_effect=Order.compute_pricing
+        )
+
+    def recomputed_orders(self, compute_pricing):
+        return Counter(call.args[0].pk for call in compute_pricing.call_args_list)
+
+    def test_clear_and_add_recomputes_once(self):
+        order = self.orders[0]
+        with self.count_recomputes() as compute_pricing:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with transaction.atomic():
+                    order.items.clear()
+                    order.items.add(*self.items)
+                    order.save()
+        self.assertEqual(self.recomputed_orders(compute_pricing), {order.pk: 1})
+        self.assertEqual(len(callbacks), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, 3000)
+
+    def test_bulk_edit_recomputes_each_order_once(self):
+        with self.count_recomputes() as compute_pricing:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with transaction.atomic():
+                    for line in OrderLine.objects.all():
+                        line.quantity = 3
+                        line.save()
+                        line.quantity = 2
+                        line.save()
+        self.assertEqual(
+            self.recomputed_orders(compute_pricing),
+            {order.pk: 1 for order in self.orders},
+        )
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            set(Order.objects.values_list("total_amount", flat=True)), {4000}
+        )
+
+    def test_deferred_block_recomputes_each_order_once(self):
+        with self.count_recomputes() as compute_pricing:
+            with self.captureOnCommitCallbacks(execute=True):
+                with deferred_order_totals():
+                    for order in self.orders:
+                        order.items.remove(self.items[0])
+                        order.items.add(self.items[2])
+                    self.assertEqual(compute_pricing.call_count, 0)
+        self.assertEqual(
+            self.recomputed_orders(compute_pricing),
+            {order.pk: 1 for order in self.orders},
+        )
+
+    def test_rolled_back_changes_are_not_recomputed(self):
+        first, second = self.orders[:2]
+        with self.count_recomputes() as compute_pricing:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError):
+                    with transaction.atomic():
+                        first.items.add(self.items[2])
+                        raise RuntimeError
+                with transaction.atomic():
+                    second.items.add(self.items[2])
+        self.assertEqual(self.recomputed_orders(compute_pricing), {second.pk: 1})
+
+    def test_cart_order_snapshot_is_saved(self):
+        discount = Discount.objects.create(
+            name="Скидка", percent=10, stripe_coupon_id="coupon_test"
+        )
+        tax = Tax.objects.create(name="НДС", percent=20, stripe_tax_id="txr_test")
+        with self.captureOnCommitCallbacks(execute=True):
+            order = create_order_from_cart(
+                [{"id": self.items[0].id, "quantity": 2}, {"id": self.items[1].id}],
+                discount.id,
+                tax.id,
+            )
+
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual(order.subtotal_amount, 3000)
+        self.assertEqual(order.discount_amount, 300)
+        self.assertEqual(order.tax_amount, 540)
+        self.assertEqual(order.total_amount, 3240)
+        self.assertEqual(order.total_price, Decimal("32.40"))
+        self.assertEqual(order.pricing_currency, "usd")
+        self.assertFalse(order.is_pricing_stale())
+
+
+class OrderPricingSnapshotTests(TestCase):
+    """Снимок стоимости заказа обновляется при изменении входных данных."""
+
+    def setUp(self):
+        clear_exchange_rates_cache()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount = Discount.objects.create(
+                name="Скидка", percent=10, stripe_coupon_id="coupon_test"
+            )
+            self.tax = Tax.objects.create(
+                name="НДС", percent=20, stripe_tax_id="txr_test"
+            )
+            self.item = Item.objects.create(name="Товар", price="10.00", currency="usd")
+
+    def create_orders(self, count, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            orders = [
+                Order.objects.create(discount=self.discount, tax=self.tax, **fields)
+                for _ in range(count)
+            ]
+            for order in orders:
+                order.items.add(self.item)
+        return orders
+
+    def totals(self, orders):
+        return list(
+            Order.objects.filter(pk__in=[order.pk for order in orders])
+            .order_by("pk")
+            .values_list("total_amount", flat=True)
+        )
+
+    def test_discount_and_tax_changes_refresh_only_unpaid_orders(self):
+        unpaid, failed = self.create_orders(2)
+        paid = self.create_orders(1)[0]
+        Order.objects.filter(pk=failed.pk).update(payment_status=Order.FAILED)
+        Order.objects.filter(pk=paid.pk).update(payment_status=Order.PAID)
+        # 1000 - 10% = 900, налог 20% = 180
+        self.assertEqual(self.totals([unpaid, failed, paid]), [1080, 1080, 1080])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.percent = 50
+            self.discount.save()
+        self.assertEqual(self.totals([unpaid, failed, paid]), [600, 600, 1080])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tax.percent = 0
+            self.tax.save()
+        self.assertEqual(self.totals([unpaid, failed, paid]), [500, 500, 1080])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.delete()
+        self.assertEqual(self.totals([unpaid, failed, paid]), [1000, 1000, 1080])
+
+    def test_item_currency_change_refreshes_snapshot(self):
+        order = self.create_orders(1)[0]
+        self.assertEqual(Order.objects.get(pk=order.pk).pricing_currency, "usd")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.currency = "eur"
+            self.item.save()
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual(order.pricing_currency, "eur")
+        self.assertEqual(order.total_amount, 1080)
+        self.assertFalse(order.is_pricing_stale())
+
+    def test_exchange_rate_change_refreshes_converted_orders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRate.objects.update_or_create(
+                currency="eur", defaults={"rate": Decimal("1.2")}
+            )
+            euro_item = Item.objects.create(
+                name="Товар EUR", price="5.00", currency="eur"
+            )
+            order = Order.objects.create()
+            order.items.add(self.item)
+            order.items.add(euro_item)
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual(order.pricing_currency, "usd")
+        # 1000 центов + 500 евроцентов * 1.2
+        self.assertEqual(order.total_amount, 1600)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rate = ExchangeRate.objects.get(currency="eur")
+            rate.rate = Decimal("1.1")
+            rate.save()
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual(order.total_amount, 1550)
+        self.assertFalse(order.is_pricing_stale())
+
+    def test_is_pricing_stale(self):
+        order = self.create_orders(1)[0]
+        order = Order.objects.with_pricing().get(pk=order.pk)
+        self.assertFalse(order.is_pricing_stale())
+
+        # Изменение в обход сигналов: снимок не пересчитан
+        Discount.objects.filter(pk=self.discount.pk).update(percent=25)
+        order = Order.objects.with_pricing().get(pk=order.pk)
+        self.assertTrue(order.is_pricing_stale())
+        self.assertEqual(order.get_pricing().total, 1080)
+
+        order.calc_total_price()
+        order = Order.objects.with_pricing().get(pk=order.pk)
+        self.assertFalse(order.is_pricing_stale())
+        self.assertEqual(order.total_amount, 900)
+
+    def test_discount_change_recomputes_orders_in_batches(self):
+        queries = {}
+        for count in (3, 30):
+            Order.objects.all().delete()
+            orders = self.create_orders(count)
+            with CaptureQueriesContext(connection) as captured:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.discount.percent += 1
+                    self.discount.save()
+            queries[count] = len(captured)
+            self.assertEqual(len(set(self.totals(orders))), 1)
+        self.assertEqual(queries[3], queries[30])
+
+        with mock.patch("stripe_app.recalculation.RECALCULATION_BATCH_SIZE", 10):
+            with CaptureQueriesContext(connection) as captured:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.discount.percent += 1
+                    self.discount.save()
+        # Две лишние пачки по 10 заказов: SELECT заказов, позиций и UPDATE
+        self.assertEqual(len(captured), queries[30] + 2 * 3)
+
+
+class CircuitBreakerTests(TestCase):
+    """Переходы circuit breaker closed -> open -> half-open -> closed."""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch(
+            "stripe_app.resilience.time.monotonic", side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("usd", failure_threshold=2, recovery_timeout=30)
+
+    def open_breaker(self):
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.breaker.before_call()
+        self.breaker.record_failure()
+
+    def test_opens_after_threshold_and_closes_after_successful_probe(self):
+        self.open_breaker()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 30)
+
+        self.now += 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 29
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+@override_settings(STRIPE_CIRCUIT_FAILURE_THRESHOLD=2)
+class StripeResilienceTests(FakeStripeTestCase):
+    """Circuit breaker и stripe_deadline при обращениях к FakeStripeServer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Товар", price="10.00", currency="usd")
+        cls.order = Order.objects.create()
+        cls.order.items.add(cls.item)
+
+    def create_payment_intent(self):
+        return get_stripe_client("usd").v1.payment_intents.create(
+            params={"amount": 1000, "currency": "usd"}
+        )
+
+    def test_server_errors_open_breaker(self):
+        self.stripe_server.error_rate = 1.0
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                self.create_payment_intent()
+        self.assertEqual(get_circuit_breaker("usd").state, CircuitBreaker.OPEN)
+
+        requests_count = self.stripe_server.requests_count
+        with self.assertRaises(CircuitOpenError):
+            self.create_payment_intent()
+        self.assertEqual(self.stripe_server.requests_count, requests_count)
+
+    def test_nested_deadline_cannot_extend_outer(self):
+        with stripe_deadline(0.5):
+            with stripe_deadline(60):
+                self.assertLessEqual(get_remaining_time(), 0.5)
+        self.assertIsNone(get_remaining_time())
+
+    def test_deadline_clamps_client_timeout(self):
+        client = InstrumentedRequestsClient(timeout=30, account="usd")
+        self.assertEqual(client._timeout, 30)
+        with stripe_deadline(0.5):
+            self.assertLessEqual(client._timeout, 0.5)
+
+    def test_deadline_interrupts_slow_request(self):
+        self.stripe_server.latency = 1.0
+        started = time.monotonic()
+        with self.assertRaises(StripeDeadlineExceeded):
+            with stripe_deadline(0.2):
+                self.create_payment_intent()
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_checkout_views_return_503_when_breaker_is_open(self):
+        breaker = get_circuit_breaker("usd")
+        for _ in range(2):
+            breaker.record_failure()
+
+        requests_count = self.stripe_server.requests_count
+        responses = {
+            "item": self.client.get(f"/stripe_app/buy/{self.item.id}/"),
+            "order": self.client.get(f"/stripe_app/order_buy/{self.order.id}/"),
+            "cart": self.client.post(
+                "/stripe_app/cart/",
+                {"items": [{"id": self.item.id}], "checkout": True},
+                content_type="application/json",
+            ),
+        }
+        for name, response in responses.items():
+            with self.subTest(view=name):
+                self.assertEqual(response.status_code, 503)
+                self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertIn("order", responses["cart"].json())
+        self.assertEqual(self.stripe_server.requests_count, requests_count)
+
+    def test_failed_item_price_does_not_block_others(self):
+        items = [
+            Item.objects.create(name=name, price="10.00", currency="usd")
+            for name in ("Товар 1", "Сломанный товар", "Товар 2")
+        ]
+        broken = items[1]
+        self.stripe_server.fail_params = {"name": broken.name}
+
+        prices, errors = async_to_sync(resolve_stripe_prices_async)(items)
+
+        self.assertEqual(set(prices), {items[0].id, items[2].id})
+        self.assertEqual(list(errors), [broken.id])
+        self.assertIn("Injected error", errors[broken.id])
+        for item in items:
+            item.refresh_from_db()
+        self.assertEqual(
+            [item.stripe_price_id for item in items],
+            [prices[items[0].id], "", prices[items[2].id]],
+        )
+
+        order = Order.objects.create()
+        order.items.add(*items)
+        response = self.client.get(f"/stripe_app/order_buy/{order.id}/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()["items"]), [str(broken.id)])
+        # Цены остальных товаров не создаются повторно
+        self.assertEqual(len(self.stripe_server.objects["prices"]), 2)
+
+
+class ReconcilePaymentsTests(FakeStripeTestCase):
+    """Сверка статусов оплаты заказов со списками объектов Stripe."""
+
+    def setUp(self):
+        super().setUp()
+        self.now = int(time.time())
+        self.orders = [Order.objects.create() for _ in range(4)]
+
+    def add_object(self, resource, order, age=0, **fields):
+        """Добавляет объект Stripe, созданный age секунд назад."""
+        objects = self.stripe_server.objects.setdefault(resource, [])
+        obj = {
+            "id": f"{resource}_{len(objects)}",
+            "object": "payment_intent",
+            "created": self.now - age,
+            "metadata": {"order_id": str(order.id)} if order else {},
+            **fields,
+        }
+        objects.append(obj)
+        return obj
+
+    def reconcile(self):
+        return reconcile_payments(accounts=["usd"])
+
+    def payment_statuses(self):
+        return [Order.objects.get(pk=order.pk).payment_status for order in self.orders]
+
+    def test_payment_intent_statuses(self):
+        self.add_object("payment_intents", self.orders[0], status="succeeded")
+        self.add_object("payment_intents", self.orders[1], status="canceled")
+        self.add_object(
+            "payment_intents",
+            self.orders[2],
+            status="requires_payment_method",
+            last_payment_error={"code": "card_declined"},
+        )
+        self.add_object("payment_intents", self.orders[3], status="processing")
+        self.add_object("payment_intents", None, status="succeeded")
+
+        stats = self.reconcile()["usd", "payment_intents"]
+
+        self.assertEqual(stats, {"seen": 5, "matched": 4, "updated": 4})
+        self.assertEqual(
+            self.payment_statuses(),
+            [Order.PAID, Order.FAILED, Order.FAILED, Order.PROCESSING],
+        )
+
+    def test_checkout_session_statuses(self):
+        resource = "sessions"
+        self.add_object(
+            resource, self.orders[0], status="complete", payment_status="paid"
+        )
+        self.add_object(
+            resource, self.orders[1], status="complete", payment_status="unpaid"
+        )
+        self.add_object(
+            resource, self.orders[2], status="open", payment_status="unpaid"
+        )
+        self.add_object(
+            resource, self.orders[3], status="expired", payment_status="unpaid"
+        )
+
+        self.reconcile()
+
+        self.assertEqual(
+            self.payment_statuses(),
+            [Order.PAID, Order.PROCESSING, Order.UNPAID, Order.UNPAID],
+        )
+
+    def test_paid_order_is_never_downgraded(self):
+        paid, retried = self.orders[:2]
+        Order.objects.filter(pk=paid.pk).update(payment_status=Order.PAID)
+        self.add_object("payment_intents", paid, status="canceled")
+        self.add_object("payment_intents", retried, age=10, status="succeeded")
+        self.add_object("payment_intents", retried, status="canceled")
+
+        self.reconcile()
+
+        self.assertEqual(self.payment_statuses()[:2], [Order.PAID, Order.PAID])
+
+    def test_pagination_across_pages(self):
+        for i in range(250):
+            self.add_object(
+                "payment_intents", self.orders[i % 4], age=i, status="succeeded"
+            )
+
+        requests_count = self.stripe_server.requests_count
+        stats = self.reconcile()["usd", "payment_intents"]
+
+        self.assertEqual(stats["seen"], 250)
+        # 3 страницы Payment Intent и 1 страница Checkout Session
+        self.assertEqual(self.stripe_server.requests_count - requests_count, 4)
+        self.assertEqual(set(self.payment_statuses()), {Order.PAID})
+
+    def test_cursor_advances_and_resumes(self):
+        self.add_object("payment_intents", self.orders[0], age=120, status="succeeded")
+        self.add_object("payment_intents", self.orders[1], age=60, status="processing")
+        self.add_object("payment_intents", self.orders[2], age=30, status="succeeded")
+
+        self.assertEqual(self.reconcile()["usd", "payment_intents"]["seen"], 3)
+        cursor = ReconciliationCursor.objects.get(
+            account="usd", resource="payment_intents"
+        )
+        # Незавершенный платеж удерживает позицию
+        self.assertEqual(cursor.created, self.now - 60)
+
+        self.stripe_server.objects["payment_intents"][1]["status"] = "succeeded"
+        self.add_object("payment_intents", self.orders[3], status="succeeded")
+        stats = self.reconcile()["usd", "payment_intents"]
+
+        self.assertEqual(stats["seen"], 3)
+        self.assertEqual(set(self.payment_statuses()), {Order.PAID})
+        cursor.refresh_from_db()
+        self.assertEqual(cursor.created, self.now)
+
+        self.assertEqual(self.reconcile()["usd", "payment_intents"]["seen"], 1)
+
+    def test_first_run_starts_within_lookback(self):
+        self.add_object("payment_intents", self.orders[0], age=7200, status="succeeded")
+        with override_settings(STRIPE_RECONCILE_LOOKBACK=3600):
+            stats = self.reconcile()["usd", "payment_intents"]
+        self.assertEqual(stats["seen"], 0)
+
+    def test_command(self):
+        self.add_object("payment_intents", self.orders[0], status="succeeded")
+        out = StringIO()
+        call_command("reconcile_payments", "--account", "usd", stdout=out)
+        self.assertIn("usd payment_intents: просмотрено 1", out.getvalue())
+        self.assertEqual(self.payment_statuses()[0], Order.PAID)
+
+
+@override_settings(METRICS_TOKEN="metrics-token", METRICS_ALLOWED_IPS=["10.0.0.5"])
+class MetricsAccessTests(TestCase):
+    """
+    Доступ к /metrics только по токену, с разрешенных адресов или сотрудникам.
+    """
+
+    def test_anonymous_request_is_forbidden(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+
+    def test_token_allows_access(self):
+        response = self.client.get(
+            "/metrics", HTTP_AUTHORIZATION="Bearer metrics-token"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    def test_allowed_ip_allows_access(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="10.0.0.5")
+        self.assertEqual(response.status_code, 200)
+
+    def test_staff_user_allows_access(self):
+        user = User.objects.create_user("user", password="password")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET_USD="whsec_test")
+class StripeWebhookTests(TestCase):
+    """
+    Проверка подписи и обработка вебхуков Stripe.
+    """
+
+    def post_webhook(self, payload, signature):
+        return self.client.post(
+            "/stripe_app/webhook/",
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+    def sign(self, payload, secret="whsec_test"):
+        timestamp = int(time.time())
+        signature = hmac.new(
+            secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256
+        ).hexdigest()
+        return f"t={timestamp},v1={signature}"
+
+    def test_signed_event_is_stored(self):
+        payload = json.dumps(
+            {"id": "evt_test", "type": "payment_intent.succeeded"}
+        ).encode()
+        response = self.post_webhook(payload, self.sign(payload))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(StripeEvent.objects.filter(event_id="evt_test").exists())
+
+    def test_invalid_signature_returns_400(self):
+        payload = b'{"id": "evt_test", "type": "payment_intent.succeeded"}'
+        response = self.post_webhook(payload, self.sign(payload, "whsec_other"))
+        self.assertEqual(response.status_code, 400)
+        response = self.post_webhook(payload, "garbage")
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_utf8_payload_returns_400(self):
+        payload = b"\xff\xfe{}"
+        response = self.post_webhook(payload, self.sign(payload))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def store_event(self, event_id, event_type, order, created):
+        payload = {
+            "id": event_id,
+            "type": event_type,
+            "created": created,
+            "data": {"object": {"metadata": {"order_id": str(order.id)}}},
+        }
+        store_webhook_event(json.dumps(payload).encode(), "usd")
+
+    def test_pending_events_are_processed_once(self):
+        paid, failed = Order.objects.create(), Order.objects.create()
+        self.store_event("evt_1", "payment_intent.succeeded", paid, 1)
+        self.store_event("evt_2", "payment_intent.payment_failed", paid, 2)
+        self.store_event("evt_3", "payment_intent.payment_failed", failed, 3)
+
+        self.assertEqual(process_pending_events(), 3)
+        self.assertEqual(process_pending_events(), 0)
+        self.assertFalse(StripeEvent.objects.filter(processed_at=None).exists())
+        paid.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(paid.payment_status, Order.PAID)
+        self.assertEqual(failed.payment_status, Order.FAILED)
+
+    def test_pending_events_are_claimed_with_skip_locked(self):
+        self.store_event("evt_1", "payment_intent.succeeded", Order.objects.create(), 1)
+        # SQLite не поддерживает FOR UPDATE: проверяется только текст запроса
+        features = connection.features
+        with mock.patch.multiple(
+            features, has_select_for_update=True, has_select_for_update_skip_locked=True
+        ):
+            with CaptureQueriesContext(connection) as captured:
+                with self.assertRaises(DatabaseError):
+                    process_pending_events()
+        self.assertTrue(
+            any("FOR UPDATE SKIP LOCKED" in query["sql"] for query in captured)
+        )
+
+
+class BenchmarkStripeCallsTests(TestCase):
+    """Замер URL оплаты не сводится к попаданиям в кеш объектов Stripe."""
+
+    def test_zero_object_cache_ttl_creates_new_objects(self):
+        params = {"amount": 1000, "currency": "usd"}
+        self.assertEqual(
+            build_idempotency_key("payment_intent", params, "buyer"),
+            build_idempotency_key("payment_intent", params, "buyer"),
+        )
+        with override_settings(STRIPE_OBJECT_CACHE_TTL=0):
+            self.assertNotEqual(
+                build_idempotency_key("payment_intent", params, "buyer"),
+                build_idempotency_key("payment_intent", params, "buyer"),
+            )
+
+    def test_payment_url_without_stripe_calls_fails(self):
+        command = BenchmarkCommand()
+        options = {"stripe_object_cache": False, "stripe_error_rate": 0.0}
+        results = {
+            "item_detail": {"stripe_calls_per_request": 0.0},
+            "create_payment_intent": {"stripe_calls_per_request": 1.0},
+        }
+        command._check_stripe_calls(results, options)
+
+        results["create_order_checkout_session"] = {"stripe_calls_per_request": 0.0}
+        with self.assertRaisesMessage(CommandError, "create_order_checkout_session"):
+            command._check_stripe_calls(results, options)
+        command._check_stripe_calls(results, {**options, "stripe_object_cache": True})
+
+
+@override_settings(
+    STRIPE_TASK_MAX_ATTEMPTS=3,
+    STRIPE_TASK_RETRY_DELAY=5,
+    STRIPE_TASK_MAX_RETRY_DELAY=3600,
+    STRIPE_TASK_TIMEOUT=300,
+)
+class StripeTaskTests(FakeStripeTestCase):
+    """Очередь фоновых задач Stripe: захват, повторы и идемпотентность."""
+
+    def make_ready(self, stripe_task):
+        StripeTask.objects.filter(pk=stripe_task.pk).update(
+            run_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_claim_tasks(self):
+        now = timezone.now()
+        ready = enqueue_task("create_stripe_tax", tax_id=1)
+        enqueue_task("create_stripe_tax", tax_id=2)
+        StripeTask.objects.exclude(pk=ready.pk).update(
+            run_at=now + timedelta(minutes=1)
+        )
+        running = StripeTask.objects.create(
+            name="create_stripe_tax", payload={"tax_id": 3}, status=StripeTask.RUNNING
+        )
+        abandoned = StripeTask.objects.create(
+            name="create_stripe_tax", payload={"tax_id": 4}, status=StripeTask.RUNNING
+        )
+        StripeTask.objects.filter(pk=abandoned.pk).update(
+            updated_at=now - timedelta(seconds=301)
+        )
+
+        claimed = claim_tasks(10)
+        self.assertEqual({task.pk for task in claimed}, {ready.pk, abandoned.pk})
+        for task in claimed:
+            task.refresh_from_db()
+            self.assertEqual(task.status, StripeTask.RUNNING)
+            self.assertEqual(task.attempts, 1)
+        self.assertEqual(claim_tasks(10), [])
+        running.refresh_from_db()
+        self.assertEqual(running.attempts, 0)
+
+    def test_failed_task_is_retried_with_exponential_backoff(self):
+        self.stripe_server.error_rate = 1.0
+        with self.captureOnCommitCallbacks(execute=True):
+            tax = Tax.objects.create(name="НДС", percent=20)
+        stripe_task = StripeTask.objects.get(name="create_stripe_tax")
+
+        for attempt, delay in ((1, 5), (2, 10)):
+            reset_circuit_breakers()
+            started = timezone.now()
+            self.assertEqual(run_pending_tasks(), (0, 1))
+            stripe_task.refresh_from_db()
+            self.assertEqual(stripe_task.status, StripeTask.PENDING)
+            self.assertEqual(stripe_task.attempts, attempt)
+            self.assertIn("APIError", stripe_task.last_error)
+            self.assertAlmostEqual(
+                (stripe_task.run_at - started).total_seconds(), delay, delta=1
+            )
+            self.assertEqual(run_pending_tasks(), (0, 0))
+            self.make_ready(stripe_task)
+
+        reset_circuit_breakers()
+        self.assertEqual(run_pending_tasks(), (0, 1))
+        stripe_task.refresh_from_db()
+        self.assertEqual(stripe_task.status, StripeTask.FAILED)
+        self.assertEqual(stripe_task.attempts, 3)
+
+        self.stripe_server.error_rate = 0.0
+        StripeTask.objects.filter(pk=stripe_task.pk).update(status=StripeTask.PENDING)
+        self.assertEqual(run_pending_tasks(), (1, 0))
+        stripe_task.refresh_from_db()
+        self.assertEqual(stripe_task.status, StripeTask.DONE)
+        self.assertEqual(stripe_task.last_error, "")
+        tax.refresh_from_db()
+        self.assertTrue(tax.stripe_tax_id.startswith("txr_"))
+
+    def test_retry_after_failed_db_update_reuses_stripe_object(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            discount = Discount.objects.create(name="Скидка", percent=10)
+        stripe_task = StripeTask.objects.get(name="create_stripe_coupon")
+
+        def create_then_fail(*args, **kwargs):
+            create_stripe_coupon_for_discount(*args, **kwargs)
+            raise DatabaseError("Ошибка записи ID купона")
+
+        with mock.patch(
+            "stripe_app.tasks.create_stripe_coupon_for_discount",
+            side_effect=create_then_fail,
+        ):
+            self.assertEqual(run_pending_tasks(), (0, 1))
+        self.make_ready(stripe_task)
+        self.assertEqual(run_pending_tasks(), (1, 0))
+
+        coupons = self.stripe_server.objects["coupons"]
+        self.assertEqual(len(coupons), 1)
+        discount.refresh_from_db()
+        self.assertEqual(discount.stripe_coupon_id, coupons[0]["id"])
+        self.assertEqual(
+            {request["idempotency_key"] for request in self.stripe_server.received},
+            {f"create_stripe_coupon-{stripe_task.pk}"},
+        )
+
+
+class CatalogImportExportTests(TestCase):
+    """Загрузка и выгрузка каталога товаров (import_items / export_items)."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, content):
+        path = self.path(name)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        return path
+
+    def import_items(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_items", path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def catalog(self):
+        return list(
+            Item.objects.order_by("pk").values(
+                "id", "name", "description", "price", "currency", "unit_amount"
+            )
+        )
+
+    def test_csv_and_jsonl_round_trip(self):
+        Item.objects.create(name="Книга, том 1", price="12.50", currency="usd")
+        Item.objects.create(
+            name='Кофе "Арабика"',
+            description="Зерно\nобжарка",
+            price="7.05",
+            currency="eur",
+        )
+        expected = self.catalog()
+
+        for file_format in ("csv", "jsonl"):
+            with self.subTest(file_format=file_format):
+                path = self.path(f"items.{file_format}")
+                call_command("export_items", output=path, stderr=StringIO())
+                Item.objects.all().delete()
+
+                stdout, stderr = self.import_items(path)
+
+                self.assertIn("Создано 2, обновлено 0, ошибок 0", stdout)
+                self.assertEqual(stderr, "")
+                self.assertEqual(self.catalog(), expected)
+
+    def test_upsert_updates_existing_items(self):
+        fields = {
+            "stripe_product_id": "prod_test",
+            "stripe_price_id": "price_test",
+            "stripe_price_key": "usd:1000",
+        }
+        unchanged = Item.objects.create(name="Ручка", price="10.00", **fields)
+        repriced = Item.objects.create(name="Тетрадь", price="10.00", **fields)
+        rows = [
+            (2, {"id": unchanged.pk, "name": "Ручка", "price": "10.00"}),
+            (3, {"id": repriced.pk, "name": "Тетрадь", "price": "2.5"}),
+            (4, {"name": "Ручка", "price": "1.00", "currency": "EUR"}),
+        ]
+        errors = []
+
+        self.assertEqual(upsert_items(list(validate_rows(rows, errors))), (1, 2))
+
+        self.assertEqual(errors, [])
+        unchanged.refresh_from_db()
+        self.assertEqual(unchanged.stripe_price_id, "price_test")
+        repriced.refresh_from_db()
+        self.assertEqual((repriced.price, repriced.unit_amount), (Decimal("2.50"), 250))
+        self.assertEqual(repriced.stripe_price_id, "")
+        created = Item.objects.exclude(pk__in=[unchanged.pk, repriced.pk]).get()
+        self.assertEqual(
+            (created.name, created.currency, created.unit_amount), ("Ручка", "eur", 100)
+        )
+
+    def test_validation_errors_report_line_numbers(self):
+        path = self.write(
+            "items.csv",
+            "name,price,currency\n"
+            "Товар,10.00,usd\n"
+            ",5.00,usd\n"
+            "Дорогой,дорого,usd\n"
+            "Рубли,1.00,rub\n",
+        )
+
+        stdout, stderr = self.import_items(path)
+
+        self.assertIn("Создано 1, обновлено 0, ошибок 3", stdout)
+        lines = stderr.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("Строка 3: name:"))
+        self.assertTrue(lines[1].startswith("Строка 4: price:"))
+        self.assertTrue(lines[2].startswith("Строка 5: currency:"))
+        self.assertEqual(list(Item.objects.values_list("name", flat=True)), ["Товар"])
+
+        rows = read_rows(StringIO('{"name": "Товар"}\n\n{oops\n[1]\n'), "jsonl")
+        self.assertEqual(
+            [(line_num, isinstance(row, str)) for line_num, row in rows],
+            [(1, False), (3, True), (4, True)],
+        )
+
+        with self.assertRaises(CommandError):
+            self.import_items(path, max_errors=2)
+        self.assertEqual(Item.objects.count(), 1)
+
+    def test_export_reads_in_batches(self):
+        Item.objects.bulk_create(
+            Item(name=f"Товар {i}", price="1.00", unit_amount=100) for i in range(5)
+        )
+        lines = export_lines(Item.objects.all(), "jsonl", batch_size=2)
+
+        with self.assertNumQueries(1):
+            first = next(lines)
+        # Еще два пакета и пустой запрос, завершающий выгрузку
+        with self.assertNumQueries(3):
+            rest = list(lines)
+
+        self.assertEqual(json.loads(first)["name"], "Товар 0")
+        self.assertEqual(len(rest), 4)
+
+
+class CatalogListTests(TestCase):
+    """Keyset пагинация и фильтры каталога (item_list / list_catalog_items)."""
+
+    def setUp(self):
+        self.url = "/stripe_app/api/items/"
+        prices = ["5.00", "3.00", "5.00", "1.00", "5.00", "3.00", "9.00"]
+        self.items = [
+            Item.objects.create(name=f"Товар {i}", price=price, currency="usd")
+            for i, price in enumerate(prices)
+        ]
+        self.euro_item = Item.objects.create(
+            name="Товар в евро", price="4.00", currency="eur"
+        )
+
+    def get(self, **params):
+        response = self.client.get(self.url, params)
+        return response.status_code, response.json()
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            status, data = self.get(**params, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(status, 200)
+            ids += [item["id"] for item in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_price_ordering_pages_through_ties(self):
+        # Страница из двух товаров разрывает группу из трех товаров по 5.00
+        ids = self.walk(ordering="price", currency="usd", limit=2)
+
+        expected = sorted(self.items, key=lambda item: (item.unit_amount, item.pk))
+        self.assertEqual(ids, [item.pk for item in expected])
+
+    def test_id_ordering_returns_all_items(self):
+        ids = self.walk(limit=3)
+
+        self.assertEqual(ids, sorted(item.pk for item in [*self.items, self.euro_item]))
+
+    def test_currency_and_price_filters(self):
+        status, data = self.get(
+            ordering="price", currency="usd", min_price="3", max_price="5.00"
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [(item["price"], item["currency"]) for item in data["results"]],
+            [("3.00", "usd")] * 2 + [("5.00", "usd")] * 3,
+        )
+        self.assertIsNone(data["next"])
+
+        status, data = self.get(currency="eur")
+        self.assertEqual([item["id"] for item in data["results"]], [self.euro_item.pk])
+
+    def test_invalid_cursor_and_limit(self):
+        status, data = self.get(ordering="price", limit=2)
+        self.assertEqual(status, 200)
+        cursor = data["next_cursor"]
+
+        for params in (
+            {"ordering": "price", "cursor": cursor[:-2]},
+            {"ordering": "price", "cursor": "не-курсор"},
+            {"ordering": "id", "cursor": cursor},
+            {"limit": "0"},
+            {"limit": "1000"},
+            {"limit": "много"},
+            {"min_price": "дешево"},
+            {"currency": "rub"},
+            {"ordering": "name"},
+        ):
+            with self.subTest(params=params):
+                status, data = self.get(**params)
+                self.assertEqual(status, 400)
+                self.assertIn("error", data)
+
+    def test_search_by_name(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.create(name="Coffee Arabica", price="7.00")
+            Item.objects.create(name="Green tea", price="2.00")
+            renamed = self.items[0]
+            renamed.name = "Iced coffee"
+            renamed.save()
+
+        status, data = self.get(q="COFFEE")
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            sorted(item["name"] for item in data["results"]),
+            ["Coffee Arabica", "Iced coffee"],
+        )
+
+        # Запросы короче трех символов выполняются через icontains
+        status, data = self.get(q="te")
+        self.assertEqual([item["name"] for item in data["results"]], ["Green tea"])
+
+        status, data = self.get(q="Товар", currency="eur")
+        self.assertEqual([item["id"] for item in data["results"]], [self.euro_item.pk])
+
+
+class MoneyTests(TestCase):
+    """Расчет сумм в минимальных единицах валюты и пересчет по курсам."""
+
+    def setUp(self):
+        clear_exchange_rates_cache()
+        self.addCleanup(clear_exchange_rates_cache)
+
+    def test_rounding_is_half_up(self):
+        cases = [
+            ("0.004", 0),
+            ("0.005", 1),
+            ("0.015", 2),
+            ("1.005", 101),
+            ("2.675", 268),
+            ("19.99", 1999),
+        ]
+        for amount, expected in cases:
+            with self.subTest(amount=amount):
+                self.assertEqual(to_minor_units(Decimal(amount), "usd"), expected)
+
+        # 10% от 10.05 = 100.5 центов, 50% от 25 центов = 12.5
+        self.assertEqual(apply_percent(1005, 10), 101)
+        self.assertEqual(apply_percent(25, Decimal("50")), 13)
+        self.assertEqual(apply_percent(1004, 10), 100)
+
+    def test_zero_decimal_currency(self):
+        with mock.patch.dict(CURRENCY_EXPONENTS, {"jpy": 0}):
+            self.assertEqual(to_minor_units(Decimal("500"), "jpy"), 500)
+            self.assertEqual(to_minor_units(Decimal("100.5"), "JPY"), 101)
+            self.assertEqual(from_minor_units(500, "jpy"), Decimal("500"))
+            self.assertEqual(
+                str(Money.from_decimal(Decimal("1500"), "jpy")), "1500 JPY"
+            )
+        self.assertEqual(from_minor_units(1999, "usd"), Decimal("19.99"))
+        self.assertEqual(str(Money(1999, "usd")), "19.99 USD")
+
+    def test_item_unit_amount_follows_price(self):
+        item = Item.objects.create(name="Товар", price="19.99", currency="eur")
+        self.assertEqual(item.unit_amount, 1999)
+        self.assertEqual(item.money, Money(1999, "eur"))
+
+        item.price = Decimal("0.10")
+        item.save()
+        item.refresh_from_db()
+        self.assertEqual(item.unit_amount, 10)
+
+    def test_conversion_uses_exchange_rates(self):
+        # Курс EUR к USD 1.08 задан миграцией
+        self.assertEqual(convert_amount(1000, "eur", "usd"), 1080)
+        self.assertEqual(convert_amount(1080, "usd", "eur"), 1000)
+        self.assertEqual(convert_amount(1001, "usd", "eur"), 927)
+        self.assertEqual(Money(1000, "eur").convert("usd"), Money(1080, "usd"))
+        self.assertEqual(convert_amount(1000, "usd", "usd"), 1000)
+
+        # Сохранение курса сбрасывает кеш курсов (сигнал)
+        ExchangeRate.objects.filter(currency="eur").update(rate=Decimal("1.10"))
+        self.assertEqual(convert_amount(1000, "eur", "usd"), 1080)
+        ExchangeRate.objects.update_or_create(
+            currency="eur", defaults={"rate": Decimal("1.25")}
+        )
+        self.assertEqual(convert_amount(1000, "eur", "usd"), 1250)
+
+        ExchangeRate.objects.filter(currency="eur").delete()
+        clear_exchange_rates_cache()
+        with self.assertRaises(ValueError):
+            convert_amount(1000, "eur", "usd")
+
+
+class OrderLineQuantityTests(FakeStripeTestCase):
+    """Количество и цена позиций заказа передаются в Stripe."""
+
+    def setUp(self):
+        super().setUp()
+        clear_exchange_rates_cache()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = Item.objects.create(name="Товар 1", price="10.00")
+            self.second = Item.objects.create(name="Товар 2", price="2.50")
+            self.order = Order.objects.create(
+                discount=Discount.objects.create(
+                    name="Скидка", percent=10, stripe_coupon_id="coupon_test"
+                ),
+                tax=Tax.objects.create(
+                    name="НДС", percent=20, stripe_tax_id="txr_test"
+                ),
+            )
+            OrderLine.objects.create(order=self.order, item=self.first, quantity=3)
+            OrderLine.objects.create(order=self.order, item=self.second, quantity=2)
+
+    def received_params(self, path):
+        return [
+            request["params"]
+            for request in self.stripe_server.received
+            if request["path"] == path
+        ]
+
+    def checkout_line_items(self):
+        response = self.client.post(f"/stripe_app/order_buy/{self.order.id}/")
+        self.assertEqual(response.status_code, 200)
+        (session,) = self.received_params("/v1/checkout/sessions")
+        prices = {
+            price["id"]: int(price["unit_amount"])
+            for price in self.stripe_server.objects.get("prices", [])
+        }
+        line_items = []
+        for i in range(self.order.lines.count()):
+            prefix = f"line_items[{i}]"
+            unit_amount = session.get(f"{prefix}[price_data][unit_amount]")
+            line_items.append(
+                (
+                    int(unit_amount or prices[session[f"{prefix}[price]"]]),
+                    int(session[f"{prefix}[quantity]"]),
+                )
+            )
+        return sorted(line_items)
+
+    def test_order_pricing_multiplies_quantities(self):
+        order = Order.objects.get(pk=self.order.pk)
+        # 3 * 1000 + 2 * 250 = 3500, скидка 350, налог 20% от 3150 = 630
+        self.assertEqual(
+            (
+                order.subtotal_amount,
+                order.discount_amount,
+                order.tax_amount,
+                order.total_amount,
+            ),
+            (3500, 350, 630, 3780),
+        )
+
+    def test_checkout_session_line_items_use_quantities(self):
+        self.assertEqual(self.checkout_line_items(), [(250, 2), (1000, 3)])
+
+    def test_checkout_session_keeps_line_price_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.price = Decimal("12.00")
+            self.first.save()
+
+        # Позиция оплачивается по цене на момент добавления в заказ
+        self.assertEqual(self.checkout_line_items(), [(250, 2), (1000, 3)])
+
+    def test_payment_intent_amount_is_order_total(self):
+        response = self.client.post(
+            f"/stripe_app/create-order-payment-intent/{self.order.id}/"
+        )
+        self.assertIn("clientSecret", response.json())
+        (payment_intent,) = self.received_params("/v1/payment_intents")
+        self.assertEqual(payment_intent["amount"], "3780")
+        self.assertEqual(payment_intent["currency"], "usd")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            line = self.order.lines.get(item=self.second)
+            line.quantity = 4
+            line.save()
+        cache.clear()
+        self.client.post(f"/stripe_app/create-order-payment-intent/{self.order.id}/")
+        # 3000 + 4 * 250 = 4000, скидка 400, налог 720
+        self.assertEqual(
+            self.received_params("/v1/payment_intents")[-1]["amount"], "4320"
+        )
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Профилирование запросов к stripe_app (ProfilingMiddleware)."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.profiles = directory.name
+        self.item = Item.objects.create(name="Товар", price="10.00", currency="usd")
+        self.url = "/stripe_app/api/items/"
+
+    def reports(self):
+        return sorted(os.listdir(self.profiles))
+
+    def test_disabled_by_default(self):
+        with self.settings(PROFILING_DIR=self.profiles):
+            response = self.client.get(self.url, HTTP_X_PROFILE="secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.reports(), [])
+
+    def test_profiles_request_with_token(self):
+        with self.settings(PROFILING_TOKEN="secret", PROFILING_DIR=self.profiles):
+            for header in (None, "wrong"):
+                extra = {"HTTP_X_PROFILE": header} if header else {}
+                response = self.client.get(self.url, **extra)
+                self.assertNotIn("Server-Timing", response)
+            self.assertEqual(self.reports(), [])
+
+            with self.assertLogs("stripe_app.profiling", "INFO") as logs:
+                response = self.client.get(self.url, HTTP_X_PROFILE="secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["id"], self.item.id)
+        timing = response["Server-Timing"]
+        for metric in ("db;dur=", 'desc="1 queries"', "tpl;dur=", "stripe;dur="):
+            self.assertIn(metric, timing)
+        self.assertIn('desc="0 calls"', timing)
+
+        (record,) = logs.records
+        self.assertEqual((record.path, record.status), (self.url, 200))
+        self.assertEqual((record.db_count, record.stripe_count), (1, 0))
+        reports = self.reports()
+        self.assertEqual([name.rsplit(".", 1)[1] for name in reports], ["prof", "txt"])
+        self.assertIn("item_list", reports[0])
+        with open(os.path.join(self.profiles, reports[1]), encoding="utf-8") as f:
+            summary = f.read()
+        self.assertIn(f"GET {self.url}", summary)
+        self.assertIn("db: 1 queries", summary)
+
+    def test_sampling_and_other_apps(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_DIR=self.profiles):
+            with self.assertLogs("stripe_app.profiling", "INFO") as logs:
+                response = self.client.get(self.url)
+                self.assertIn("Server-Timing", response)
+                # Запросы вне stripe_app не профилируются
+                response = self.client.get("/metrics", HTTP_X_PROFILE="secret")
+                self.assertNotIn("Server-Timing", response)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(len(self.reports()), 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PAGE_CACHE_TTL=60,
+    STRIPE_EMBED_CLIENT_SECRET=True,
+)
+class EmbeddedClientSecretTests(FakeStripeTestCase):
+    """client_secret Payment Intent встраивается в страницы оплаты."""
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item = Item.objects.create(name="Товар", price="10.00")
+            self.order = Order.objects.create()
+            OrderLine.objects.create(order=self.order, item=self.item, quantity=2)
+
+    def payment_intents(self):
+        return self.stripe_server.objects.get("payment_intents", [])
+
+    def embedded_secret(self, response):
+        self.assertEqual(response.status_code, 200)
+        return json.loads(
+            response.content.decode()
+            .split('<script id="client-secret" type="application/json">')[1]
+            .split("</script>")[0]
+        )
+
+    def test_item_page_embeds_buyer_secret(self):
+        url = f"/stripe_app/payment-intent/{self.item.id}/"
+        response = self.client.get(url)
+
+        secret = self.embedded_secret(response)
+        (payment_intent,) = self.payment_intents()
+        self.assertEqual(secret, payment_intent["client_secret"])
+        self.assertEqual(payment_intent["amount"], "1000")
+        # Страница с client_secret не кешируется
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertNotIn("ETag", response)
+
+        # API страницы возвращает тот же Payment Intent без запроса к Stripe
+        response = self.client.post(
+            f"/stripe_app/create-payment-intent/{self.item.id}/"
+        )
+        self.assertEqual(response.json()["clientSecret"], secret)
+        self.assertEqual(self.embedded_secret(self.client.get(url)), secret)
+        self.assertEqual(len(self.payment_intents()), 1)
+
+        # Другой покупатель получает свой Payment Intent, а не страницу из кеша
+        other = self.client_class().get(url)
+        self.assertNotEqual(self.embedded_secret(other), secret)
+        self.assertEqual(len(self.payment_intents()), 2)
+
+    def test_order_page_embeds_secret(self):
+        response = self.client.get(f"/stripe_app/order-payment-intent/{self.order.id}/")
+
+        secret = self.embedded_secret(response)
+        (payment_intent,) = self.payment_intents()
+        self.assertEqual(secret, payment_intent["client_secret"])
+        self.assertEqual(payment_intent["amount"], "2000")
+        response = self.client.post(
+            f"/stripe_app/create-order-payment-intent/{self.order.id}/"
+        )
+        self.assertEqual(response.json()["clientSecret"], secret)
+        self.assertEqual(len(self.payment_intents()), 1)
+
+    def test_page_without_secret_when_stripe_fails(self):
+        self.stripe_server.error_rate = 1.0
+        with self.assertLogs("stripe_app.views", "ERROR"):
+            response = self.client.get(f"/stripe_app/payment-intent/{self.item.id}/")
+
+        self.assertIsNone(self.embedded_secret(response))
+
+    @override_settings(STRIPE_EMBED_CLIENT_SECRET=False)
+    def test_disabled_page_is_cached_without_secret(self):
+        url = f"/stripe_app/payment-intent/{self.item.id}/"
+        response = self.client.get(url)
+
+        self.assertIsNone(self.embedded_secret(response))
+        self.assertIn("ETag", response)
+        self.assertEqual(self.stripe_server.received, [])
+        with self.assertNumQueries(0):
+            self.embedded_secret(self.client_class().get(url))
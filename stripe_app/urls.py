@@ -6,10 +6,13 @@ from stripe_app.views import (
     create_checkout_session,
     order_detail,
     create_order_checkout_session,
+    create_cart_order,
+    item_list,
     payment_intent_page,
     create_payment_intent,
     create_order_payment_intent,
     order_payment_intent_page,
+    stripe_webhook,
 )
 
 app_name = StripeAppConfig.name
@@ -24,6 +27,10 @@ urlpatterns = [
         create_order_checkout_session,
         name="create_order_checkout_session",
     ),
+    # catalog
+    path("api/items/", item_list, name="item_list"),
+    # cart
+    path("cart/", create_cart_order, name="create_cart_order"),
     # payment intent
     path(
         "payment-intent/<int:item_id>/", payment_intent_page, name="payment_intent_page"
@@ -43,4 +50,6 @@ urlpatterns = [
         create_order_payment_intent,
         name="create_order_payment_intent",
     ),
+    # webhooks
+    path("webhook/", stripe_webhook, name="stripe_webhook"),
 ]
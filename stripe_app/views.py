@@ -1,15 +1,106 @@
-import stripe
-from django.http import JsonResponse
-from django.shortcuts import render, get_object_or_404
-
+import hmac
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from stripe_app.caching import cached_page
 from stripe_app.models import Item, Order
+from stripe_app.metrics import render_metrics
+from stripe_app.resilience import StripeUnavailableError, stripe_deadline
 from stripe_app.services import (
-    create_stripe_price_for_item,
+    CATALOG_PAGE_SIZE,
+    build_item_payment_intent_params,
+    build_order_payment_intent_params,
+    create_checkout_session_async,
+    create_order_from_cart,
+    create_payment_intent as create_payment_intent_sync,
+    create_payment_intent_async,
+    create_stripe_price_for_item_async,
     get_stripe_public_key,
-    get_stripe_api_key,
+    list_catalog_items,
+    resolve_stripe_prices_async,
 )
+from stripe_app.webhooks import store_webhook_event, verify_webhook
+
+logger = logging.getLogger(__name__)
+
+
+def _stripe_unavailable_response(error):
+    response = JsonResponse({"error": str(error)}, status=503)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def _embeds_client_secret(request):
+    return settings.STRIPE_EMBED_CLIENT_SECRET
+
+
+def _get_buyer_key(request):
+    """
+    Возвращает ключ сессии покупателя, создавая сессию при необходимости.
+
+    Ключ разделяет Payment Intent и Checkout Session товара между покупателями:
+    оплаченный объект Stripe нельзя использовать повторно.
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        str: Ключ сессии
+    """
+    if not request.session.session_key:
+        request.session.create()
+    return request.session.session_key
+
+
+async def _aget_buyer_key(request):
+    """Асинхронная версия _get_buyer_key."""
+    if not request.session.session_key:
+        await request.session.acreate()
+    return request.session.session_key
+
+
+def _get_embedded_client_secret(request, currency, params, buyer=""):
+    """
+    Создает Payment Intent при рендеринге страницы оплаты.
+
+    Если Stripe недоступен или вернул ошибку, страница рендерится без
+    client_secret и получает его через API, как при выключенной настройке
+    STRIPE_EMBED_CLIENT_SECRET.
+
+    Args:
+        request: HTTP запрос
+        currency (str): Код валюты, определяющий аккаунт Stripe
+        params (dict): Параметры создания Payment Intent
+        buyer (str): Идентификатор покупателя (см. build_idempotency_key)
+
+    Returns:
+        str: client_secret Payment Intent или None
+    """
+    try:
+        with stripe_deadline():
+            return create_payment_intent_sync(currency, params, buyer)
+    except StripeUnavailableError as e:
+        logger.warning(
+            "Stripe недоступен при рендеринге страницы оплаты: %s",
+            e,
+            extra={"path": request.path},
+        )
+    except Exception:
+        logger.exception("Ошибка при обращении к Stripe", extra={"path": request.path})
+    return None
 
 
+@cached_page("item", "item_id")
 def item_detail(request, item_id):
     """
     Отображает страницу с информацией о товаре и кнопкой для оплаты через Stripe Checkout.
@@ -30,40 +121,117 @@ def item_detail(request, item_id):
     )
 
 
-def create_checkout_session(request, item_id):
+def _parse_query_param(request, name, parse):
+    value = request.GET.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return parse(value)
+    except (ValueError, InvalidOperation):
+        raise ValidationError(f"Некорректное значение параметра {name}: {value}")
+
+
+@require_GET
+def item_list(request):
     """
-    Создает Stripe Checkout Session для оплаты одного товара.
+    Возвращает страницу каталога товаров в JSON с keyset пагинацией.
+
+    Параметры запроса: currency, min_price, max_price (в основных единицах
+    валюты), q (поиск по названию), ordering ("id" или "price"), limit и
+    cursor (значение next_cursor предыдущей страницы).
 
     Args:
         request: HTTP запрос
-        item_id (int): ID товара
 
     Returns:
-        JsonResponse: Объект с sessionId для редиректа на Stripe Checkout или ошибкой
+        JsonResponse: Товары страницы и курсор следующей страницы или ошибка
     """
-    item = get_object_or_404(Item, id=item_id)
-    stripe.api_key = get_stripe_api_key(item.currency)
-
     try:
-        price_id = create_stripe_price_for_item(item)
+        limit = _parse_query_param(request, "limit", int)
+        if limit is None:
+            limit = CATALOG_PAGE_SIZE
+        items, next_cursor = list_catalog_items(
+            currency=request.GET.get("currency") or None,
+            min_price=_parse_query_param(request, "min_price", Decimal),
+            max_price=_parse_query_param(request, "max_price", Decimal),
+            query=request.GET.get("q", ""),
+            ordering=request.GET.get("ordering", "id"),
+            cursor=request.GET.get("cursor") or None,
+            limit=limit,
+        )
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages}, status=400)
+
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        next_url = f"{request.path}?{params.urlencode()}"
+    return JsonResponse(
+        {
+            "results": [
+                {
+                    "id": item.id,
+                    "name": item.name,
+                    "price": str(item.price),
+                    "currency": item.currency,
+                    "unit_amount": item.unit_amount,
+                    "url": reverse("stripe_app:item_detail", args=[item.id]),
+                }
+                for item in items
+            ],
+            "next_cursor": next_cursor,
+            "next": next_url,
+        }
+    )
 
-        if not price_id:
-            return JsonResponse({"error": "Ошибка при создании цены"}, status=400)
 
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[{"price": price_id, "quantity": 1}],
-            mode="payment",
-            success_url=request.build_absolute_uri(f"/stripe_app/item/{item.id}/"),
-            cancel_url=request.build_absolute_uri(f"/stripe_app/item/{item.id}/"),
-        )
+async def create_checkout_session(request, item_id):
+    """
+    Создает Stripe Checkout Session для оплаты одного товара.
 
-        return JsonResponse({"sessionId": session.id})
+    Args:
+        request: HTTP запрос
+        item_id (int): ID товара
+
+    Returns:
+        JsonResponse: Объект с sessionId для редиректа на Stripe Checkout или ошибкой
+    """
+    item = await aget_object_or_404(Item, id=item_id)
 
+    try:
+        with stripe_deadline():
+            price_id = await create_stripe_price_for_item_async(item)
+
+            if not price_id:
+                return JsonResponse({"error": "Ошибка при создании цены"}, status=400)
+
+            session_id = await create_checkout_session_async(
+                item.currency,
+                {
+                    "payment_method_types": ["card"],
+                    "line_items": [{"price": price_id, "quantity": 1}],
+                    "mode": "payment",
+                    "success_url": request.build_absolute_uri(
+                        f"/stripe_app/item/{item.id}/"
+                    ),
+                    "cancel_url": request.build_absolute_uri(
+                        f"/stripe_app/item/{item.id}/"
+                    ),
+                },
+                await _aget_buyer_key(request),
+            )
+
+            return JsonResponse({"sessionId": session_id})
+
+    except StripeUnavailableError as e:
+        return _stripe_unavailable_response(e)
     except Exception as e:
+        logger.exception("Ошибка при обращении к Stripe", extra={"path": request.path})
         return JsonResponse({"error": str(e)}, status=400)
 
 
+@cached_page("order", "order_id")
 def order_detail(request, order_id):
     """
     Отображает страницу с информацией о заказе и кнопкой для оплаты через Stripe Checkout.
@@ -75,9 +243,9 @@ def order_detail(request, order_id):
     Returns:
         HttpResponse: HTML страница с информацией о заказе
     """
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.with_pricing(), id=order_id)
     stripe_public_key = get_stripe_public_key(order.currency)
-    order.calc_total_price()
+    order.get_pricing()
     return render(
         request,
         "stripe_app/order_detail.html",
@@ -85,7 +253,72 @@ def order_detail(request, order_id):
     )
 
 
-def create_order_checkout_session(request, order_id):
+async def _create_order_checkout_session_id(request, order):
+    """
+    Создает Stripe Checkout Session для заказа.
+
+    Вызывается внутри stripe_deadline; ошибки Stripe передаются вызывающему.
+
+    Args:
+        request: HTTP запрос
+        order (Order): Заказ, загруженный через with_pricing
+
+    Returns:
+        tuple[str, dict]: ID Checkout Session и None или None и данные ошибки
+    """
+    line_items = []
+    tax_rates = []
+    discounts = []
+
+    if order.tax and order.tax.stripe_tax_id:
+        tax_rates = [order.tax.stripe_tax_id]
+
+    lines = list(order.lines.all())
+    prices, errors = await resolve_stripe_prices_async([line.item for line in lines])
+    if errors:
+        return None, {
+            "error": "Ошибка при создании цен для товаров заказа",
+            "items": {str(item_id): error for item_id, error in errors.items()},
+        }
+
+    for line in lines:
+        line_item = {"quantity": line.quantity, "tax_rates": tax_rates}
+        if line.unit_amount == line.item.unit_amount:
+            line_item["price"] = prices[line.item.id]
+        else:
+            # Цена товара изменилась после добавления в заказ: оплачивается
+            # цена, зафиксированная в позиции.
+            line_item["price_data"] = {
+                "currency": line.item.currency,
+                "unit_amount": line.unit_amount,
+                "product": line.item.stripe_product_id,
+            }
+        line_items.append(line_item)
+
+    if not line_items:
+        return None, {"error": "Отсутствуют элементы в заказе"}
+
+    if order.discount and order.discount.stripe_coupon_id:
+        discounts.append({"coupon": order.discount.stripe_coupon_id})
+
+    session_id = await create_checkout_session_async(
+        order.currency,
+        {
+            "payment_method_types": ["card"],
+            "line_items": line_items,
+            "discounts": discounts,
+            "mode": "payment",
+            "client_reference_id": str(order.id),
+            "metadata": {"order_id": order.id},
+            "payment_intent_data": {"metadata": {"order_id": order.id}},
+            "success_url": request.build_absolute_uri(f"/stripe_app/order/{order.id}/"),
+            "cancel_url": request.build_absolute_uri(f"/stripe_app/order/{order.id}/"),
+        },
+    )
+    return session_id, None
+
+
+async def create_order_checkout_session(request, order_id):
     """
     Создает Stripe Checkout Session для оплаты заказа с несколькими товарами.
 
@@ -98,54 +331,106 @@ def create_order_checkout_session(request, order_id):
     Returns:
         JsonResponse: Объект с sessionId для редиректа на Stripe Checkout или ошибкой
     """
-    order = get_object_or_404(Order, id=order_id)
-    stripe.api_key = get_stripe_api_key(order.currency)
-    order.calc_total_price()
+    order = await aget_object_or_404(Order.objects.with_pricing(), id=order_id)
 
     try:
-        line_items = []
-        tax_rates = []
-        discounts = []
-
-        if order.tax and order.tax.stripe_tax_id:
-            tax_rates = [order.tax.stripe_tax_id]
-
-        for item in order.items.all():
-            price_id = create_stripe_price_for_item(item)
-            if price_id:
-                line_items.append(
-                    {
-                        "price": price_id,
-                        "quantity": 1,
-                        "tax_rates": tax_rates,
-                    }
-                )
-
-        if not line_items:
-            return JsonResponse({"error": "Отсутствуют элементы в заказе"}, status=400)
-
-        if order.discount and order.discount.stripe_coupon_id:
-            discounts.append({"coupon": order.discount.stripe_coupon_id})
-
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=line_items,
-            discounts=discounts,
-            mode="payment",
-            success_url=request.build_absolute_uri(f"/stripe_app/order/{order.id}/"),
-            cancel_url=request.build_absolute_uri(f"/stripe_app/order/{order.id}/"),
+        with stripe_deadline():
+            session_id, error = await _create_order_checkout_session_id(request, order)
+            if error:
+                return JsonResponse(error, status=400)
+            return JsonResponse({"sessionId": session_id})
+
+    except StripeUnavailableError as e:
+        return _stripe_unavailable_response(e)
+    except Exception as e:
+        logger.exception("Ошибка при обращении к Stripe", extra={"path": request.path})
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+def _serialize_order(order):
+    pricing = order.get_pricing()
+    return {
+        "id": order.id,
+        "currency": pricing.currency,
+        "items": [
+            {
+                "id": line.item_id,
+                "name": line.item.name,
+                "quantity": line.quantity,
+                "unit_amount": line.unit_amount,
+            }
+            for line in order.lines.all()
+        ],
+        "discount": order.discount_id,
+        "tax": order.tax_id,
+        "subtotal_amount": pricing.subtotal,
+        "discount_amount": pricing.discount,
+        "tax_amount": pricing.tax,
+        "total_amount": pricing.total,
+        "total_price": str(order.total_price),
+        "url": reverse("stripe_app:order_detail", args=[order.id]),
+    }
+
+
+@csrf_exempt
+@require_POST
+async def create_cart_order(request):
+    """
+    Создает заказ из корзины одним запросом и возвращает его стоимость.
+
+    Тело запроса - JSON вида {"items": [{"id": 1, "quantity": 2}], "discount": 1,
+    "tax": 1, "checkout": true}. Скидка, налог и checkout необязательны; при
+    "checkout": true в том же ответе возвращается sessionId Stripe Checkout.
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        JsonResponse: Созданный заказ (201), заказ с sessionId или ошибка
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Некорректный JSON"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Ожидается JSON объект"}, status=400)
+
+    try:
+        order = await sync_to_async(create_order_from_cart)(
+            data.get("items"), data.get("discount"), data.get("tax")
         )
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages}, status=400)
 
-        return JsonResponse({"sessionId": session.id})
+    result = {"order": _serialize_order(order)}
+    if not data.get("checkout"):
+        return JsonResponse(result, status=201)
 
+    try:
+        with stripe_deadline():
+            session_id, error = await _create_order_checkout_session_id(request, order)
+            if error:
+                return JsonResponse({**result, **error}, status=400)
+            return JsonResponse({**result, "sessionId": session_id}, status=201)
+
+    except StripeUnavailableError as e:
+        response = JsonResponse({**result, "error": str(e)}, status=503)
+        response["Retry-After"] = str(e.retry_after)
+        return response
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=400)
+        logger.exception("Ошибка при обращении к Stripe", extra={"path": request.path})
+        return JsonResponse({**result, "error": str(e)}, status=400)
 
 
+@cached_page("item", "item_id", skip_if=_embeds_client_secret)
 def payment_intent_page(request, item_id):
     """
     Отображает страницу для оплаты одного товара через Stripe Payment Intent.
 
+    При STRIPE_EMBED_CLIENT_SECRET Payment Intent создается при рендеринге и
+    client_secret встраивается в страницу, иначе страница запрашивает его
+    через create_payment_intent.
+
     Args:
         request: HTTP запрос
         item_id (int): ID товара
@@ -155,14 +440,26 @@ def payment_intent_page(request, item_id):
     """
     item = get_object_or_404(Item, id=item_id)
     stripe_public_key = get_stripe_public_key(item.currency)
+    client_secret = None
+    if settings.STRIPE_EMBED_CLIENT_SECRET:
+        client_secret = _get_embedded_client_secret(
+            request,
+            item.currency,
+            build_item_payment_intent_params(item),
+            _get_buyer_key(request),
+        )
     return render(
         request,
         "stripe_app/payment_intent_page.html",
-        {"item": item, "STRIPE_PUBLIC_KEY": stripe_public_key},
+        {
+            "item": item,
+            "STRIPE_PUBLIC_KEY": stripe_public_key,
+            "client_secret": client_secret,
+        },
     )
 
 
-def create_payment_intent(request, item_id):
+async def create_payment_intent(request, item_id):
     """
     Создает Stripe Payment Intent для оплаты одного товара.
 
@@ -173,24 +470,31 @@ def create_payment_intent(request, item_id):
     Returns:
         JsonResponse: Объект с clientSecret для инициализации Stripe Elements или ошибкой
     """
-    item = get_object_or_404(Item, id=item_id)
-    stripe.api_key = get_stripe_api_key(item.currency)
+    item = await aget_object_or_404(Item, id=item_id)
     try:
-        intent = stripe.PaymentIntent.create(
-            amount=int(item.price * 100),
-            currency=item.currency,
-            metadata={"item_id": item.id},
-            automatic_payment_methods={"enabled": True},
-        )
-        return JsonResponse({"clientSecret": intent.client_secret})
+        with stripe_deadline():
+            client_secret = await create_payment_intent_async(
+                item.currency,
+                build_item_payment_intent_params(item),
+                await _aget_buyer_key(request),
+            )
+            return JsonResponse({"clientSecret": client_secret})
+    except StripeUnavailableError as e:
+        return _stripe_unavailable_response(e)
     except Exception as e:
+        logger.exception("Ошибка при обращении к Stripe", extra={"path": request.path})
         return JsonResponse({"error": str(e)}, status=400)
 
 
+@cached_page("order", "order_id", skip_if=_embeds_client_secret)
 def order_payment_intent_page(request, order_id):
     """
     Отображает страницу для оплаты заказа через Stripe Payment Intent.
 
+    При STRIPE_EMBED_CLIENT_SECRET Payment Intent создается при рендеринге и
+    client_secret встраивается в страницу, иначе страница запрашивает его
+    через create_order_payment_intent.
+
     Args:
         request: HTTP запрос
         order_id (int): ID заказа
@@ -198,17 +502,25 @@ def order_payment_intent_page(request, order_id):
     Returns:
         HttpResponse: HTML страница с кастомной платежной формой Stripe для заказа
     """
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.with_pricing(), id=order_id)
     stripe_public_key = get_stripe_public_key(order.currency)
-    order.calc_total_price()
+    order.get_pricing()
+    client_secret = None
+    if settings.STRIPE_EMBED_CLIENT_SECRET:
+        params = build_order_payment_intent_params(order)
+        client_secret = _get_embedded_client_secret(request, params["currency"], params)
     return render(
         request,
         "stripe_app/order_payment_intent_page.html",
-        {"order": order, "STRIPE_PUBLIC_KEY": stripe_public_key},
+        {
+            "order": order,
+            "STRIPE_PUBLIC_KEY": stripe_public_key,
+            "client_secret": client_secret,
+        },
     )
 
 
-def create_order_payment_intent(request, order_id):
+async def create_order_payment_intent(request, order_id):
     """
     Создает Stripe Payment Intent для оплаты заказа с общей стоимостью.
 
@@ -219,21 +531,84 @@ def create_order_payment_intent(request, order_id):
     Returns:
         JsonResponse: Объект с clientSecret для инициализации Stripe Elements или ошибкой
     """
-    order = get_object_or_404(Order, id=order_id)
-    stripe.api_key = get_stripe_api_key(order.currency)
-    order.calc_total_price()
+    order = await aget_object_or_404(Order.objects.with_pricing(), id=order_id)
+    params = build_order_payment_intent_params(order)
 
     try:
-        intent = stripe.PaymentIntent.create(
-            amount=int(order.total_price * 100),
-            currency=order.currency,
-            metadata={"order_id": order.id, "type": "order"},
-            automatic_payment_methods={
-                "enabled": True,
-            },
-        )
+        with stripe_deadline():
+            client_secret = await create_payment_intent_async(
+                params["currency"], params
+            )
 
-        return JsonResponse({"clientSecret": intent.client_secret})
+            return JsonResponse({"clientSecret": client_secret})
 
+    except StripeUnavailableError as e:
+        return _stripe_unavailable_response(e)
     except Exception as e:
+        logger.exception("Ошибка при обращении к Stripe", extra={"path": request.path})
         return JsonResponse({"error": str(e)}, status=400)
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """
+    Принимает вебхуки Stripe.
+
+    Проверяет подпись и сохраняет событие в таблицу StripeEvent; обработка событий
+    выполняется воркером stripe_worker, поэтому ответ отправляется сразу.
+
+    Args:
+        request: HTTP запрос от Stripe
+
+    Returns:
+        JsonResponse: Подтверждение получения или ошибка проверки подписи
+    """
+    account = verify_webhook(request.body, request.headers.get("Stripe-Signature", ""))
+    if account is None:
+        return JsonResponse({"error": "Неверная подпись"}, status=400)
+
+    try:
+        store_webhook_event(request.body, account)
+    except (ValueError, KeyError):
+        return JsonResponse({"error": "Некорректное событие"}, status=400)
+    return JsonResponse({"received": True})
+
+
+def _is_metrics_allowed(request):
+    """
+    Проверяет доступ к метрикам: по токену METRICS_TOKEN, по адресу клиента
+    из METRICS_ALLOWED_IPS или для сотрудника (is_staff).
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        bool: True, если метрики можно отдать
+    """
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(
+            token.encode(), settings.METRICS_TOKEN.encode()
+        ):
+            return True
+    if request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS:
+        return True
+    return request.user.is_active and request.user.is_staff
+
+
+def metrics(request):
+    """
+    Отдает метрики процесса (вызовы Stripe API) в текстовом формате Prometheus.
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        HttpResponse: Метрики в формате Prometheus или 403 без доступа
+    """
+    if not _is_metrics_allowed(request):
+        return HttpResponse("Доступ запрещен", status=403)
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
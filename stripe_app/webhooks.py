@@ -0,0 +1,181 @@
+import json
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from stripe_app.models import Order, StripeEvent
+
+EVENT_PAYMENT_STATUSES = {
+    "payment_intent.processing": Order.PROCESSING,
+    "payment_intent.succeeded": Order.PAID,
+    "payment_intent.payment_failed": Order.FAILED,
+    "checkout.session.async_payment_succeeded": Order.PAID,
+    "checkout.session.async_payment_failed": Order.FAILED,
+}
+
+
+def get_webhook_secrets():
+    """
+    Возвращает секреты подписи вебхуков для аккаунтов Stripe.
+
+    Returns:
+        dict: Секреты по кодам валют аккаунтов (только заданные в настройках)
+    """
+    secrets = {
+        "usd": settings.STRIPE_WEBHOOK_SECRET_USD,
+        "eur": settings.STRIPE_WEBHOOK_SECRET_EUR,
+    }
+    return {account: secret for account, secret in secrets.items() if secret}
+
+
+def verify_webhook(payload, sig_header):
+    """
+    Проверяет подпись вебхука секретами всех аккаунтов Stripe.
+
+    Args:
+        payload (bytes): Тело запроса
+        sig_header (str): Значение заголовка Stripe-Signature
+
+    Returns:
+        str: Валюта аккаунта, чьим секретом подписан вебхук, или None (в том
+        числе для тела не в UTF-8 и некорректного заголовка)
+    """
+    try:
+        payload = payload.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    for account, secret in get_webhook_secrets().items():
+        try:
+            stripe.WebhookSignature.verify_header(payload, sig_header, secret)
+        except (stripe.SignatureVerificationError, ValueError):
+            continue
+        return account
+    return None
+
+
+def store_webhook_event(payload, account):
+    """
+    Сохраняет событие вебхука одним INSERT; повторно присланное событие
+    игнорируется благодаря уникальному event_id.
+
+    Args:
+        payload (bytes): Тело запроса с событием Stripe
+        account (str): Валюта аккаунта Stripe
+    """
+    event = json.loads(payload)
+    StripeEvent.objects.bulk_create(
+        [
+            StripeEvent(
+                event_id=event["id"],
+                type=event["type"],
+                account=account,
+                payload=event,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def get_event_payment_status(payload):
+    """
+    Определяет заказ и новый статус оплаты по событию Stripe.
+
+    Args:
+        payload (dict): Содержимое события Stripe
+
+    Returns:
+        tuple[int, str]: ID заказа и статус оплаты или (None, None), если событие
+        не относится к оплате заказа
+    """
+    event_type = payload.get("type")
+    stripe_object = payload.get("data", {}).get("object", {})
+    order_id = (stripe_object.get("metadata") or {}).get("order_id")
+    if not order_id or not str(order_id).isdigit():
+        return None, None
+
+    if event_type == "checkout.session.completed":
+        if stripe_object.get("payment_status") == "paid":
+            return int(order_id), Order.PAID
+        return int(order_id), Order.PROCESSING
+    status = EVENT_PAYMENT_STATUSES.get(event_type)
+    if status is None:
+        return None, None
+    return int(order_id), status
+
+
+def apply_order_payment_statuses(statuses):
+    """
+    Применяет статусы оплаты к заказам групповыми UPDATE запросами.
+
+    Оплаченный заказ больше не меняет статус, поэтому повторное или запоздавшее
+    событие не откатывает оплату. Заказы, у которых статус уже совпадает
+    с новым, не перезаписываются.
+
+    Args:
+        statuses (dict): Статусы оплаты по ID заказов
+
+    Returns:
+        int: Количество заказов, у которых изменился статус
+    """
+    order_ids_by_status = {}
+    for order_id, status in statuses.items():
+        order_ids_by_status.setdefault(status, []).append(order_id)
+
+    updated = 0
+    for status, order_ids in order_ids_by_status.items():
+        fields = {"payment_status": status}
+        if status == Order.PAID:
+            fields["paid_at"] = timezone.now()
+        updated += (
+            Order.objects.filter(id__in=order_ids)
+            .exclude(payment_status__in=[Order.PAID, status])
+            .update(**fields)
+        )
+    return updated
+
+
+def process_pending_events(batch_size=500):
+    """
+    Обрабатывает пакет необработанных событий Stripe.
+
+    События пакета захватываются блокировкой строк (SELECT ... FOR UPDATE SKIP
+    LOCKED) до конца транзакции, поэтому несколько воркеров берут разные
+    события и не обрабатывают одно событие дважды. В SQLite блокировок строк
+    нет, но транзакция (transaction_mode IMMEDIATE) сразу берет блокировку
+    на запись, и воркеры обрабатывают пакеты по очереди.
+
+    Для каждого заказа из пакета выбирается итоговый статус (по последнему событию,
+    успешная оплата имеет приоритет), после чего заказы обновляются групповыми
+    запросами, а события помечаются обработанными.
+
+    Args:
+        batch_size (int): Максимальное количество событий за вызов
+
+    Returns:
+        int: Количество обработанных событий
+    """
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.filter(processed_at=None)
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .values("id", "payload")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        statuses = {}
+        for event in sorted(
+            events, key=lambda event: event["payload"].get("created", 0)
+        ):
+            order_id, status = get_event_payment_status(event["payload"])
+            if order_id is not None and statuses.get(order_id) != Order.PAID:
+                statuses[order_id] = status
+
+        apply_order_payment_statuses(statuses)
+        StripeEvent.objects.filter(id__in=[event["id"] for event in events]).update(
+            processed_at=timezone.now()
+        )
+    return len(events)